@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:02:47 2026
+
+@author: jonas
+
+
+This file evaluates a policy (e.g. a network trained with mlp.train()) by letting it play many games at once. The games are played with
+BatchSnake. Every tick the features of all games are computed with one call of NeuralNetwork.reduce_gameStates_dimensions(), the policy
+chooses the actions of all games with one forward pass and all snakes are moved with one call of BatchSnake.step().
+
+"""
+
+# Play many games at once
+from batch_snake import BatchSnake
+# Compute the features of all games at once
+from neural_network import NeuralNetwork
+
+# Import Pathlib for reading, writing files
+from pathlib import Path
+# Used to measure the throughput
+from time import perf_counter
+
+import numpy as np
+
+
+def autoplay(policy, n_games:int=10000, batch_size:int=1000, maximal_steps_per_game:int=1000, seed:int=None, **settings):
+    """
+    Let a policy play games and collect the scores and the lengths of the games.
+
+    Every slot of the batch plays a fixed number of games one after another, so short games are not overrepresented in the results.
+
+    Parameters
+    ----------
+    policy : mlp.MLP or callable
+        Gets the features of all games (np.ndarray (M, 6), see NeuralNetwork.reduce_gameState_dimensions()) and returns one action
+        (LEFT, FORWARD, RIGHT) per game. For an MLP, MLP.act() is used.
+    n_games : int, optional
+        Number of games. The default is 10000.
+    batch_size : int, optional
+        Number of games played at the same time. The default is 1000.
+    maximal_steps_per_game : int, optional
+        End a game after this many steps, so a policy that walks in circles can't play forever. The default is 1000.
+    seed : int, optional
+        Seed for the apples. The default is None.
+    **settings :
+        Passed to BatchSnake (board_width, board_height, initial_length, max_score_per_apple, ...).
+
+    Returns
+    -------
+    dict
+        scores and steps (np.ndarrays with one entry per game), mean, median and max of the score, mean and median game length,
+        seconds, steps_per_second and games_per_second.
+
+    """
+    if not isinstance(n_games, int) or n_games < 1: raise ValueError("The number of games must be a positive integer.")
+    if not isinstance(batch_size, int) or batch_size < 1: raise ValueError("The batch size must be a positive integer.")
+    act = policy.act if hasattr(policy, "act") else policy
+
+    slots = min(batch_size, n_games)
+    games = BatchSnake(slots, maximal_steps_per_game=maximal_steps_per_game, seed=seed, **settings)
+    network = NeuralNetwork(board_width=games.BOARD_SIZE[0], board_height=games.BOARD_SIZE[1])
+    board_sizes = np.broadcast_to(np.array(games.BOARD_SIZE), (slots, 2))
+
+    # Number of games every slot has to play and where its results are stored
+    quota = np.full(slots, n_games // slots)
+    quota[:n_games % slots] += 1
+    first_result = np.concatenate([ [0], np.cumsum(quota)[:-1] ])
+    played = np.zeros(slots, dtype=np.int64)
+    scores = np.zeros(n_games, dtype=np.int64)
+    steps = np.zeros(n_games, dtype=np.int64)
+
+    start, total_steps = perf_counter(), 0
+    while (played < quota).any():
+        # One forward pass for all games
+        body, body_offsets = games.get_bodies()
+        features = network.reduce_gameStates_dimensions(games.heads, games.directions, games.apples, board_sizes, body, body_offsets)
+        ended = games.step(np.asarray(act(features), dtype=np.int64))
+        total_steps += int((played < quota).sum())
+
+        # Save the results of the games that ended and count them. Games started after the quota of a slot is reached are ignored.
+        ended &= played < quota
+        scores[first_result[ended] + played[ended]] = games.final_scores[ended]
+        steps[first_result[ended] + played[ended]] = games.final_game_steps[ended]
+        played[ended] += 1
+    seconds = perf_counter() - start
+
+    return {"scores": scores, "steps": steps,
+            "mean_score": float(scores.mean()), "median_score": float(np.median(scores)), "max_score": int(scores.max()),
+            "mean_steps": float(steps.mean()), "median_steps": float(np.median(steps)),
+            "seconds": seconds, "steps_per_second": total_steps/seconds, "games_per_second": n_games/seconds}
+
+
+if __name__ == "__main__":
+
+    import argparse
+    from mlp import load_checkpoint, MLP
+
+    parser = argparse.ArgumentParser(description="Evaluate a trained network by letting it play many games at once.")
+    parser.add_argument("checkpoint", type=Path, help="checkpoint written by mlp.train() or MLP.save()")
+    parser.add_argument("--games", type=int, default=10000, help="number of games (default 10000)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="games played at the same time (default 1000)")
+    parser.add_argument("--max-steps", type=int, default=1000, help="maximal number of steps per game (default 1000)")
+    parser.add_argument("--seed", type=int, default=None)
+    arguments = parser.parse_args()
+
+    try:
+        model = load_checkpoint(arguments.checkpoint)[0]
+    except KeyError:
+        # Saved with MLP.save() without optimizer
+        model = MLP.load(arguments.checkpoint)[0]
+
+    result = autoplay(model, arguments.games, arguments.batch_size, arguments.max_steps, arguments.seed)
+    print(f"Score:       mean {result['mean_score']:.1f}, median {result['median_score']:.1f}, max {result['max_score']}")
+    print(f"Game length: mean {result['mean_steps']:.1f}, median {result['median_steps']:.1f} steps")
+    print(f"Throughput:  {result['steps_per_second']:,.0f} steps/s, {result['games_per_second']:,.1f} games/s ({result['seconds']:.1f} s)")
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:12:40 2026
+
+@author: jonas
+
+
+This file implements a vectorised version of the Snake class. It plays many games of snake at once, so training data can be generated without
+paying the python overhead of Snake.move() for every single step. The rules (moving, collision detection, spawning the apple and the score) are
+the same as in the Snake class.
+
+"""
+
+# Used for coordinates and vectorised game logic
+import numpy as np
+
+# Import the directions used by the snake game logic
+from snake import LEFT, FORWARD, RIGHT
+
+
+class BatchSnake:
+    """
+    This class plays N games of snake at the same time. All games are stored in stacked numpy arrays (heads, body ring buffers, occupancy grids, apples,
+    scores, step counters) and step() moves the snakes of all games with one vectorised call. Games that end are reset automatically.
+
+    The snakes are controlled with the relative directions LEFT, FORWARD and RIGHT.
+    """
+
+    def __init__(self, n_games:int, board_width:int=32, board_height:int=18, initial_length:int=3, max_score_per_apple:int=50, min_score_per_apple:int=10, max_step_to_apple:int=20, maximal_steps_per_game:int=None, seed:int=None):
+        """
+        Initialise N games of snake.
+
+        Parameters
+        ----------
+        n_games : int
+            Number of games played at the same time.
+        board_width, board_height, initial_length, max_score_per_apple, min_score_per_apple, max_step_to_apple : int, optional
+            Same as in Snake.__init__().
+        maximal_steps_per_game : int, optional
+            End a game after this many steps. The default is None (games only end when the snake dies).
+        seed : int, optional
+            Seed of the random number generator used to spawn the apples. The default is None.
+
+        Returns
+        -------
+        Instance of the BatchSnake class.
+
+        """
+        #   CHECK INPUT
+        #
+        if not isinstance(n_games, int) or not n_games > 0: raise ValueError("The number of games must be a positive integer!")
+        if not isinstance(board_width, int) or not isinstance(board_height, int): raise ValueError("Height and width of the game board must be integer!")
+        if not (board_width > 1 and board_height > 1): raise ValueError("The board width and height must be bigger than 1!")
+        if not isinstance(initial_length, int) or not initial_length >= 2: raise ValueError("The snake must have a length of at least 1 (only integer values allowed).")
+        if not isinstance(max_score_per_apple, int) or not isinstance(min_score_per_apple, int) or not isinstance(max_step_to_apple, int):
+            raise ValueError("max_score_per_apple, min_score_per_apple and max_step_to_apple must be integers!")
+        if min_score_per_apple < 1: raise ValueError("min_score_per_apple can't be smaller than 1.")
+        if max_score_per_apple < min_score_per_apple: raise ValueError("max_score_per_apple must be equal or bigger than min_score_per_apple!")
+        if max_step_to_apple < 1: raise ValueError("max_step_to_apple must be at least 1.")
+        if maximal_steps_per_game is not None and (not isinstance(maximal_steps_per_game, int) or maximal_steps_per_game < 1):
+            raise ValueError("maximal_steps_per_game must be a positive integer or None.")
+
+        #   SET CONSTANTS
+        #
+        self.N_GAMES = n_games
+        self.BOARD_SIZE = (board_width, board_height)
+        self.initial_length = initial_length
+        self.MAXIMAL_SCORE_PER_APPLE = max_score_per_apple
+        self.MINIMAL_SCORE_PER_APPLE = min_score_per_apple
+        self.MAXIMAL_STEP_COUNT      = max_step_to_apple
+        self.MAXIMAL_STEPS_PER_GAME  = maximal_steps_per_game
+
+        # Random number generator used to spawn the apples
+        self._rng = np.random.default_rng(seed)
+
+        # The padded grid has the same layout as the occupancy grid of the Snake class: One column left and right of the board, one row below the board
+        # and initial_length rows above the board.
+        self._GRID_STRIDE = board_width + 2
+        self._GRID_OFFSET_Y = initial_length
+        grid_size = self._GRID_STRIDE * (board_height + initial_length + 1)
+        # Mask of all cells of the padded grid that are part of the game board
+        self._BOARD_MASK = np.zeros(grid_size, dtype=bool)
+        self._BOARD_MASK.reshape(-1, self._GRID_STRIDE)[initial_length:initial_length+board_height, 1:board_width+1] = True
+        # The snake can't be longer than the initial length plus one segment for every cell on the board
+        self._BODY_CAPACITY = board_width*board_height + initial_length + 1
+        # Used to index one element per game
+        self._ROWS = np.arange(n_games)
+
+        #   INITIAL STATE OF A SINGLE GAME
+        #
+        # The snake head will be placed in the middle of the first row. The body will be placed of screen. (Same as in the Snake class)
+        self._INITIAL_BODY = self._position_to_cell(np.full(initial_length, (board_width-1)//2), np.arange(0, -initial_length, -1))
+        self._INITIAL_OCCUPANCY = np.zeros(grid_size, dtype=bool)
+        self._INITIAL_OCCUPANCY[self._INITIAL_BODY] = True
+        initial_free_cells = np.flatnonzero(self._BOARD_MASK & ~self._INITIAL_OCCUPANCY)
+        self._INITIAL_FREE_CELLS = np.zeros(board_width*board_height, dtype=np.int32)
+        self._INITIAL_FREE_CELLS[:len(initial_free_cells)] = initial_free_cells
+        self._INITIAL_FREE_CELL_INDEX = np.full(grid_size, -1, dtype=np.int32)
+        self._INITIAL_FREE_CELL_INDEX[initial_free_cells] = np.arange(len(initial_free_cells))
+        self._INITIAL_FREE_CELL_COUNT = len(initial_free_cells)
+
+        #   STATE OF ALL GAMES
+        #
+        # Body of the snakes as ring buffers of cell indices. The head is at self._head_pointer, the tail at self._head_pointer+self.lengths-1.
+        self._body_cells = np.zeros((n_games, self._BODY_CAPACITY), dtype=np.int32)
+        self._head_pointer = np.zeros(n_games, dtype=np.int64)
+        self.lengths = np.zeros(n_games, dtype=np.int64)
+        # Occupancy grids. Every cell of the padded grid that is covered by a snake is True.
+        self._occupancy_grid = np.zeros((n_games, grid_size), dtype=bool)
+        # Index of free cells on the board (swap-remove arrays, same as in the Snake class)
+        self._free_cells = np.zeros((n_games, board_width*board_height), dtype=np.int32)
+        self._free_cell_index = np.zeros((n_games, grid_size), dtype=np.int32)
+        self._free_cell_count = np.zeros(n_games, dtype=np.int64)
+        # Position of the heads, moving direction of the snakes and position of the apples
+        self.heads = np.zeros((n_games, 2), dtype=np.int64)
+        self.directions = np.zeros((n_games, 2), dtype=np.int64)
+        self.apples = np.zeros((n_games, 2), dtype=np.int64)
+        # Score, number of steps since the last apple and number of steps since the start of every game
+        self.scores = np.zeros(n_games, dtype=np.int64)
+        self.step_counters = np.zeros(n_games, dtype=np.int64)
+        self.game_steps = np.zeros(n_games, dtype=np.int64)
+        # Score and number of steps of the last game that ended in every slot. Written before a game is reset.
+        self.final_scores = np.zeros(n_games, dtype=np.int64)
+        self.final_game_steps = np.zeros(n_games, dtype=np.int64)
+
+        # Start all games
+        self.reset()
+
+    def _position_to_cell(self, x, y):
+        """
+        Convert positions on the game board into indices of cells on the padded grid. Works with integers and numpy arrays.
+        """
+        return (y + self._GRID_OFFSET_Y) * self._GRID_STRIDE + (x + 1)
+
+    def _cell_to_position(self, cell):
+        """
+        Convert indices of cells on the padded grid into positions on the game board. Inverse of self._position_to_cell().
+
+        Returns
+        -------
+        np.ndarray
+            Positions on the game board. The last axis holds the x- and y-coordinate.
+
+        """
+        y, x = np.divmod(cell, self._GRID_STRIDE)
+        return np.stack([x - 1, y - self._GRID_OFFSET_Y], axis=-1)
+
+    def get_position_snake_body(self, game:int):
+        """
+        Get the position of the body of one snake in the same format as Snake.position_snake_body.
+
+        Parameters
+        ----------
+        game : int
+            Index of the game.
+
+        Returns
+        -------
+        list of np.ndarrays
+            Positions of the snake's body. The first element is the head. The last element is the tail.
+
+        """
+        pointers = (self._head_pointer[game] + np.arange(self.lengths[game])) % self._BODY_CAPACITY
+        return list(self._cell_to_position(self._body_cells[game, pointers]))
+
+    def get_bodies(self):
+        """
+        Get the bodies of all snakes in the format of the dataset (see dataset.py), so the features of all games can be computed with
+        NeuralNetwork.reduce_gameStates_dimensions().
+
+        Returns
+        -------
+        body : np.ndarray (sum of all lengths, 2)
+            Positions of the body segments of all games. The segments of every game start with the head.
+        body_offsets : np.ndarray (N+1,)
+            The body of game i is body[body_offsets[i]:body_offsets[i+1]].
+
+        """
+        body_offsets = np.concatenate([ [0], np.cumsum(self.lengths) ])
+        # Game and position in the body of every segment
+        games = np.repeat(self._ROWS, self.lengths)
+        pointers = (self._head_pointer[games] + np.arange(body_offsets[-1]) - body_offsets[games]) % self._BODY_CAPACITY
+        return self._cell_to_position(self._body_cells[games, pointers]), body_offsets
+
+    def _release_cells(self, games:np.ndarray, cells:np.ndarray):
+        """
+        Mark one cell per game as free and add it to the index of free cells. Vectorised version of Snake._release_cell().
+        """
+        self._occupancy_grid[games, cells] = False
+        # Only cells on the board can hold an apple
+        new = self._BOARD_MASK[cells] & (self._free_cell_index[games, cells] < 0)
+        games, cells = games[new], cells[new]
+        self._free_cells[games, self._free_cell_count[games]] = cells
+        self._free_cell_index[games, cells] = self._free_cell_count[games]
+        self._free_cell_count[games] += 1
+
+    def _occupy_cells(self, games:np.ndarray, cells:np.ndarray):
+        """
+        Mark one cell per game as occupied and remove it from the index of free cells. Vectorised version of Snake._occupy_cell().
+        """
+        self._occupancy_grid[games, cells] = True
+        index = self._free_cell_index[games, cells]
+        # Cells outside of the board and cells that are already occupied are not part of the index
+        free = index >= 0
+        games, cells, index = games[free], cells[free], index[free]
+        # Move the last free cell into the gap and shrink the arrays by one
+        self._free_cell_count[games] -= 1
+        last_cells = self._free_cells[games, self._free_cell_count[games]]
+        self._free_cells[games, index] = last_cells
+        self._free_cell_index[games, last_cells] = index
+        self._free_cell_index[games, cells] = -1
+
+    def _spawn_apples(self, games:np.ndarray):
+        """
+        Place a new apple on a random free cell of every game in games. Vectorised version of Snake._spawn_apple().
+
+        Parameters
+        ----------
+        games : np.ndarray
+            Indices of the games that need a new apple.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask over games. True if the board is full and the game is over.
+
+        """
+        counts = self._free_cell_count[games]
+        board_full = counts == 0
+        # Draw one uniform random free cell per game
+        pick = (self._rng.random(len(games)) * counts).astype(np.int64)
+        cells = self._free_cells[games, pick]
+        # Keep the old apple if there is no free cell left
+        self.apples[games[~board_full]] = self._cell_to_position(cells[~board_full])
+        return board_full
+
+    def reset(self, games:np.ndarray=None):
+        """
+        Start new games.
+
+        Parameters
+        ----------
+        games : np.ndarray, optional
+            Indices or boolean mask of the games to reset. The default is None (reset all games).
+
+        Returns
+        -------
+        None.
+
+        """
+        games = self._ROWS if games is None else self._ROWS[games]
+        if len(games) == 0: return
+
+        length = self.initial_length
+        self._body_cells[games, :length] = self._INITIAL_BODY
+        self._head_pointer[games] = 0
+        self.lengths[games] = length
+        self._occupancy_grid[games] = self._INITIAL_OCCUPANCY
+        self._free_cells[games] = self._INITIAL_FREE_CELLS
+        self._free_cell_index[games] = self._INITIAL_FREE_CELL_INDEX
+        self._free_cell_count[games] = self._INITIAL_FREE_CELL_COUNT
+        self.heads[games] = self._cell_to_position(self._INITIAL_BODY[0])
+        self.directions[games] = self._cell_to_position(self._INITIAL_BODY[0]) - self._cell_to_position(self._INITIAL_BODY[1])
+        self.scores[games] = 0
+        self.step_counters[games] = 0
+        self.game_steps[games] = 0
+
+        self._spawn_apples(games)
+
+    def step(self, actions):
+        """
+        Move the snakes of all games by one step. Games that end in this step are reset.
+
+        Parameters
+        ----------
+        actions : array of LEFT, FORWARD, RIGHT
+            One relative direction per game.
+
+        Raises
+        ------
+        ValueError
+            If actions has the wrong shape or contains something else than LEFT, FORWARD or RIGHT.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask over all games. True if the game ended in this step (the snake died, the board is full or the maximal number of steps was reached).
+            The score and the length of ended games can be found in self.final_scores and self.final_game_steps.
+
+        """
+        # >>>> CHECK IF INPUT IS VALID
+        #
+        actions = np.asarray(actions)
+        if actions.shape != (self.N_GAMES,):
+            raise ValueError(f"BatchSnake.step() expects one action per game (shape ({self.N_GAMES},)), got shape {actions.shape}.")
+        if not np.isin(actions, [LEFT, FORWARD, RIGHT]).all():
+            raise ValueError("Wrong value passed for parameter 'actions'. BatchSnake.step() expects the directions Snake.LEFT, Snake.FORWARD and Snake.RIGHT.")
+        #
+        # <<<< CHECK INPUT
+
+        # >>>> MOVE SNAKES AND DETECT APPLES
+        #
+        # CONVERT RELATIVE DIRECTIONS INTO ABSOLUTE DIRECTIONS
+        # Rotate the current direction by actions*90°. cos is 1 for FORWARD and 0 else, sin is equal to the relative direction.
+        cos, sin = 1 - np.abs(actions), actions
+        direction_x, direction_y = self.directions[:,0], self.directions[:,1]
+        self.directions = np.stack([ direction_x*cos - direction_y*sin, direction_x*sin + direction_y*cos ], axis=1)
+
+        # Increase the step counters by one. This is used for the score computation.
+        self.step_counters += 1
+        self.game_steps += 1
+
+        # Compute the future position of the snakes heads and check if they reached the apple
+        self.heads = self.heads + self.directions
+        collision_with_apple = (self.heads == self.apples).all(axis=1)
+
+        # Delete the tails of the snakes that didn't reach the apple. The tail is deleted before the head is placed (same as in the Snake class).
+        moving = self._ROWS[~collision_with_apple]
+        tail_pointer = (self._head_pointer[moving] + self.lengths[moving] - 1) % self._BODY_CAPACITY
+        self._release_cells(moving, self._body_cells[moving, tail_pointer].astype(np.int64))
+        self.lengths[moving] -= 1
+        #
+        # <<<< MOVE SNAKES AND DETECT APPLES
+
+        # >>>> COLLISION DETECTION WALL AND SNAKE
+        #
+        head_x, head_y = self.heads[:,0], self.heads[:,1]
+        # The padded grid is big enough to hold heads that left the board
+        head_cells = self._position_to_cell(head_x, head_y)
+        # COLLISION WITH WALL
+        dead = (head_x < 0) | (head_x >= self.BOARD_SIZE[0]) | (head_y < 0) | (head_y >= self.BOARD_SIZE[1])
+        # COLLISION WITH SNAKE
+        dead |= self._occupancy_grid[self._ROWS, head_cells]
+        #
+        # <<<< COLLISION DETECTION
+
+        # Add the heads at the beginning of the bodies
+        self._head_pointer = (self._head_pointer - 1) % self._BODY_CAPACITY
+        self._body_cells[self._ROWS, self._head_pointer] = head_cells
+        self.lengths += 1
+        self._occupy_cells(self._ROWS[~dead], head_cells[~dead])
+
+        # >>>> SPAWN APPLES AND UPDATE SCORES
+        #
+        eating = self._ROWS[collision_with_apple & ~dead]
+        dead[eating] |= self._spawn_apples(eating)
+        # Same formula as in Snake._update_score()
+        points = (self.MAXIMAL_SCORE_PER_APPLE-self.MINIMAL_SCORE_PER_APPLE) * np.exp(-(self.step_counters[eating]-1)/self.MAXIMAL_STEP_COUNT) + self.MINIMAL_SCORE_PER_APPLE
+        self.scores[eating] += (5 * np.round(points/5)).astype(np.int64)
+        self.step_counters[eating] = 0
+        #
+        # <<<< SPAWN APPLES AND UPDATE SCORES
+
+        # End games that took too long
+        if self.MAXIMAL_STEPS_PER_GAME is not None:
+            dead |= self.game_steps >= self.MAXIMAL_STEPS_PER_GAME
+
+        # Save the results of the ended games and start new ones
+        self.final_scores[dead] = self.scores[dead]
+        self.final_game_steps[dead] = self.game_steps[dead]
+        self.reset(dead)
+
+        return dead
+#
+#
+#   END OF CLASS BATCHSNAKE
+#
+#
+
+
+if __name__ == "__main__":
+
+    import time
+
+    # Measure the throughput with random walks
+    games = BatchSnake(n_games=10000, seed=0)
+    rng = np.random.default_rng(0)
+    steps = 200
+    start = time.perf_counter()
+    for _ in range(steps):
+        games.step(rng.integers(-1, 2, size=games.N_GAMES))
+    duration = time.perf_counter() - start
+    print(f"{games.N_GAMES*steps/duration:,.0f} steps per second")
@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the hot code paths of the snake game and the training data pipeline.
+
+Run a benchmark from the root of the repository, e.g. python -m benchmarks.spawn_apple, or all of them with python -m benchmarks (see benchmarks/__main__.py).
+"""
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run all benchmarks, save the results as json and compare them with the results of an earlier run.
+
+Run from the root of the repository:
+    python -m benchmarks --out results.json
+    python -m benchmarks --out new.json --compare results.json --threshold 0.2
+
+Every metric is saved with its unit and whether higher values are better. The size of the synthetic dataset is saved as run information
+next to the metrics, it's not a measurement. With --compare, every metric that got worse by more than the threshold (relative change) is
+reported as regression and the runner exits with status 1. Runs with a different dataset (--quick, --games, --steps) are not compared.
+"""
+
+# Used to parse the command line
+import argparse
+# Save the results as json
+import json
+# Information about the machine
+import platform
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks import engine, spawn_apple, features, snapshot, imports
+
+
+# Board occupancies for the spawn benchmark
+SPAWN_OCCUPANCIES = (0.1, 0.5, 0.9, 0.99)
+# Arguments that change what is measured. Runs are only compared if they agree on all of them.
+COMPARABLE_ARGUMENTS = ("quick", "games", "steps")
+
+
+def best_of(runs:list):
+    """
+    Merge the metrics of repeated runs. The best value of every metric is kept, because noise (other processes, cpu frequency) only makes
+    a run slower.
+
+    Parameters
+    ----------
+    runs : list of dicts
+        Metrics of every run (see run_once()).
+
+    Returns
+    -------
+    dict
+        The best metrics.
+
+    """
+    best = {}
+    for metrics in runs:
+        for name, metric in metrics.items():
+            if name not in best or ( metric["value"] > best[name]["value"] ) == metric["higher_is_better"]:
+                best[name] = metric
+    return best
+
+
+def run_all(quick:bool=False, games:int=200, steps_per_game:int=500, repeat:int=3):
+    """
+    Run all benchmarks several times and keep the best result of every metric.
+
+    Parameters
+    ----------
+    quick : bool, optional
+        Use fewer steps, apples and games. Faster, but noisier. The default is False.
+    games, steps_per_game : int, optional
+        Size of the synthetic dataset (see benchmarks.features.run()).
+    repeat : int, optional
+        Number of runs. The default is 3.
+
+    Returns
+    -------
+    metrics : dict
+        One entry per metric: {"value": float, "unit": str, "higher_is_better": bool}.
+    dataset : dict
+        Size of the synthetic dataset: {"game_states": int}.
+
+    """
+    runs = [ run_once(quick, games, steps_per_game) for _ in range(repeat) ]
+    return best_of([ metrics for metrics, _ in runs ]), runs[-1][1]
+
+
+def run_once(quick:bool=False, games:int=200, steps_per_game:int=500):
+    """
+    Run all benchmarks once. Returns the metrics and the size of the synthetic dataset, see run_all().
+    """
+    metrics = {}
+
+    # Snake.move
+    result = engine.run(steps=10000 if quick else 100000)
+    metrics["move_relative"] = {"value": result["relative"], "unit": "steps/s", "higher_is_better": True}
+    metrics["move_absolute"] = {"value": result["absolute"], "unit": "steps/s", "higher_is_better": True}
+
+    # Snake._spawn_apple
+    for occupancy in SPAWN_OCCUPANCIES:
+        result = spawn_apple.run(occupancy, repeat=2000 if quick else 20000, rejection_sampling=False)
+        metrics[f"spawn_apple_{occupancy:.2f}"] = {"value": result["free_cell_index"]*1e6, "unit": "us", "higher_is_better": False}
+
+    # Snake.snapshot, Snake.restore, Snake.clone, Snake.push_state/pop_state
+    result = snapshot.run()
+    for name in ("snapshot", "restore", "clone", "push_pop"):
+        metrics[name] = {"value": result[name]*1e6, "unit": "us", "higher_is_better": False}
+
+    # Import time of the headless modules (on top of numpy)
+    result = imports.run(repeat=2 if quick else 5)
+    for module in ("snake", "neural_network"):
+        metrics[f"import_{module}"] = {"value": result[module]["overhead"]*1e3, "unit": "ms", "higher_is_better": False}
+
+    # Features and training data
+    result = features.run(games=games//10 if quick else games, steps_per_game=steps_per_game)
+    for name in ("reduce_gameState_dimensions", "reduce_gameStates_dimensions", "preprocess_gameStates"):
+        metrics[name] = {"value": result[name], "unit": "states/s", "higher_is_better": True}
+    metrics["preprocess_trainingDataFile"] = {"value": result["preprocess_trainingDataFile"], "unit": "s", "higher_is_better": False}
+    metrics["preprocess_trainingDataFile_parallel"] = {"value": result["preprocess_trainingDataFile_parallel"], "unit": "s", "higher_is_better": False}
+
+    return metrics, {"game_states": result["game_states"]}
+
+
+def compare(metrics:dict, baseline:dict, threshold:float=0.2):
+    """
+    Compare the metrics of two runs.
+
+    Parameters
+    ----------
+    metrics : dict
+        Metrics of the new run (see run_all()).
+    baseline : dict
+        Metrics of the old run.
+    threshold : float, optional
+        Allowed relative change for the worse. The default is 0.2 (20%).
+
+    Returns
+    -------
+    list of tuples
+        (name, old value, new value, relative change, regression) for every metric in both runs. The relative change is positive if the metric got better.
+
+    """
+    rows = []
+    for name, metric in metrics.items():
+        if name not in baseline: continue
+        old, new = baseline[name]["value"], metric["value"]
+        change = (new - old)/old if metric["higher_is_better"] else (old - new)/old
+        rows.append((name, old, new, change, change < -threshold))
+    return rows
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Run the benchmarks of the snake game and the training data pipeline.")
+    parser.add_argument("--out", type=Path, help="save the results to this json file")
+    parser.add_argument("--compare", type=Path, help="json file of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative change for the worse (default 0.2)")
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions and a smaller synthetic dataset")
+    parser.add_argument("--games", type=int, default=200, help="number of games in the synthetic dataset")
+    parser.add_argument("--steps", type=int, default=500, help="maximal number of steps per game in the synthetic dataset")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs, the best result of every metric is kept (default 3)")
+    arguments = parser.parse_args()
+
+    run_arguments = {"quick": arguments.quick, "games": arguments.games, "steps": arguments.steps, "repeat": arguments.repeat}
+    if arguments.compare is not None:
+        # Check before running the benchmarks, metrics of different datasets can't be compared
+        baseline = json.loads(arguments.compare.read_text())
+        baseline_arguments = baseline.get("arguments", {})
+        different = [ f"{name}={baseline_arguments.get(name)}" for name in COMPARABLE_ARGUMENTS if baseline_arguments.get(name) != run_arguments[name] ]
+        if different: parser.error(f"{arguments.compare} was run with a different dataset ({', '.join(different)}), the metrics can't be compared")
+
+    metrics, dataset = run_all(arguments.quick, arguments.games, arguments.steps, arguments.repeat)
+
+    for name, metric in metrics.items():
+        print(f"{name:32s} {metric['value']:14.2f} {metric['unit']}")
+    print(f"synthetic dataset: {dataset['game_states']} game states")
+
+    if arguments.out is not None:
+        arguments.out.write_text(json.dumps({"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                             "python": sys.version.split()[0],
+                                             "numpy": np.__version__,
+                                             "platform": platform.platform(),
+                                             "arguments": run_arguments,
+                                             "dataset": dataset,
+                                             "metrics": metrics}, indent=2) + "\n")
+
+    if arguments.compare is not None:
+        rows = compare(metrics, baseline["metrics"], arguments.threshold)
+        print(f"\nComparison with {arguments.compare} (threshold {arguments.threshold:.0%}):")
+        for name, old, new, change, regression in rows:
+            print(f"{name:32s} {old:14.2f} -> {new:14.2f} {change:+8.1%}{'  REGRESSION' if regression else ''}")
+        if any( row[-1] for row in rows ): sys.exit(1)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Snake.move with relative and absolute directions.
+
+The snake walks in a small square, so it survives long enough to measure the game logic and not the setup of new games. If the snake dies anyway
+(it grows when the apple lies on the square), a new game is started. Only the calls of Snake.move are timed.
+
+Run from the root of the repository: python -m benchmarks.engine
+"""
+
+# Used to measure the time
+from time import perf_counter
+from itertools import cycle
+
+from snake import Snake, NORTH, EAST, SOUTH, WEST, FORWARD, RIGHT
+
+
+# The snake walks three steps, then turns. Relative directions: turn right every fourth step.
+RELATIVE_SQUARE = [FORWARD, FORWARD, FORWARD, RIGHT]
+# Absolute directions: the same square. The snake starts walking SOUTH.
+ABSOLUTE_SQUARE = [SOUTH, SOUTH, SOUTH, WEST, WEST, WEST, NORTH, NORTH, NORTH, EAST, EAST, EAST]
+
+
+def measure_move(directions:list, steps:int=100000, seed:int=0):
+    """
+    Move the snake with a repeating sequence of directions and measure the number of steps per second.
+
+    Parameters
+    ----------
+    directions : list
+        Directions passed to Snake.move(), repeated until the number of steps is reached.
+    steps : int, optional
+        Number of steps. The default is 100000.
+    seed : int, optional
+        Seed of the games. The default is 0.
+
+    Returns
+    -------
+    dict
+        steps_per_second and the number of games that were started.
+
+    """
+    snake, games, elapsed = Snake(seed=seed), 1, 0.0
+
+    for _, direction in zip(range(steps), cycle(directions)):
+        start = perf_counter()
+        dead = snake.move(direction)
+        elapsed += perf_counter() - start
+        if dead:
+            snake, games = Snake(seed=seed+games), games+1
+
+    return {"steps_per_second": steps/elapsed, "games": games}
+
+
+def run(steps:int=100000):
+    """
+    Measure Snake.move with relative and absolute directions.
+
+    Parameters
+    ----------
+    steps : int, optional
+        Number of steps per measurement. The default is 100000.
+
+    Returns
+    -------
+    dict
+        Steps per second for relative and absolute directions.
+
+    """
+    return {"relative": measure_move(RELATIVE_SQUARE, steps)["steps_per_second"],
+            "absolute": measure_move(ABSOLUTE_SQUARE, steps)["steps_per_second"]}
+
+
+if __name__ == "__main__":
+
+    result = run()
+    print(f"Relative directions: {result['relative']:10.0f} steps/s")
+    print(f"Absolute directions: {result['absolute']:10.0f} steps/s")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark the preprocessing of training data: the features of single game states (NeuralNetwork.reduce_gameState_dimensions), the batched
+features (NeuralNetwork.reduce_gameStates_dimensions), NeuralNetwork.preprocess_gameStates and loading a directory of recorded games with
+NeuralNetwork.preprocess_trainingDataFile (in this process and with one worker process per core).
+
+The benchmark plays random games with a fixed seed (NeuralNetwork.generate_random_training_data), so every run uses the same synthetic data.
+
+Run from the root of the repository: python -m benchmarks.features
+"""
+
+# Used to measure the time
+from time import perf_counter
+# Number of cores for the parallel preprocessing
+import os
+from timeit import Timer
+# The synthetic training data is written into a temporary directory
+from tempfile import TemporaryDirectory
+from pathlib import Path
+
+import numpy as np
+
+from neural_network import NeuralNetwork
+from dataset import list_game_files, states_to_columns
+from game_log import read_game_states
+
+
+def make_synthetic_data(directory:Path, games:int=200, steps_per_game:int=500, seed:int=0):
+    """
+    Write random games into a directory.
+
+    Parameters
+    ----------
+    directory : Path
+        Directory for the recorded games.
+    games : int, optional
+        Number of games. The default is 200.
+    steps_per_game : int, optional
+        Maximal number of steps per game. The default is 500.
+    seed : int, optional
+        Master seed of the games. The default is 0.
+
+    Returns
+    -------
+    list of Paths
+        The recorded games.
+
+    """
+    NeuralNetwork().generate_random_training_data(directory, training_games=games, maximal_steps_per_game=steps_per_game, seed=seed)
+    return list_game_files([directory])
+
+
+def run(games:int=200, steps_per_game:int=500, seed:int=0, workers:int=None):
+    """
+    Measure the throughput of the feature code and the time needed to load a directory of recorded games.
+
+    Parameters
+    ----------
+    games, steps_per_game, seed : int, optional
+        Size and seed of the synthetic dataset (see make_synthetic_data()).
+    workers : int, optional
+        Number of processes for the parallel preprocess_trainingDataFile. The default is None (one per core).
+
+    Returns
+    -------
+    dict
+        Game states per second of reduce_gameState_dimensions, reduce_gameStates_dimensions and preprocess_gameStates, the time in seconds
+        of preprocess_trainingDataFile (in this process and with workers processes) and the number of game states in the synthetic dataset.
+
+    """
+    network = NeuralNetwork()
+
+    with TemporaryDirectory() as directory:
+        files = make_synthetic_data(Path(directory), games, steps_per_game, seed)
+        gameStates = [ state for file in files for state in read_game_states(file) ]
+        columns = states_to_columns(gameStates)
+
+        # Single game states
+        start = perf_counter()
+        for gameState in gameStates:
+            network.reduce_gameState_dimensions(gameState)
+        single = len(gameStates)/(perf_counter() - start)
+
+        # All game states at once. One call is too fast to be measured reliably, so it is repeated for at least 0.2 seconds.
+        directions = columns["head"].astype(np.int64) - columns["body"][columns["body_offsets"][:-1]+1]
+        number, elapsed = Timer(lambda: network.reduce_gameStates_dimensions(columns["head"], directions, columns["apple"], columns["board_size"],
+                                                                            columns["body"], columns["body_offsets"])).autorange()
+        batched = number*len(gameStates)/elapsed
+
+        start = perf_counter()
+        network.preprocess_gameStates(gameStates)
+        preprocess = len(gameStates)/(perf_counter() - start)
+
+        # Read and preprocess all files without cache
+        start = perf_counter()
+        network.preprocess_trainingDataFile([directory])
+        load_time = perf_counter() - start
+
+        # The same with a pool of processes
+        start = perf_counter()
+        network.preprocess_trainingDataFile([directory], workers=workers or os.cpu_count() or 1)
+        parallel_load_time = perf_counter() - start
+
+    return {"reduce_gameState_dimensions": single,
+            "reduce_gameStates_dimensions": batched,
+            "preprocess_gameStates": preprocess,
+            "preprocess_trainingDataFile": load_time,
+            "preprocess_trainingDataFile_parallel": parallel_load_time,
+            "game_states": len(gameStates)}
+
+
+if __name__ == "__main__":
+
+    result = run()
+    print(f"Synthetic dataset:            {result['game_states']:10d} game states")
+    print(f"reduce_gameState_dimensions:  {result['reduce_gameState_dimensions']:10.0f} states/s")
+    print(f"reduce_gameStates_dimensions: {result['reduce_gameStates_dimensions']:10.0f} states/s")
+    print(f"preprocess_gameStates:        {result['preprocess_gameStates']:10.0f} states/s")
+    print(f"preprocess_trainingDataFile:  {result['preprocess_trainingDataFile']:10.3f} s")
+    print(f"{'  with ' + str(os.cpu_count()) + ' workers:':30s}{result['preprocess_trainingDataFile_parallel']:10.3f} s")
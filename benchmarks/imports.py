@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark the import time of the headless modules and check it against a budget.
+
+Worker processes (generate_random_training_data, VectorSnakeEnv, render_games) import the game logic on startup. The headless modules must
+not import pygame or tqdm (they are imported when a game is drawn or a progress bar is shown) and their import may only cost a little
+more than importing numpy. Every import is measured in a new python process, so nothing is cached.
+
+Run from the root of the repository: python -m benchmarks.imports
+The exit status is 1, if a module is over budget or imports pygame or tqdm.
+"""
+
+# Start new python processes
+import subprocess
+import sys
+import json
+from pathlib import Path
+
+
+# Modules that must stay headless
+HEADLESS_MODULES = ("snake", "game_log", "neural_network", "batch_snake", "dataset", "shards")
+# Modules that headless modules must not import
+FORBIDDEN_MODULES = ("pygame", "tqdm")
+# Allowed import time on top of importing numpy (seconds)
+IMPORT_BUDGET = 0.1
+
+# Measures the import in the new process and prints the time and the forbidden modules that were imported
+_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "forbidden": [ name for name in {forbidden!r} if name in sys.modules ]}}))
+"""
+
+
+def measure_import(module:str, repeat:int=5):
+    """
+    Import a module in new python processes and measure the time.
+
+    Parameters
+    ----------
+    module : str
+        Name of the module.
+    repeat : int, optional
+        Number of processes. The default is 5.
+
+    Returns
+    -------
+    dict
+        seconds (the fastest import) and forbidden (forbidden modules that were imported).
+
+    """
+    root = Path(__file__).resolve().parent.parent
+    results = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", _SCRIPT.format(module=module, forbidden=FORBIDDEN_MODULES)],
+                                cwd=root, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {"seconds": min( result["seconds"] for result in results ), "forbidden": results[0]["forbidden"]}
+
+
+def run(repeat:int=5):
+    """
+    Measure the import time of numpy and of all headless modules.
+
+    Parameters
+    ----------
+    repeat : int, optional
+        Number of processes per module. The default is 5.
+
+    Returns
+    -------
+    dict
+        One entry per module: seconds, overhead (seconds minus the import time of numpy), forbidden and over_budget.
+
+    """
+    numpy_seconds = measure_import("numpy", repeat)["seconds"]
+    results = {"numpy": {"seconds": numpy_seconds, "overhead": 0.0, "forbidden": [], "over_budget": False}}
+    for module in HEADLESS_MODULES:
+        result = measure_import(module, repeat)
+        result["overhead"] = result["seconds"] - numpy_seconds
+        result["over_budget"] = result["overhead"] > IMPORT_BUDGET or len(result["forbidden"]) > 0
+        results[module] = result
+    return results
+
+
+if __name__ == "__main__":
+
+    results = run()
+    for module, result in results.items():
+        print(f"{module:16s} {result['seconds']*1e3:8.1f} ms  (+{result['overhead']*1e3:6.1f} ms over numpy)"
+              f"{'  imports ' + ', '.join(result['forbidden']) if result['forbidden'] else ''}{'  OVER BUDGET' if result['over_budget'] else ''}")
+    if any( result["over_budget"] for result in results.values() ): sys.exit(1)
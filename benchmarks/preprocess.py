@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark how NeuralNetwork.preprocess_trainingDataFile scales with the number of worker processes.
+
+The recorded games are preprocessed once without workers and once for every number of workers (without cache). The speedup is the time
+without workers divided by the time with workers, the efficiency is the speedup divided by the number of workers (1.0 = linear scaling).
+By default, the worker counts are 2, 4, 8, ... up to the number of cores. More workers than cores can't be faster.
+
+Run from the root of the repository: python -m benchmarks.preprocess training_data/human_walk training_data/random_walk
+"""
+
+# Used to parse the command line
+import argparse
+# Used to measure the time
+from time import perf_counter
+# Number of cores
+import os
+from pathlib import Path
+
+from neural_network import NeuralNetwork
+from dataset import list_game_files
+
+
+def default_workers():
+    """
+    Worker counts for the benchmark: 2, 4, 8, ... up to the number of cores (the number of cores is always included, if it's more than 1).
+
+    Returns
+    -------
+    list of ints
+        The worker counts.
+
+    """
+    cores = os.cpu_count() or 1
+    workers = []
+    count = 2
+    while count < cores:
+        workers.append(count)
+        count *= 2
+    if cores > 1: workers.append(cores)
+    return workers
+
+
+def run(directories:list, workers:list=None):
+    """
+    Preprocess the recorded games without workers and with every number of workers.
+
+    Parameters
+    ----------
+    directories : list of Paths
+        Directories with recorded games (*.json, *.snakelog).
+    workers : list of ints, optional
+        Worker counts. The default is None (see default_workers()).
+
+    Returns
+    -------
+    dict
+        cores, files, game_states and one entry per worker count (1 = without workers): seconds, files_per_second, speedup and efficiency.
+
+    """
+    if workers is None: workers = default_workers()
+    network = NeuralNetwork()
+    files = list_game_files(directories)
+
+    results = {"cores": os.cpu_count() or 1, "files": len(files)}
+    for count in [1] + [ count for count in workers if count > 1 ]:
+        start = perf_counter()
+        input_state, _, _ = network.preprocess_trainingDataFile(directories, workers=count)
+        seconds = perf_counter() - start
+        results["game_states"] = len(input_state)
+        speedup = results[1]["seconds"]/seconds if count > 1 else 1.0
+        results[count] = {"seconds": seconds, "files_per_second": len(files)/seconds, "speedup": speedup, "efficiency": speedup/count}
+    return results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Measure how preprocessing recorded games scales with the number of worker processes.")
+    parser.add_argument("directories", type=Path, nargs="+", help="directories with recorded games (*.json, *.snakelog)")
+    parser.add_argument("--workers", type=int, nargs="*", default=None, help="worker counts (default 2, 4, 8, ... up to the number of cores)")
+    arguments = parser.parse_args()
+
+    results = run(arguments.directories, arguments.workers)
+    print(f"{results['files']} files, {results['game_states']} game states, {results['cores']} cores")
+    for count, result in results.items():
+        if not isinstance(count, int): continue
+        print(f"{count:3d} workers {result['seconds']:8.2f} s {result['files_per_second']:10.0f} files/s "
+              f"speedup {result['speedup']:5.2f} efficiency {result['efficiency']:5.2f}")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark saving and restoring the state of a game (Snake.snapshot, Snake.restore, Snake.clone, Snake.push_state/pop_state) and compare it
+with copy.deepcopy, which was needed before to simulate moves without changing the game.
+
+The target for lookahead search is thousands of snapshots (and restores) per millisecond. Results slower than that are marked.
+
+Run from the root of the repository: python -m benchmarks.snapshot
+"""
+
+# Used to measure the time
+import timeit
+import copy
+
+from snake import Snake
+from benchmarks.spawn_apple import fill_board
+
+
+# Seconds per call for a thousand calls per millisecond
+TARGET = 1e-6
+
+
+def measure(function):
+    """
+    Time a function without arguments.
+
+    Returns
+    -------
+    float
+        Seconds per call.
+
+    """
+    calls, seconds = timeit.Timer(function).autorange()
+    return seconds/calls
+
+
+def run(occupancy:float=0.1):
+    """
+    Measure the cost of saving and restoring the state of a game.
+
+    Parameters
+    ----------
+    occupancy : float, optional
+        Fraction of the board covered by the snake (see benchmarks.spawn_apple.fill_board()). The default is 0.1.
+
+    Returns
+    -------
+    dict
+        Seconds per call of snapshot, restore, clone, push_pop (push_state and pop_state) and deepcopy.
+
+    """
+    snake = fill_board(Snake(seed=0), occupancy)
+    state = snake.snapshot()
+
+    def push_pop():
+        snake.push_state()
+        snake.pop_state()
+
+    return {"snapshot": measure(snake.snapshot),
+            "restore": measure(lambda: snake.restore(state)),
+            "clone": measure(snake.clone),
+            "push_pop": measure(push_pop),
+            "deepcopy": measure(lambda: copy.deepcopy(snake))}
+
+
+if __name__ == "__main__":
+
+    result = run()
+    for name, seconds in result.items():
+        print(f"{name:10s} {seconds*1e6:10.2f} us {1e-3/seconds:10.1f} per ms{'  SLOWER THAN TARGET' if seconds > TARGET else ''}")
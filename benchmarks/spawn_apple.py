@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Snake._spawn_apple on a nearly full board.
+
+The benchmark fills 95% of a 32x18 board with the body of the snake and compares the index of free cells (Snake._spawn_apple)
+with the rejection sampling that was used before (draw random positions until one is not part of the snake's body).
+
+Run from the root of the repository: python -m benchmarks.spawn_apple
+"""
+
+# Used to measure the time
+import timeit
+# Used to generate random coordinates
+from random import randint
+from collections import deque
+
+import numpy as np
+
+from snake import Snake
+
+
+def fill_board(snake:Snake, occupancy:float):
+    """
+    Lay the body of the snake in a serpentine path over the board, until the requested fraction of the board is covered.
+
+    Parameters
+    ----------
+    snake : Snake
+        The game. Its body, occupancy grid and index of free cells will be overwritten.
+    occupancy : float
+        Fraction of the board that should be covered by the snake (between 0 and 1).
+
+    Returns
+    -------
+    Snake
+        The same game with a long snake.
+
+    """
+    width, height = snake.BOARD_SIZE
+    # Walk row by row and change the direction in every row
+    path = [ (x if y % 2 == 0 else width-1-x, y) for y in range(height) for x in range(width) ]
+    length = max(2, int(occupancy*width*height))
+    
+    # The head is the last cell of the path
+    snake._body_cells = deque( snake._position_to_cell(x, y) for x, y in reversed(path[:length]) )
+    snake._occupancy_grid[:] = False
+    snake._occupancy_grid[list(snake._body_cells)] = True
+    snake._rebuild_free_cells()
+    return snake
+
+
+def spawn_apple_rejection_sampling(snake:Snake):
+    """
+    The old implementation of Snake._spawn_apple. Draws random positions until one is found, that is not part of the snake's body.
+
+    Parameters
+    ----------
+    snake : Snake
+        The game.
+
+    Returns
+    -------
+    np.ndarray
+        Position of the new apple.
+
+    """
+    position_snake_body = snake.position_snake_body
+    while True:
+        new_position = np.array([randint(0, snake._get_max_x()), randint(0, snake._get_max_y())])
+        if not snake._is_array_in_list(new_position, position_snake_body):
+            return new_position
+
+
+def run(occupancy:float=0.95, repeat:int=200, rejection_sampling:bool=True):
+    """
+    Measure the mean time needed to spawn one apple with both methods.
+
+    Parameters
+    ----------
+    occupancy : float, optional
+        Fraction of the board that is covered by the snake. The default is 0.95.
+    repeat : int, optional
+        Number of apples spawned per method. The default is 200.
+    rejection_sampling : bool, optional
+        Also measure the old method. It is very slow on a nearly full board. The default is True.
+
+    Returns
+    -------
+    dict
+        Mean time per spawned apple in seconds for both methods (only free_cell_index, if rejection_sampling is False).
+
+    """
+    snake = fill_board(Snake(board_width=32, board_height=18), occupancy)
+    # Warm up (first call allocates the random number generator's internal state, caches, ...)
+    snake._spawn_apple()
+    
+    result = {"free_cell_index": timeit.timeit(snake._spawn_apple, number=repeat)/repeat}
+    if rejection_sampling:
+        result["rejection_sampling"] = timeit.timeit(lambda: spawn_apple_rejection_sampling(snake), number=repeat)/repeat
+    return result
+
+
+if __name__ == "__main__":
+    
+    result = run()
+    print(f"Free cell index:    {result['free_cell_index']*1e6:10.1f} µs per apple")
+    print(f"Rejection sampling: {result['rejection_sampling']*1e6:10.1f} µs per apple")
+    print(f"Speedup:            {result['rejection_sampling']/result['free_cell_index']:10.1f}x")
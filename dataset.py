@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:05:31 2026
+
+@author: jonas
+
+
+This file implements a binary format for the training data. All recorded games are converted once into a directory of .npy files
+(one file per column) that can be opened with np.memmap. Reading the training data is then almost free: there is no json to parse and
+slicing the dataset doesn't copy anything.
+
+Columns (one row per game state):
+    head                            int16 (N, 2)   position of the snake's head
+    apple                           int16 (N, 2)   position of the apple
+    board_size                      int16 (N, 2)   width and height of the board
+    next_action                     int8  (N,)     LEFT, FORWARD or RIGHT
+    next_action_deadly              bool  (N,)     True if the snake died with the next action
+    steps_walked_since_last_apple   int32 (N,)     step counter of the game
+    body_offsets                    int64 (N+1,)   the body of state i is body[body_offsets[i]:body_offsets[i+1]]
+    body                            int16 (M, 2)   positions of all body segments of all states (head first)
+    game_offsets                    int64 (G+1,)   the states of game j are the rows game_offsets[j]:game_offsets[j+1]
+
+"""
+
+# Import Pathlib for reading, writing files
+from pathlib import Path
+# Store the description of the dataset as json
+import json
+
+import numpy as np
+
+# Read recorded games in every supported file format
+from game_log import read_game_states
+# Read containers with many recorded games
+from shards import is_container, ShardedGames
+
+
+# Data type and shape of every column (without the number of rows)
+COLUMNS = {"head":                          (np.int16, (2,)),
+           "apple":                         (np.int16, (2,)),
+           "board_size":                    (np.int16, (2,)),
+           "next_action":                   (np.int8,  ()),
+           "next_action_deadly":            (np.bool_, ()),
+           "steps_walked_since_last_apple": (np.int32, ()),
+           "body_offsets":                  (np.int64, ()),
+           "body":                          (np.int16, (2,)),
+           "game_offsets":                  (np.int64, ())}
+
+# Version of the dataset format. Increase it, if the columns change.
+DATASET_VERSION = 1
+
+
+class _ColumnWriter:
+    """
+    Append rows to a column on disk. The rows are written into a raw temporary file first, because the final length of the column is not known
+    before all games are read. close() converts the raw file into a .npy file.
+    """
+
+    def __init__(self, path:Path, dtype, shape:tuple):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.shape = shape
+        self.rows = 0
+        self._raw_path = path.with_suffix(".tmp")
+        self._raw_file = open(self._raw_path, "wb")
+
+    def append(self, rows):
+        """
+        Append rows to the end of the column.
+        """
+        rows = np.ascontiguousarray(rows, dtype=self.dtype).reshape((-1,) + self.shape)
+        self._raw_file.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def close(self, chunk_size:int=1<<20):
+        """
+        Write the .npy file and delete the temporary file.
+        """
+        self._raw_file.close()
+        # Copy the raw data chunk wise into a .npy file, so memory stays bounded
+        raw = np.memmap(self._raw_path, dtype=self.dtype, mode="r", shape=(self.rows,) + self.shape) if self.rows > 0 else np.zeros((0,) + self.shape, dtype=self.dtype)
+        column = np.lib.format.open_memmap(self.path, mode="w+", dtype=self.dtype, shape=(self.rows,) + self.shape)
+        for start in range(0, self.rows, chunk_size):
+            column[start:start+chunk_size] = raw[start:start+chunk_size]
+        column.flush()
+        del raw, column
+        self._raw_path.unlink()
+
+
+def list_game_files(directories:list):
+    """
+    List all recorded games (*.json and *.snakelog) in a list of directories.
+
+    Parameters
+    ----------
+    directories : list of Paths
+        Directories with recorded games.
+
+    Returns
+    -------
+    list of Paths
+        All recorded games. Sorted by file name within every directory.
+
+    """
+    return [ file for folder in directories for file in sorted([*Path(folder).glob("*.json"), *Path(folder).glob("*.snakelog")]) ]
+
+
+def iter_recorded_games(directories:list):
+    """
+    Read all recorded games of a list of directories one after another. A directory is either a container written by shards.ShardWriter
+    (read through its index) or a directory with one file per game (see list_game_files()).
+
+    Parameters
+    ----------
+    directories : list of Paths
+        Containers or directories with recorded games.
+
+    Yields
+    ------
+    source : Path or str
+        The file of the game or "CONTAINER::NAME" for a game in a container.
+    gameStates : list of dicts
+        The game states (see game_log.read_game_states()).
+
+    """
+    for folder in directories:
+        if is_container(folder):
+            with ShardedGames(folder) as games:
+                for game_log, name in zip(games, games.names):
+                    yield f"{folder}::{name}", list(game_log.replay())
+        else:
+            for file in list_game_files([folder]):
+                yield file, read_game_states(file)
+
+
+def states_to_columns(gameStates:list):
+    """
+    Convert the game states of one game into columns. The body offsets start at 0.
+
+    Parameters
+    ----------
+    gameStates : list of dicts
+        Game states in the format written by NeuralNetwork.move() (see game_log.read_game_states()).
+
+    Returns
+    -------
+    dict
+        One numpy array per column (except game_offsets). See the description of this module.
+
+    """
+    bodies = [ state["snake_position"] for state in gameStates ]
+    lengths = np.array([ len(body) for body in bodies ], dtype=np.int64)
+
+    columns = {"head":                          [ body[0] for body in bodies ],
+               "apple":                         [ state["apple_position"] for state in gameStates ],
+               "board_size":                    [ state["board_size"] for state in gameStates ],
+               "next_action":                   [ state["next_action"] for state in gameStates ],
+               "next_action_deadly":            [ state["next_action_deadly"] for state in gameStates ],
+               "steps_walked_since_last_apple": [ state["steps_walked_since_last_apple"] for state in gameStates ],
+               "body_offsets":                  np.concatenate([ [0], np.cumsum(lengths) ]),
+               "body":                          [ segment for body in bodies for segment in body ]}
+
+    return { name: np.asarray(column, dtype=COLUMNS[name][0]).reshape((-1,) + COLUMNS[name][1]) for name, column in columns.items() }
+
+
+def build_dataset(directories:list, out:Path):
+    """
+    Convert all recorded games in a list of directories into the binary dataset format. This only needs to be done once.
+
+    Parameters
+    ----------
+    directories : list of Paths
+        Directories with recorded games (*.json or *.snakelog) or containers (see shards.py).
+    out : Path
+        Directory for the dataset. Non existing directory will be created. An existing dataset will be overwritten.
+
+    Returns
+    -------
+    TrainingDataset
+        The new dataset.
+
+    """
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    # Mark an existing dataset as incomplete, until the new one is written
+    (out/"dataset.json").unlink(missing_ok=True)
+    included_files = []
+
+    writers = { name: _ColumnWriter(out/f"{name}.npy", dtype, shape) for name, (dtype, shape) in COLUMNS.items() }
+    # The offsets start with 0
+    writers["body_offsets"].append([0])
+    writers["game_offsets"].append([0])
+
+    for file, gameStates in iter_recorded_games(directories):
+        if len(gameStates) == 0: continue
+        included_files.append(str(file))
+
+        columns = states_to_columns(gameStates)
+        # The body offsets point into the body column of the whole dataset
+        columns["body_offsets"] = columns["body_offsets"][1:] + writers["body"].rows
+        for name, column in columns.items():
+            writers[name].append(column)
+        writers["game_offsets"].append([ writers["head"].rows ])
+
+    for writer in writers.values():
+        writer.close()
+
+    # Write the description of the dataset last. A dataset without description is incomplete.
+    (out/"dataset.json").write_text(json.dumps({"version": DATASET_VERSION,
+                                                "n_states": writers["head"].rows,
+                                                "n_games": writers["game_offsets"].rows - 1,
+                                                "files": included_files}) + "\n")
+
+    return TrainingDataset(out)
+
+
+class TrainingDataset:
+    """
+    Read-only view of a dataset written by build_dataset(). The columns are memory-mapped, so opening the dataset is cheap and slicing it
+    (dataset[start:stop]) doesn't copy any data.
+    """
+
+    def __init__(self, path:Path, mmap_mode:str="r"):
+        """
+        Open a dataset.
+
+        Parameters
+        ----------
+        path : Path
+            Directory of the dataset.
+        mmap_mode : str, optional
+            Passed to np.load(). The default is "r" (read-only memory map). Use None to load the whole dataset into memory.
+
+        Raises
+        ------
+        ValueError
+            If the dataset is incomplete or was written by another version of build_dataset().
+
+        Returns
+        -------
+        Instance of the TrainingDataset class.
+
+        """
+        self.path = Path(path)
+        if not (self.path/"dataset.json").exists(): raise ValueError(f"{self.path} is not a complete dataset. Use build_dataset() to create it.")
+        self.meta = json.loads((self.path/"dataset.json").read_text())
+        if self.meta["version"] != DATASET_VERSION:
+            raise ValueError(f"The dataset {self.path} has version {self.meta['version']}, but version {DATASET_VERSION} is needed. Rebuild it with build_dataset().")
+
+        for name in COLUMNS:
+            setattr(self, name, np.load(self.path/f"{name}.npy", mmap_mode=mmap_mode))
+
+    def __len__(self):
+        """
+        Number of game states in the dataset.
+        """
+        return len(self.head)
+
+    def __getitem__(self, index:slice):
+        """
+        Get a part of the dataset without copying it.
+
+        Parameters
+        ----------
+        index : slice
+            Rows of the dataset. Only slices with step 1 are supported.
+
+        Returns
+        -------
+        TrainingDataset
+            View of the selected game states. The body and the game offsets are shared with the original dataset.
+
+        """
+        if not isinstance(index, slice): raise TypeError("TrainingDataset only supports slices. Use TrainingDataset.game_state() to get a single game state.")
+        start, stop, step = index.indices(len(self))
+        if step != 1: raise ValueError("TrainingDataset only supports slices with step 1.")
+
+        view = object.__new__(TrainingDataset)
+        view.path, view.meta = self.path, self.meta
+        for name in COLUMNS:
+            setattr(view, name, getattr(self, name))
+        for name in ("head", "apple", "board_size", "next_action", "next_action_deadly", "steps_walked_since_last_apple"):
+            setattr(view, name, getattr(self, name)[start:stop])
+        # The offsets point into the full body column
+        view.body_offsets = self.body_offsets[start:max(start, stop)+1]
+        return view
+
+    def get_position_snake_body(self, index:int):
+        """
+        Get the position of the snake's body of one game state without copying it.
+
+        Returns
+        -------
+        np.ndarray
+            Positions of the body segments. The first element is the head.
+
+        """
+        return self.body[self.body_offsets[index]:self.body_offsets[index+1]]
+
+    def game_state(self, index:int):
+        """
+        Get one game state in the format written by NeuralNetwork.move() (see game_log.GameLog.replay()).
+
+        Returns
+        -------
+        dict
+            The game state.
+
+        """
+        return {"snake_position": self.get_position_snake_body(index).tolist(),
+                "apple_position": self.apple[index].tolist(),
+                "board_size": self.board_size[index].tolist(),
+                "steps_walked_since_last_apple": int(self.steps_walked_since_last_apple[index]),
+                "next_action": int(self.next_action[index]),
+                "next_action_deadly": bool(self.next_action_deadly[index])}
+
+    def __iter__(self):
+        """
+        Iterate over all game states (see TrainingDataset.game_state()).
+        """
+        return ( self.game_state(index) for index in range(len(self)) )
+#
+#
+#   END OF CLASS TRAININGDATASET
+#
+#
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert recorded games into a memory-mapped training dataset.")
+    parser.add_argument("out", type=Path, help="directory for the dataset")
+    parser.add_argument("directories", type=Path, nargs="+", help="directories with recorded games (*.json, *.snakelog) or containers")
+    arguments = parser.parse_args()
+
+    dataset = build_dataset(arguments.directories, arguments.out)
+    print(f"Wrote {len(dataset)} game states of {dataset.meta['n_games']} games to {arguments.out}.")
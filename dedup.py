@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 12:37:05 2026
+
+@author: jonas
+
+
+This file removes duplicate game states from the training data. Random walks start every game at the same position, so the same openings
+are recorded over and over. A duplicate (same game state and same next action) is stored once with a count, the count is used as sample weight.
+
+Two game states are the same, if they look the same from the snake's point of view: every position is described relative to the head,
+along the direction the snake is facing (forward) and to its right. The distances to the four walls pin down the board, so the description
+doesn't change when the whole game is rotated or moved, but games on different boards are still different. With symmetric=True a game state
+and its mirror image (left and right swapped, LEFT and RIGHT swapped) count as the same game state as well. The features, the action and its
+value of a mirrored game state are the mirrored features and action of the original (see mirror_features()), so only one of them has to be stored.
+Train with augment=True (see DedupIndex.iter_batches()) to mirror half of the stored game states on the fly instead of storing both copies.
+
+Usage:
+    index = DedupIndex()
+    index.add_games(["training_data/random_walk"])
+    mlp.train(model, lambda: index.iter_batches(256, augment=True))
+
+"""
+
+# Features of the game states
+from neural_network import NeuralNetwork
+# Read recorded games from directories and containers
+from dataset import iter_recorded_games, states_to_columns
+
+# Import Pathlib for reading, writing files
+from pathlib import Path
+
+import numpy as np
+
+
+# Masks and constants for hashing
+_MASK16 = np.uint64(0xFFFF)
+_SEGMENT_TAG, _WALL_TAG, _APPLE_TAG = np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F), np.uint64(0x165667B19E3779F9)
+
+
+def _mix(values:np.ndarray):
+    """
+    Scramble 64 bit integers (finaliser of splitmix64). Used to hash the parts of a game state.
+    """
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def _pack(*fields):
+    """
+    Pack up to four signed 16 bit integers into one 64 bit integer.
+    """
+    packed = np.zeros(len(fields[0]), dtype=np.uint64)
+    for shift, field in enumerate(fields):
+        packed |= ( np.asarray(field).astype(np.int64).astype(np.uint64) & _MASK16 ) << np.uint64(16*shift)
+    return packed
+
+
+def state_keys(heads, directions, apples, board_sizes, body, body_offsets, next_action, symmetric:bool=True):
+    """
+    Compute a 64 bit key for every pair of game state and next action. Pairs with the same key are the same (up to hash collisions), no matter
+    where on the board and in which direction they happened (see the description of this module).
+
+    Parameters
+    ----------
+    heads, directions, apples, board_sizes, body, body_offsets :
+        The game states (see NeuralNetwork.reduce_gameStates_dimensions()).
+    next_action : np.ndarray (N,)
+        The next action (LEFT, FORWARD, RIGHT).
+    symmetric : bool, optional
+        A game state and its mirror image get the same key. The default is True.
+
+    Returns
+    -------
+    keys : np.ndarray (N,) of np.uint64
+        The keys.
+    mirrored : np.ndarray (N,) of bool
+        True if the key belongs to the mirror image. The features of these game states have to be mirrored to get the game state the key
+        stands for (see mirror_features()). Always False without symmetric.
+
+    """
+    heads = np.asarray(heads, dtype=np.int64)
+    forward = np.asarray(directions, dtype=np.int64)
+    board_sizes = np.asarray(board_sizes, dtype=np.int64)
+    next_action = np.asarray(next_action, dtype=np.int64)
+    body_offsets = np.asarray(body_offsets, dtype=np.int64)
+    n_states = len(heads)
+    if n_states == 0: return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=bool)
+
+    # The right hand side of the snake (forward rotated by 90° clockwise)
+    right = np.stack([ -forward[:,1], forward[:,0] ], axis=1)
+
+    def steps_to_wall(direction):
+        # Number of steps from the head to the first cell outside of the board (same as in NeuralNetwork.reduce_gameStates_dimensions())
+        return np.where(direction[:,0] ==  1, board_sizes[:,0] - heads[:,0],
+               np.where(direction[:,0] == -1, heads[:,0] + 1,
+               np.where(direction[:,1] ==  1, board_sizes[:,1] - heads[:,1],
+                                              heads[:,1] + 1 )))
+    wall_forward, wall_right, wall_back, wall_left = ( steps_to_wall(direction) for direction in (forward, right, -forward, -right) )
+
+    # Apple and body segments relative to the head, in steps forward and to the right
+    apple_delta = np.asarray(apples, dtype=np.int64) - heads
+    apple_forward = (apple_delta*forward).sum(axis=1)
+    apple_right = (apple_delta*right).sum(axis=1)
+
+    segments = np.asarray(body[body_offsets[0]:body_offsets[-1]], dtype=np.int64)
+    starts = body_offsets[:-1] - body_offsets[0]
+    lengths = np.diff(body_offsets)
+    owner = np.repeat(np.arange(n_states), lengths)
+    segment_delta = segments - heads[owner]
+    segment_forward = (segment_delta*forward[owner]).sum(axis=1)
+    segment_right = (segment_delta*right[owner]).sum(axis=1)
+    # Position of every segment in its body. The hash depends on the order of the segments.
+    segment_number = np.arange(len(segments)) - np.repeat(starts, lengths)
+
+    def keys(sign):
+        # Hash of the game state. sign=-1 hashes the mirror image: right becomes left and LEFT becomes RIGHT.
+        walls = _pack(wall_forward, *( (wall_right, wall_back, wall_left) if sign == 1 else (wall_left, wall_back, wall_right) ))
+        apple = _pack(apple_forward, sign*apple_right, sign*next_action)
+        body_hash = np.add.reduceat(_mix(_pack(segment_forward, sign*segment_right, segment_number) ^ _SEGMENT_TAG), starts)
+        return _mix(_mix(walls ^ _WALL_TAG) + _mix(apple ^ _APPLE_TAG) + body_hash)
+
+    original = keys(1)
+    if not symmetric: return original, np.zeros(n_states, dtype=bool)
+    mirror = keys(-1)
+    return np.minimum(original, mirror), mirror < original
+
+
+def mirror_features(input_state:np.ndarray, output_action:np.ndarray):
+    """
+    Mirror preprocessed game states (swap left and right). The value of an action doesn't change.
+
+    Parameters
+    ----------
+    input_state : np.ndarray (N, 6)
+        Features (see NeuralNetwork.reduce_gameState_dimensions()). The apple moves to the other side and the obstacles to the left and to the
+        right are swapped.
+    output_action : np.ndarray (N, 3)
+        One hot encoded actions. LEFT becomes RIGHT.
+
+    Returns
+    -------
+    input_state, output_action : np.ndarrays
+        The mirrored copies.
+
+    """
+    input_state = np.array(input_state)
+    input_state[:,1] *= -1
+    input_state[:,[4,5]] = input_state[:,[5,4]]
+    return input_state, np.array(output_action)[:,::-1]
+
+
+class DedupIndex:
+    """
+    Preprocessed training data without duplicates. Every unique pair of game state and next action is stored once with the number of times it
+    was seen. Game states are added in a single pass, so the recorded games never have to be in memory at the same time.
+    """
+
+    def __init__(self, symmetric:bool=True, network:NeuralNetwork=None):
+        """
+        Create an empty index.
+
+        Parameters
+        ----------
+        symmetric : bool, optional
+            Merge game states with their mirror images (see state_keys()). The default is True.
+        network : NeuralNetwork, optional
+            Used to compute the features. The default is None (a new NeuralNetwork).
+
+        Returns
+        -------
+        Instance of the DedupIndex class.
+
+        """
+        self.symmetric = symmetric
+        self._network = NeuralNetwork() if network is None else network
+        # Key -> row of the unique game state
+        self._rows = {}
+        # Counts and the preprocessed unique game states, in chunks
+        self._counts = np.zeros(1024, dtype=np.int64)
+        self._chunks = []
+        self.n_states = 0
+
+    def __len__(self):
+        """
+        Number of unique pairs of game state and next action.
+        """
+        return len(self._rows)
+
+    def add_states(self, columns:dict):
+        """
+        Add game states in columns.
+
+        Parameters
+        ----------
+        columns : dict
+            Output of dataset.states_to_columns() (or the columns of a dataset.TrainingDataset).
+
+        Returns
+        -------
+        int
+            Number of new unique pairs of game state and next action.
+
+        """
+        head, body, body_offsets = np.asarray(columns["head"]), columns["body"], np.asarray(columns["body_offsets"])
+        if len(head) == 0: return 0
+        directions = head.astype(np.int64) - np.asarray(body[body_offsets[:-1]+1], dtype=np.int64)
+        keys, mirrored = state_keys(head, directions, columns["apple"], columns["board_size"], body, body_offsets, columns["next_action"], self.symmetric)
+        self.n_states += len(keys)
+
+        # Count every key of this batch once
+        unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        batch_counts = np.bincount(inverse, minlength=len(unique_keys))
+        rows = np.array([ self._rows.get(key, -1) for key in unique_keys.tolist() ], dtype=np.int64)
+        new = rows < 0
+        rows[new] = np.arange(len(self._rows), len(self._rows) + new.sum())
+        self._rows.update(zip(unique_keys[new].tolist(), rows[new].tolist()))
+
+        if len(self._rows) > len(self._counts):
+            self._counts = np.concatenate([ self._counts, np.zeros(max(len(self._counts), len(self._rows) - len(self._counts)), dtype=np.int64) ])
+        self._counts[rows] += batch_counts
+
+        # Preprocess the batch and keep the first occurrence of every new key. Mirrored game states are stored as the game state of the key.
+        if new.any():
+            input_state, output_action, action_value = self._network._preprocess_columns(head, columns["apple"], columns["board_size"], columns["next_action"],
+                                                                                          columns["next_action_deadly"], body, body_offsets)
+            keep = first[new]
+            input_state, output_action, action_value = input_state[keep], output_action[keep], action_value[keep]
+            flip = mirrored[keep]
+            input_state[flip], output_action[flip] = mirror_features(input_state[flip], output_action[flip])
+            self._chunks.append((input_state, output_action, action_value))
+        return int(new.sum())
+
+    def add_games(self, directories:list):
+        """
+        Add all game states of the recorded games in some directories (see dataset.iter_recorded_games()). The games are read one after another.
+
+        Returns
+        -------
+        int
+            Number of new unique pairs of game state and next action.
+
+        """
+        return sum( self.add_states(states_to_columns(gameStates)) for _, gameStates in iter_recorded_games(directories) if len(gameStates) > 0 )
+
+    def arrays(self):
+        """
+        Get the unique game states.
+
+        Returns
+        -------
+        input_state, output_action, action_value : np.ndarrays
+            Same as NeuralNetwork.preprocess_gameStates(), one row per unique pair of game state and next action.
+        weights : np.ndarray
+            Number of times every row was seen.
+
+        """
+        if self._chunks:
+            self._chunks = [ tuple( np.concatenate(arrays) for arrays in zip(*self._chunks) ) ]
+            input_state, output_action, action_value = self._chunks[0]
+        else:
+            input_state, output_action, action_value = np.zeros((0, 6)), np.zeros((0, 3), dtype=int), np.zeros(0)
+        return input_state, output_action, action_value, self._counts[:len(self)].copy()
+
+    def iter_batches(self, batch_size:int=256, rng:np.random.Generator=None, augment:bool=True):
+        """
+        Draw minibatches for one epoch (as many game states as were added). Rows are drawn with probability proportional to their weight, so
+        the training sees the same distribution as without deduplication. Can be passed to mlp.train() as lambda: index.iter_batches(...).
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            Number of game states per minibatch. The default is 256.
+        rng : np.random.Generator, optional
+            The default is None (a new generator with a random seed).
+        augment : bool, optional
+            Mirror every drawn game state with probability 0.5 (see mirror_features()). The default is True.
+
+        Yields
+        ------
+        input_state, output_action, action_value : np.ndarrays
+            One minibatch (input_state and action_value as float32, output_action as int like NeuralNetwork.preprocess_trainingDataFile()).
+
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        input_state, output_action, action_value, weights = self.arrays()
+        if len(weights) == 0: return
+        # Draw rows by binary search in the cumulative weights (faster than rng.choice() with probabilities for every batch)
+        cumulative = np.cumsum(weights)
+        input_state, action_value = np.asarray(input_state, dtype=np.float32), np.asarray(action_value, dtype=np.float32)
+
+        for start in range(0, self.n_states, batch_size):
+            rows = np.searchsorted(cumulative, rng.integers(0, cumulative[-1], size=min(batch_size, self.n_states - start)), side="right")
+            batch_input, batch_output = input_state[rows], output_action[rows]
+            if augment:
+                flip = rng.random(len(rows)) < 0.5
+                batch_input[flip], batch_output[flip] = mirror_features(batch_input[flip], batch_output[flip])
+            yield batch_input, batch_output, action_value[rows]
+
+    def save(self, path:Path):
+        """
+        Save the unique game states and their weights as .npz file (input_state, output_action, action_value, weights).
+        """
+        input_state, output_action, action_value, weights = self.arrays()
+        with open(path, "wb") as file:
+            np.savez(file, input_state=input_state, output_action=output_action, action_value=action_value, weights=weights,
+                     n_states=np.array(self.n_states), symmetric=np.array(self.symmetric))
+#
+#
+#   END OF CLASS DEDUPINDEX
+#
+#
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Preprocess recorded games without duplicate game states.")
+    parser.add_argument("out", type=Path, help="save the unique game states and their weights to this .npz file")
+    parser.add_argument("directories", type=Path, nargs="+", help="directories with recorded games (*.json, *.snakelog) or containers")
+    parser.add_argument("--no-symmetry", action="store_true", help="don't merge game states with their mirror images")
+    arguments = parser.parse_args()
+
+    index = DedupIndex(symmetric=not arguments.no_symmetry)
+    index.add_games(arguments.directories)
+    index.save(arguments.out)
+    print(f"{index.n_states} game states, {len(index)} unique ({1 - len(index)/max(1, index.n_states):.1%} duplicates).")
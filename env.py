@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:03:51 2026
+
+@author: jonas
+
+
+This file implements a gym-style environment around the snake game for reinforcement learning. reset() starts a new game and step() moves the
+snake by one step. Both return the features of the game state (see NeuralNetwork.reduce_gameState_dimensions()) as observation, step() also
+returns the reward (the value of the action, see NeuralNetwork.evaluate_action()), whether the game is over and some information about the game.
+
+Observations are written into preallocated numpy arrays, so stepping doesn't build game state dicts. Recording the game is optional.
+VectorSnakeEnv steps many environments at once, either in this process or in worker processes that write their observations into shared memory.
+
+"""
+
+# Import the snake game logic and the features
+from snake import LEFT, FORWARD, RIGHT
+from neural_network import NeuralNetwork
+
+# Seed every game
+from random import Random
+# Run environments in worker processes
+from multiprocessing import Pipe, Process
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+# Number of features in an observation
+OBSERVATION_SIZE = 6
+
+
+class SnakeEnv:
+    """
+    Environment for a single game of snake with the interface of a gym environment: reset(seed) and step(action).
+    """
+
+    def __init__(self, board_width:int=32, board_height:int=18, initial_length:int=3, max_score_per_apple:int=50, min_score_per_apple:int=10,
+                 max_step_to_apple:int=20, maximal_steps_per_game:int=None, record:bool=False, observation:np.ndarray=None):
+        """
+        Create the environment. Call reset() before the first step.
+
+        Parameters
+        ----------
+        board_width, board_height, initial_length, max_score_per_apple, min_score_per_apple, max_step_to_apple : int, optional
+            Same as in Snake.__init__().
+        maximal_steps_per_game : int, optional
+            End a game after this many steps. The default is None (games only end when the snake dies).
+        record : bool, optional
+            Record the actions and apples of every game in self.game_log. The default is False.
+        observation : np.ndarray, optional
+            Array with OBSERVATION_SIZE elements. The observations are written into it. The default is None (allocate a float32 array).
+
+        Returns
+        -------
+        Instance of the SnakeEnv class.
+
+        """
+        if maximal_steps_per_game is not None and (not isinstance(maximal_steps_per_game, int) or maximal_steps_per_game < 1):
+            raise ValueError("maximal_steps_per_game must be a positive integer or None.")
+        if observation is not None and observation.shape != (OBSERVATION_SIZE,):
+            raise ValueError(f"The observation buffer must have the shape ({OBSERVATION_SIZE},).")
+
+        self.settings = {"board_width": board_width, "board_height": board_height, "initial_length": initial_length, "max_score_per_apple": max_score_per_apple,
+                         "min_score_per_apple": min_score_per_apple, "max_step_to_apple": max_step_to_apple}
+        self.MAXIMAL_STEPS_PER_GAME = maximal_steps_per_game
+        self.record = record
+        self.observation = np.zeros(OBSERVATION_SIZE, dtype=np.float32) if observation is None else observation
+
+        # Seeds of the games. reset(seed) restarts the sequence.
+        self._random = Random()
+        # The game is created by reset()
+        self.game = None
+        self.game_steps = 0
+
+        # Preallocated inputs of NeuralNetwork.evaluate_actions() for one action
+        self._head = np.zeros((1, 2), dtype=np.int64)
+        self._direction = np.zeros((1, 2), dtype=np.int64)
+        self._apple = np.zeros((1, 2), dtype=np.int64)
+        self._action = np.zeros(1, dtype=np.int64)
+        self._deadly = np.zeros(1, dtype=bool)
+
+    def reset(self, seed:int=None):
+        """
+        Start a new game.
+
+        Parameters
+        ----------
+        seed : int, optional
+            Seed for this and all following games. The default is None (continue the sequence of seeds of the previous games).
+
+        Returns
+        -------
+        np.ndarray
+            The first observation of the game (self.observation).
+
+        """
+        if seed is not None: self._random = Random(seed)
+
+        self.game = NeuralNetwork(**self.settings, seed=self._random.getrandbits(64))
+        self.game.recording = self.record
+        self.game_steps = 0
+
+        return self.game.reduce_current_gameState_dimensions(out=self.observation)
+
+    def step(self, action:int):
+        """
+        Move the snake by one step.
+
+        Parameters
+        ----------
+        action : int
+            LEFT, FORWARD or RIGHT.
+
+        Raises
+        ------
+        ValueError
+            If the game is over or reset() was never called.
+
+        Returns
+        -------
+        observation : np.ndarray
+            The observation after the step (self.observation).
+        reward : float
+            The value of the action (same as NeuralNetwork.evaluate_action()).
+        done : bool
+            True if the snake died or the game reached maximal_steps_per_game.
+        info : dict
+            score, steps (number of steps in this game) and truncated (True if the game was ended by maximal_steps_per_game).
+
+        """
+        game = self.game
+        if game is None or game._snake_dead or ( self.MAXIMAL_STEPS_PER_GAME is not None and self.game_steps >= self.MAXIMAL_STEPS_PER_GAME ):
+            raise ValueError("The game is over. Call reset() to start a new game.")
+        action = int(action)
+        if action not in (LEFT, FORWARD, RIGHT): raise ValueError("The action must be LEFT, FORWARD or RIGHT.")
+
+        # Remember the state before the step for the reward
+        self._head[0] = game._cell_to_position(game._body_cells[0])
+        self._direction[0] = game._get_current_direction()
+        self._apple[0] = game.position_apple
+        self._action[0] = action
+
+        self._deadly[0] = dead = game.move(action)
+        self.game_steps += 1
+
+        reward = float(game.evaluate_actions(self._head, self._direction, self._apple, self._action, self._deadly)[0])
+        truncated = not dead and self.MAXIMAL_STEPS_PER_GAME is not None and self.game_steps >= self.MAXIMAL_STEPS_PER_GAME
+
+        return ( game.reduce_current_gameState_dimensions(out=self.observation), reward, dead or truncated,
+                 {"score": game.score, "steps": self.game_steps, "truncated": truncated} )
+
+    @property
+    def game_log(self):
+        """
+        Recording of the current game. Only filled if the environment was created with record=True.
+        """
+        return self.game.game_log if self.game is not None else None
+#
+#
+#   END OF CLASS SNAKEENV
+#
+#
+
+
+def _step_envs(envs:list, actions, rewards:np.ndarray, dones:np.ndarray):
+    """
+    Step a list of environments and start a new game in every environment whose game is over. Used by VectorSnakeEnv in this process and
+    in the worker processes.
+
+    Parameters
+    ----------
+    envs : list of SnakeEnvs
+        The environments.
+    actions : sequence of ints
+        One action per environment.
+    rewards, dones : np.ndarray
+        The rewards and the done flags are written into these arrays.
+
+    Returns
+    -------
+    list of dicts
+        The info of every step. The info of a step that ended a game belongs to the ended game.
+
+    """
+    infos = []
+    for index, (env, action) in enumerate(zip(envs, actions)):
+        _, rewards[index], dones[index], info = env.step(action)
+        if dones[index]: env.reset()
+        infos.append(info)
+    return infos
+
+
+def _vector_env_worker(connection, shared_memory_name:str, n_envs:int, start:int, stop:int, settings:dict):
+    """
+    Main loop of a worker process of VectorSnakeEnv. The worker owns the environments start to stop-1 and writes their observations into
+    the shared observation array.
+
+    Parameters
+    ----------
+    connection : multiprocessing.connection.Connection
+        Receives the commands ("reset", seeds), ("step", actions) and ("close", None) and sends the results back.
+    shared_memory_name : str
+        Name of the shared memory block with the observations of all environments.
+    n_envs : int
+        Number of environments of the VectorSnakeEnv.
+    start, stop : int
+        The environments of this worker.
+    settings : dict
+        Keyword arguments for SnakeEnv.__init__().
+
+    Returns
+    -------
+    None.
+
+    """
+    shared_memory = SharedMemory(name=shared_memory_name)
+    observations = np.ndarray((n_envs, OBSERVATION_SIZE), dtype=np.float32, buffer=shared_memory.buf)
+    envs = [ SnakeEnv(**settings, observation=observations[index]) for index in range(start, stop) ]
+    rewards, dones = np.zeros(stop-start), np.zeros(stop-start, dtype=bool)
+
+    try:
+        while True:
+            command, data = connection.recv()
+            if command == "reset":
+                for env, seed in zip(envs, data): env.reset(seed)
+                connection.send(None)
+            elif command == "step":
+                infos = _step_envs(envs, data, rewards, dones)
+                connection.send((rewards, dones, infos))
+            elif command == "close":
+                break
+    finally:
+        # Release the views of the shared memory before closing it
+        del envs, observations
+        shared_memory.close()
+        connection.close()
+
+
+class VectorSnakeEnv:
+    """
+    N environments that are stepped together. The observations of all environments are stored in one array of shape (N, OBSERVATION_SIZE).
+    Games that end are reset automatically, so the observation of an environment whose game just ended is the first observation of its next game.
+    """
+
+    def __init__(self, n_envs:int, workers:int=0, record:bool=False, **settings):
+        """
+        Create N environments.
+
+        Parameters
+        ----------
+        n_envs : int
+            Number of environments.
+        workers : int, optional
+            Number of worker processes. The environments are split evenly between them. The default is 0 (step all environments in this process).
+        record : bool, optional
+            Record the games (see SnakeEnv). Only possible without worker processes. The default is False.
+        **settings :
+            Passed to SnakeEnv.__init__() (board size, score settings, maximal_steps_per_game).
+
+        Returns
+        -------
+        Instance of the VectorSnakeEnv class.
+
+        """
+        if not isinstance(n_envs, int) or n_envs < 1: raise ValueError("The number of environments must be a positive integer.")
+        if not isinstance(workers, int) or workers < 0: raise ValueError("The number of workers must be a positive integer or 0.")
+        if record and workers > 0: raise ValueError("Games can only be recorded without worker processes.")
+
+        self.N_ENVS = n_envs
+        self.rewards = np.zeros(n_envs)
+        self.dones = np.zeros(n_envs, dtype=bool)
+        self._workers = []
+
+        if workers == 0:
+            self._shared_memory = None
+            self.observations = np.zeros((n_envs, OBSERVATION_SIZE), dtype=np.float32)
+            self.envs = [ SnakeEnv(**settings, record=record, observation=self.observations[index]) for index in range(n_envs) ]
+        else:
+            # The workers write the observations directly into shared memory, so they don't have to be send through the pipes
+            self._shared_memory = SharedMemory(create=True, size=n_envs*OBSERVATION_SIZE*np.dtype(np.float32).itemsize)
+            self.observations = np.ndarray((n_envs, OBSERVATION_SIZE), dtype=np.float32, buffer=self._shared_memory.buf)
+            self.observations[:] = 0
+            self.envs = None
+
+            # Split the environments evenly between the workers
+            bounds = np.linspace(0, n_envs, min(workers, n_envs)+1).astype(int).tolist()
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                connection, worker_connection = Pipe()
+                process = Process(target=_vector_env_worker, args=(worker_connection, self._shared_memory.name, n_envs, start, stop, settings), daemon=True)
+                process.start()
+                worker_connection.close()
+                self._workers.append((process, connection, start, stop))
+
+    def reset(self, seed:int=None):
+        """
+        Start a new game in every environment.
+
+        Parameters
+        ----------
+        seed : int, optional
+            Master seed. Every environment gets its own seed derived from it. The default is None (random seeds).
+
+        Returns
+        -------
+        np.ndarray
+            The observations of all environments (self.observations).
+
+        """
+        seeds = [ int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(self.N_ENVS) ]
+
+        if self.envs is not None:
+            for env, env_seed in zip(self.envs, seeds): env.reset(env_seed)
+        else:
+            for _, connection, start, stop in self._workers: connection.send(("reset", seeds[start:stop]))
+            for _, connection, _, _ in self._workers: connection.recv()
+
+        return self.observations
+
+    def step(self, actions):
+        """
+        Move the snakes of all environments by one step.
+
+        Parameters
+        ----------
+        actions : sequence of ints
+            One action (LEFT, FORWARD, RIGHT) per environment.
+
+        Returns
+        -------
+        observations : np.ndarray (N, OBSERVATION_SIZE)
+            Observations after the step (self.observations).
+        rewards : np.ndarray (N,)
+            Value of every action (self.rewards).
+        dones : np.ndarray (N,)
+            True for every environment whose game ended with this step (self.dones).
+        infos : list of dicts
+            Info of every step (see SnakeEnv.step()). The info of a step that ended a game belongs to the ended game.
+
+        """
+        if len(actions) != self.N_ENVS: raise ValueError(f"Expected {self.N_ENVS} actions, got {len(actions)}.")
+        actions = np.asarray(actions).tolist()
+
+        if self.envs is not None:
+            infos = _step_envs(self.envs, actions, self.rewards, self.dones)
+        else:
+            for _, connection, start, stop in self._workers: connection.send(("step", actions[start:stop]))
+            infos = []
+            for _, connection, start, stop in self._workers:
+                self.rewards[start:stop], self.dones[start:stop], worker_infos = connection.recv()
+                infos += worker_infos
+
+        return self.observations, self.rewards, self.dones, infos
+
+    def close(self):
+        """
+        Stop the worker processes and free the shared memory.
+        """
+        for process, connection, _, _ in self._workers:
+            connection.send(("close", None))
+            process.join()
+            connection.close()
+        self._workers = []
+
+        if self._shared_memory is not None:
+            del self.observations
+            self._shared_memory.close()
+            self._shared_memory.unlink()
+            self._shared_memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+#
+#
+#   END OF CLASS VECTORSNAKEENV
+#
+#
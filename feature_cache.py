@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:21:48 2026
+
+@author: jonas
+
+
+This file implements an on-disk cache for preprocessed training data. Every recorded game is preprocessed once and the resulting arrays
+are saved in the cache. The cache entry of a file is found by its path, size and modification time plus the version of the feature code,
+so only new or changed files have to be preprocessed again. The cache has a size limit. The least recently used entries are deleted first.
+
+"""
+
+# Import Pathlib for reading, writing files
+from pathlib import Path
+# Hash the key of cache entries
+import hashlib
+# Update the access time of cache entries
+import os
+
+import numpy as np
+
+
+class FeatureCache:
+    """
+    Cache for the arrays returned by NeuralNetwork.preprocess_gameStates(), one entry per recorded game.
+    """
+
+    def __init__(self, directory:Path, feature_version:int, max_bytes:int=1<<30):
+        """
+        Open or create a cache.
+
+        Parameters
+        ----------
+        directory : Path
+            Directory of the cache. Non existing directory will be created.
+        feature_version : int
+            Version of the code that computes the features. Entries written with another version are never used.
+        max_bytes : int, optional
+            Maximal size of the cache. The default is 1 GiB.
+
+        Returns
+        -------
+        Instance of the FeatureCache class.
+
+        """
+        if not isinstance(max_bytes, int) or max_bytes < 0: raise ValueError("max_bytes must be a positive integer.")
+
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.feature_version = feature_version
+        self.max_bytes = max_bytes
+
+        # Size and time of last use of every entry. The modification time of the entry files is used as time of last use.
+        self._entries = {}
+        for entry in self.directory.glob("*.npz"):
+            stat = entry.stat()
+            self._entries[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        self._size = sum( size for size, _ in self._entries.values() )
+
+    def _key(self, source:Path):
+        """
+        Get the name of the cache entry of a recorded game.
+
+        Parameters
+        ----------
+        source : Path
+            The recorded game.
+
+        Returns
+        -------
+        str
+            File name of the entry. Changes if the path, the size or the modification time of the file or the feature version changes.
+
+        """
+        source = Path(source).resolve()
+        stat = source.stat()
+        key = f"{source}|{stat.st_size}|{stat.st_mtime_ns}|{self.feature_version}"
+        return hashlib.sha1(key.encode()).hexdigest() + ".npz"
+
+    def get(self, source:Path):
+        """
+        Load the preprocessed arrays of a recorded game.
+
+        Parameters
+        ----------
+        source : Path
+            The recorded game.
+
+        Returns
+        -------
+        tuple of np.ndarrays or None
+            (input_state, output_action, action_value) or None, if the file is not in the cache or changed since it was cached.
+
+        """
+        name = self._key(source)
+        if name not in self._entries: return None
+
+        entry = self.directory/name
+        try:
+            with np.load(entry) as arrays:
+                result = arrays["input_state"], arrays["output_action"], arrays["action_value"]
+        except (OSError, KeyError, ValueError):
+            # The entry was deleted or is broken. Forget about it.
+            self._forget(name)
+            return None
+
+        # Mark the entry as recently used
+        os.utime(entry)
+        self._entries[name] = (self._entries[name][0], entry.stat().st_mtime_ns)
+        return result
+
+    def put(self, source:Path, input_state:np.ndarray, output_action:np.ndarray, action_value:np.ndarray):
+        """
+        Save the preprocessed arrays of a recorded game and delete the least recently used entries, if the cache is too big.
+
+        Parameters
+        ----------
+        source : Path
+            The recorded game.
+        input_state, output_action, action_value : np.ndarray
+            Output of NeuralNetwork.preprocess_gameStates() for the game.
+
+        Returns
+        -------
+        None.
+
+        """
+        name = self._key(source)
+        entry = self.directory/name
+
+        # Write into a temporary file first, so an interrupted write never leaves a broken entry
+        temporary = entry.with_suffix(".tmp")
+        with open(temporary, "wb") as file:
+            np.savez(file, input_state=input_state, output_action=output_action, action_value=action_value)
+        temporary.replace(entry)
+
+        self._forget(name)
+        stat = entry.stat()
+        self._entries[name] = (stat.st_size, stat.st_mtime_ns)
+        self._size += stat.st_size
+
+        self._evict()
+
+    def _forget(self, name:str):
+        """
+        Remove an entry from the index of the cache (the file is not touched).
+        """
+        if name in self._entries:
+            self._size -= self._entries.pop(name)[0]
+
+    def _evict(self):
+        """
+        Delete the least recently used entries until the cache is smaller than max_bytes.
+        """
+        if self._size <= self.max_bytes: return
+
+        for name, _ in sorted(self._entries.items(), key=lambda entry: entry[1][1]):
+            (self.directory/name).unlink(missing_ok=True)
+            self._forget(name)
+            if self._size <= self.max_bytes: break
+
+    def __len__(self):
+        """
+        Number of entries in the cache.
+        """
+        return len(self._entries)
+#
+#
+#   END OF CLASS FEATURECACHE
+#
+#
@@ -0,0 +1,679 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:40:02 2026
+
+@author: jonas
+
+
+This file implements a compact file format for recorded games of snake. Instead of saving the whole game state (with the complete body of the snake)
+after every step, a game log stores the initial state of the game, the sequence of spawned apples and one byte per step for the action.
+Every state of the game can be rebuild by replaying the actions with the game logic of the Snake class.
+
+File layout:
+    1. The magic bytes b"SNAKELOG" and one byte for the version of the format.
+    2. A header with the initial state of the game as json, terminated by a newline.
+    3. A stream of records. Every record is either one action byte (LEFT, FORWARD, RIGHT stored as 0, 1, 2) or an apple record:
+       the byte 3 followed by the x- and y-coordinate of the apple as little endian int16. The first record is the initial apple.
+
+The stream of records is append-only, so games can be written to disk while they are played.
+Old training data (json files with one game state per step) can be converted with convert_json_games().
+
+"""
+
+# Import the snake game logic
+from snake import Snake, LEFT, FORWARD, RIGHT
+
+# Import Pathlib for reading, writing files
+from pathlib import Path
+# Store the header as json
+import json
+# Pack the coordinates of the apples
+import struct
+# Timers and counters of the hot code paths
+from time import perf_counter
+from instrumentation import STATS
+# Write game logs in the background while the game is played (see GameLogWriter)
+import threading
+import queue
+import os
+
+import numpy as np
+
+
+# Byte values used in the stream of records
+_ACTION_OFFSET = 1
+_APPLE_RECORD = 3
+_APPLE_STRUCT = struct.Struct("<hh")
+
+
+class ReplaySnake(Snake):
+    """
+    A game of snake that takes the position of the apples from a list instead of spawning them randomly. Used to replay recorded games.
+    """
+
+    def __init__(self, header:dict, apples:list):
+        """
+        Initialise the game with the state stored in the header of a game log.
+
+        Parameters
+        ----------
+        header : dict
+            Header of a game log (see GameLog.header).
+        apples : list
+            Positions of all apples in the order they were spawned. The first apple is placed immediately.
+
+        Returns
+        -------
+        Instance of the ReplaySnake class.
+
+        """
+        # The apples must be known before Snake.__init__() spawns the first apple. self._next_apple is the index of the next apple to place.
+        self._apples = list(apples)
+        self._next_apple = 0
+
+        super().__init__(board_width=header["board_size"][0], board_height=header["board_size"][1],
+                         initial_length=header["initial_length"], max_score_per_apple=header["max_score_per_apple"],
+                         min_score_per_apple=header["min_score_per_apple"], max_step_to_apple=header["max_step_to_apple"])
+
+        # Place the snake, if the recording doesn't start with a new game
+        self._set_position_snake_body(header["snake_position"])
+        self.score = header["score"]
+        self.step_counter = header["steps_walked_since_last_apple"]
+
+    def _set_position_snake_body(self, positions:list):
+        """
+        Overwrite the body of the snake and rebuild the occupancy grid and the index of free cells.
+
+        Parameters
+        ----------
+        positions : list
+            Positions of the snake's body. The first element is the head. The last element is the tail.
+
+        Returns
+        -------
+        None.
+
+        """
+        self._body_cells.clear()
+        self._occupancy_grid[:] = False
+        for x, y in positions:
+            cell = self._position_to_cell(x, y)
+            self._body_cells.append(cell)
+            self._occupancy_grid[cell] = True
+        self._rebuild_free_cells()
+
+    def _spawn_apple(self):
+        """
+        Place the next recorded apple. If the recording ends before the next apple was spawned, the apple stays where it is.
+
+        Returns
+        -------
+        None.
+
+        """
+        # The snake covers the whole board. There is no place left for the apple. (Same as in Snake._spawn_apple())
+        if self._free_cell_count == 0:
+            self._snake_dead = True
+            return
+
+        if self._next_apple < len(self._apples):
+            self.position_apple = np.array(self._apples[self._next_apple])
+            self._next_apple += 1
+
+    def snapshot(self):
+        """
+        Save the state of the game and the number of apples placed so far (see Snake.snapshot()).
+        """
+        return super().snapshot(), self._next_apple
+
+    def restore(self, state:tuple):
+        """
+        Go back to a state saved with snapshot() (see Snake.restore()).
+        """
+        super().restore(state[0])
+        self._next_apple = state[1]
+#
+#
+#   END OF CLASS REPLAYSNAKE
+#
+#
+
+
+class GameLog:
+    """
+    The recording of one game of snake: initial state, spawned apples and one action per step.
+    """
+
+    MAGIC = b"SNAKELOG"
+    VERSION = 1
+
+    def __init__(self, header:dict, records:bytes=b""):
+        """
+        Create a game log. Use GameLog.from_snake(), GameLog.from_states() or GameLog.read() instead of calling this directly.
+
+        Parameters
+        ----------
+        header : dict
+            Initial state of the game: board_size, initial_length, max_score_per_apple, min_score_per_apple, max_step_to_apple,
+            snake_position, score and steps_walked_since_last_apple.
+        records : bytes, optional
+            Stream of records (actions and apples). The default is b"".
+
+        Returns
+        -------
+        Instance of the GameLog class.
+
+        """
+        self.header = header
+        self.records = bytearray(records)
+
+    @classmethod
+    def from_snake(cls, snake:Snake):
+        """
+        Start the recording of a game at the current state of a Snake instance.
+
+        Parameters
+        ----------
+        snake : Snake
+            The game that will be recorded.
+
+        Returns
+        -------
+        GameLog
+            Recording with the current state of the game and the current apple.
+
+        """
+        header = {"board_size": list(snake.BOARD_SIZE),
+                  "initial_length": snake.initial_length,
+                  "max_score_per_apple": snake.MAXIMAL_SCORE_PER_APPLE,
+                  "min_score_per_apple": snake.MINIMAL_SCORE_PER_APPLE,
+                  "max_step_to_apple": snake.MAXIMAL_STEP_COUNT,
+                  "snake_position": [ elem.tolist() for elem in snake.position_snake_body ],
+                  "score": snake.score,
+                  "steps_walked_since_last_apple": snake.step_counter}
+        game_log = cls(header)
+        game_log.append_apple(snake.position_apple)
+        return game_log
+
+    @classmethod
+    def from_states(cls, gameStates:list, initial_length:int=None, max_score_per_apple:int=50, min_score_per_apple:int=10, max_step_to_apple:int=20):
+        """
+        Convert a list of game states (the format written by NeuralNetwork.move()) into a game log.
+
+        Parameters
+        ----------
+        gameStates : list of dicts
+            The game states of one game in the order they were played.
+        initial_length : int, optional
+            Initial length of the snake. The default is None (the length of the snake in the first game state).
+        max_score_per_apple, min_score_per_apple, max_step_to_apple : int, optional
+            Settings of the game. They are not part of the game states. The defaults are the defaults of the Snake class.
+
+        Raises
+        ------
+        ValueError
+            If gameStates is empty.
+
+        Returns
+        -------
+        GameLog
+            Recording of the game.
+
+        """
+        if len(gameStates) == 0: raise ValueError("Can't create a game log without game states.")
+
+        first_state = gameStates[0]
+        header = {"board_size": list(first_state["board_size"]),
+                  "initial_length": len(first_state["snake_position"]) if initial_length is None else initial_length,
+                  "max_score_per_apple": max_score_per_apple,
+                  "min_score_per_apple": min_score_per_apple,
+                  "max_step_to_apple": max_step_to_apple,
+                  "snake_position": first_state["snake_position"],
+                  "score": 0,
+                  "steps_walked_since_last_apple": first_state["steps_walked_since_last_apple"]}
+        game_log = cls(header)
+        game_log.append_apple(first_state["apple_position"])
+
+        # Add the actions. A new apple was spawned, if the position of the apple changes between two steps.
+        for state, next_state in zip(gameStates, gameStates[1:] + [None]):
+            game_log.append_action(state["next_action"])
+            if next_state is not None and next_state["apple_position"] != state["apple_position"]:
+                game_log.append_apple(next_state["apple_position"])
+
+        return game_log
+
+    def append_action(self, action:int):
+        """
+        Append one step to the recording.
+
+        Parameters
+        ----------
+        action : LEFT, FORWARD, RIGHT
+            Relative direction the snake moved in.
+
+        Returns
+        -------
+        None.
+
+        """
+        if not action in [LEFT, FORWARD, RIGHT]:
+            raise ValueError("Wrong value passed for parameter 'action'. GameLog.append_action() expects the directions Snake.LEFT, Snake.FORWARD and Snake.RIGHT.")
+        self.records.append(action + _ACTION_OFFSET)
+
+    def append_apple(self, position_apple):
+        """
+        Append a newly spawned apple to the recording.
+
+        Parameters
+        ----------
+        position_apple : np.ndarray or list
+            Position of the new apple.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.records.append(_APPLE_RECORD)
+        self.records += _APPLE_STRUCT.pack(int(position_apple[0]), int(position_apple[1]))
+
+    def decode(self):
+        """
+        Split the stream of records into actions and apples.
+
+        Raises
+        ------
+        ValueError
+            If the stream of records is corrupt.
+
+        Returns
+        -------
+        actions : np.ndarray
+            One relative direction (LEFT, FORWARD, RIGHT) per step.
+        apples : list
+            Positions of the apples in the order they were spawned.
+
+        """
+        actions, apples = bytearray(), []
+        records, position = self.records, 0
+        while position < len(records):
+            record = records[position]
+            if record == _APPLE_RECORD:
+                # An apple record cut off at the end of the stream (the game crashed while it was written, see GameLogWriter) is ignored
+                if position + 1 + _APPLE_STRUCT.size > len(records): break
+                apples.append(list(_APPLE_STRUCT.unpack_from(records, position+1)))
+                position += 1 + _APPLE_STRUCT.size
+            elif record - _ACTION_OFFSET in (LEFT, FORWARD, RIGHT):
+                actions.append(record)
+                position += 1
+            else:
+                raise ValueError(f"Corrupt game log: unknown record {record} at byte {position}.")
+
+        return np.frombuffer(bytes(actions), dtype=np.uint8).astype(np.int8) - _ACTION_OFFSET, apples
+
+    def __len__(self):
+        """
+        Number of steps in the recording.
+        """
+        # Count the apple records by walking the stream. The coordinates of an apple may contain the byte of an apple record.
+        steps, records, position = 0, self.records, 0
+        while position < len(records):
+            if records[position] == _APPLE_RECORD:
+                position += 1 + _APPLE_STRUCT.size
+            else:
+                steps += 1
+                position += 1
+        return steps
+
+    def replay(self):
+        """
+        Replay the recorded game and rebuild the game state before every step.
+
+        Yields
+        ------
+        dict
+            The game state in the same format as NeuralNetwork.move() saves them (snake_position, apple_position, board_size,
+            steps_walked_since_last_apple, next_action, next_action_deadly).
+
+        """
+        actions, apples = self.decode()
+        snake = ReplaySnake(self.header, apples)
+
+        for action in actions.tolist():
+            state = {"snake_position": [ elem.tolist() for elem in snake.position_snake_body ],
+                     "apple_position": snake.position_apple.tolist(),
+                     "board_size": list(snake.BOARD_SIZE),
+                     "steps_walked_since_last_apple": snake.step_counter,
+                     "next_action": action}
+            state["next_action_deadly"] = snake.move(action)
+            yield state
+
+    def to_bytes(self):
+        """
+        Serialise the game log.
+
+        Returns
+        -------
+        bytes
+            The content of a game log file.
+
+        """
+        return self.MAGIC + bytes([self.VERSION]) + json.dumps(self.header).encode() + b"\n" + bytes(self.records)
+
+    @classmethod
+    def from_bytes(cls, data:bytes):
+        """
+        Deserialise a game log. Inverse of GameLog.to_bytes().
+
+        Raises
+        ------
+        ValueError
+            If data is not a game log or was written by an unknown version of the format.
+
+        Returns
+        -------
+        GameLog
+            The game log.
+
+        """
+        if not data.startswith(cls.MAGIC): raise ValueError("Not a game log. The file doesn't start with b'SNAKELOG'.")
+        version = data[len(cls.MAGIC)]
+        if version != cls.VERSION: raise ValueError(f"Unknown version {version} of the game log format.")
+
+        header_end = data.index(b"\n", len(cls.MAGIC)+1)
+        header = json.loads(data[len(cls.MAGIC)+1:header_end])
+        return cls(header, data[header_end+1:])
+
+    def write(self, path:Path):
+        """
+        Write the game log to a file.
+        """
+        if not STATS.enabled:
+            Path(path).write_bytes(self.to_bytes())
+            return
+        
+        # Time serialising and writing separately (see instrumentation.py)
+        start = perf_counter()
+        data = self.to_bytes()
+        start = STATS.lap("file_serialization", start)
+        Path(path).write_bytes(data)
+        STATS.lap("file_write", start)
+        STATS.count("files_written")
+        STATS.count("bytes_written", len(data))
+
+    @classmethod
+    def read(cls, path:Path):
+        """
+        Read a game log from a file.
+        """
+        return cls.from_bytes(Path(path).read_bytes())
+#
+#
+#   END OF CLASS GAMELOG
+#
+#
+
+
+class GameLogWriter:
+    """
+    Write a game log to disk while the game is played. The game loop hands over chunks of records (push()), when a chunk is full or
+    fsync_interval passed since the last push (see is_due()). A background thread appends them to the file and calls fsync at least every
+    fsync_interval seconds. The queue between them is bounded, so the memory of a recording stays constant however long the game is. If the
+    game crashes, everything that was pushed before the last fsync is on disk as a valid game log.
+    """
+
+    def __init__(self, path:Path, game_log:GameLog, chunk_bytes:int=4096, queue_size:int=64, fsync_interval:float=1.0):
+        """
+        Create the file and start the background thread. The header and the records of game_log are written first.
+
+        Parameters
+        ----------
+        path : Path
+            File for the game log. An existing file will be overwritten.
+        game_log : GameLog
+            The recording of the game. Its records are handed over to the writer and removed from it.
+        chunk_bytes : int, optional
+            Number of bytes of records the game collects at most before pushing them (see is_due()). The default is 4096.
+        queue_size : int, optional
+            Maximal number of chunks waiting to be written. push() blocks, if the queue is full. The default is 64.
+        fsync_interval : float, optional
+            Seconds between two pushes and between two calls of fsync. 0 pushes after every move and calls fsync after every chunk.
+            The default is 1.0.
+
+        Returns
+        -------
+        Instance of the GameLogWriter class.
+
+        """
+        if not isinstance(chunk_bytes, int) or chunk_bytes < 1: raise ValueError("chunk_bytes must be a positive integer.")
+        if not isinstance(queue_size, int) or queue_size < 1: raise ValueError("queue_size must be a positive integer.")
+        if fsync_interval < 0: raise ValueError("fsync_interval can't be negative.")
+
+        self.path = Path(path)
+        self.chunk_bytes = chunk_bytes
+        self.fsync_interval = fsync_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        # Exception raised in the background thread. Raised again by push() and close().
+        self._error = None
+
+        self._file = open(self.path, "wb")
+        data = game_log.to_bytes()
+        # Size of the header in the file. The records start after it.
+        self._header_size = len(data) - len(game_log.records)
+        # Number of bytes of records handed over to the background thread (see truncate())
+        self.records_pushed = len(game_log.records)
+        self._last_push = perf_counter()
+        self._queue.put(data)
+        game_log.records.clear()
+
+        self._thread = threading.Thread(target=self._write_chunks, name=f"GameLogWriter({self.path.name})", daemon=True)
+        self._thread.start()
+
+    def _write_chunks(self):
+        """
+        Background thread. Append the chunks to the file until close() sends None.
+        """
+        last_fsync = perf_counter()
+        # Written data that is not synced yet
+        unsynced = False
+        try:
+            while True:
+                # Wake up regularly, so written chunks are synced on time even if no new chunk arrives
+                try:
+                    chunk = self._queue.get(timeout=self.fsync_interval if self.fsync_interval > 0 else None)
+                except queue.Empty:
+                    chunk = b""
+                if chunk is None: break
+                if isinstance(chunk, int):
+                    # Remove the records after the first chunk bytes (see truncate())
+                    self._file.flush()
+                    self._file.truncate(self._header_size + chunk)
+                    self._file.seek(self._header_size + chunk)
+                    unsynced = True
+                elif chunk:
+                    self._file.write(chunk)
+                    unsynced = True
+                if unsynced and perf_counter() - last_fsync >= self.fsync_interval:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    last_fsync = perf_counter()
+                    unsynced = False
+        except Exception as error:
+            self._error = error
+            # Keep taking chunks, so push() doesn't block forever
+            while self._queue.get() is not None: pass
+
+    def push(self, records:bytes):
+        """
+        Hand over records to the background thread. Blocks, if the queue is full.
+
+        Raises
+        ------
+        IOError
+            If writing failed in the background thread.
+
+        Returns
+        -------
+        None.
+
+        """
+        if self._error is not None: raise IOError(f"Writing {self.path} failed.") from self._error
+        self._queue.put(bytes(records))
+        self.records_pushed += len(records)
+        self._last_push = perf_counter()
+
+    def is_due(self, pending:int):
+        """
+        Check if the game should push its records: a full chunk is collected or fsync_interval passed since the last push. Pushing by time
+        makes sure that a short game doesn't stay in memory until close().
+
+        Parameters
+        ----------
+        pending : int
+            Number of bytes of records that were not pushed yet.
+
+        Returns
+        -------
+        bool
+            True, if the records should be pushed now.
+
+        """
+        return pending >= self.chunk_bytes or ( pending > 0 and perf_counter() - self._last_push >= self.fsync_interval )
+
+    def truncate(self, records:int):
+        """
+        Remove pushed records from the file (e.g. when the game goes back to an earlier state, see NeuralNetwork.restore()).
+
+        Parameters
+        ----------
+        records : int
+            Number of bytes of records to keep. At most records_pushed.
+
+        Raises
+        ------
+        ValueError
+            If more records should be kept than were pushed.
+        IOError
+            If writing failed in the background thread.
+
+        Returns
+        -------
+        None.
+
+        """
+        if not 0 <= records <= self.records_pushed: raise ValueError(f"Can't keep {records} bytes of records, only {self.records_pushed} were pushed.")
+        if self._error is not None: raise IOError(f"Writing {self.path} failed.") from self._error
+        self._queue.put(records)
+        self.records_pushed = records
+
+    def close(self, records:bytes=b""):
+        """
+        Write the remaining records, wait until everything is written and close the file.
+
+        Parameters
+        ----------
+        records : bytes, optional
+            Records that were not pushed yet. The default is b"".
+
+        Raises
+        ------
+        IOError
+            If writing failed in the background thread.
+
+        Returns
+        -------
+        None.
+
+        """
+        if records: self._queue.put(bytes(records))
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            if self._error is None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+        finally:
+            self._file.close()
+        if self._error is not None: raise IOError(f"Writing {self.path} failed.") from self._error
+#
+#
+#   END OF CLASS GAMELOGWRITER
+#
+#
+
+
+def read_game_states(path:Path):
+    """
+    Read the game states of one recorded game. Works with game logs (*.snakelog) and the old json format (*.json).
+
+    Parameters
+    ----------
+    path : Path
+        The recorded game.
+
+    Returns
+    -------
+    list of dicts
+        The game states in the format written by NeuralNetwork.move() in the old json format.
+
+    """
+    path = Path(path)
+    if path.suffix == ".snakelog":
+        return list(GameLog.read(path).replay())
+    return json.loads(path.read_text())
+
+
+def convert_json_games(source_directory:Path, target_directory:Path, verify:bool=True):
+    """
+    Convert recorded games in the old json format (humanGame_*.json, randomGame_*.json) into game logs.
+    Every file source_directory/NAME.json is written to target_directory/NAME.snakelog.
+
+    Parameters
+    ----------
+    source_directory : Path
+        Directory with the json files.
+    target_directory : Path
+        Directory for the game logs. Non existing directory will be created.
+    verify : bool, optional
+        Replay every game log and compare it with the json file. The default is True.
+
+    Raises
+    ------
+    ValueError
+        If verify is True and the replay of a game differs from the recorded game states.
+
+    Returns
+    -------
+    int
+        Number of converted files.
+
+    """
+    target_directory = Path(target_directory)
+    target_directory.mkdir(parents=True, exist_ok=True)
+
+    converted = 0
+    for json_file in sorted(Path(source_directory).glob("*.json")):
+        gameStates = json.loads(json_file.read_text())
+        game_log = GameLog.from_states(gameStates)
+
+        if verify and list(game_log.replay()) != gameStates:
+            raise ValueError(f"The replay of {json_file} doesn't match the recorded game states.")
+
+        game_log.write(target_directory/(json_file.stem + ".snakelog"))
+        converted += 1
+
+    return converted
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert recorded games from json files into game logs.")
+    parser.add_argument("source", type=Path, help="directory with humanGame_*.json or randomGame_*.json files")
+    parser.add_argument("target", type=Path, help="directory for the game logs")
+    parser.add_argument("--no-verify", action="store_true", help="don't replay the converted games")
+    arguments = parser.parse_args()
+
+    print(f"Converted {convert_json_games(arguments.source, arguments.target, verify=not arguments.no_verify)} games.")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:26:14 2026
+
+@author: jonas
+
+
+This file implements timers and counters for the hot code paths (Snake.move, NeuralNetwork.move, writing game logs). The code paths report to
+the global object STATS. Instrumentation is off by default: every measuring point is guarded by one check of STATS.enabled, so the cost
+is a few nanoseconds per step. When it is on, only every n-th call is timed (see Stats.enable()), counters are always exact.
+
+Phases timed in Snake.move(): validation (checking the input), direction (converting relative to absolute directions), movement (moving the
+head and the tail), collision (collision detection and placing the new head) and spawning (spawning the apple and updating the score).
+NeuralNetwork.move() times serialization (appending to the game log), GameLog.write() times file_serialization (converting the whole
+game log to bytes) and file_write.
+
+Usage:
+    from instrumentation import STATS
+    STATS.enable(sample_every=10)
+    ... play games ...
+    print(STATS)
+    STATS.write("stats.json")
+
+"""
+
+# Used to measure the time
+from time import perf_counter
+# Save the statistics as json
+import json
+from pathlib import Path
+
+
+class Stats:
+    """
+    Per-phase timers and counters.
+    """
+
+    def __init__(self):
+        """
+        Create disabled instrumentation.
+
+        Returns
+        -------
+        Instance of the Stats class.
+
+        """
+        self.enabled = False
+        self.sample_every = 1
+        # Call site -> number of calls. Every instrumented code path counts its own calls, so nested code paths (NeuralNetwork.move() calls
+        # Snake.move()) are sampled independently.
+        self._calls = {}
+        self.reset()
+
+    def enable(self, sample_every:int=1):
+        """
+        Start measuring.
+
+        Parameters
+        ----------
+        sample_every : int, optional
+            Only time every n-th call of an instrumented code path (see sample()). The default is 1 (time every call).
+
+        Returns
+        -------
+        None.
+
+        """
+        if not isinstance(sample_every, int) or sample_every < 1: raise ValueError("sample_every must be a positive integer.")
+        self.sample_every = sample_every
+        self.enabled = True
+
+    def disable(self):
+        """
+        Stop measuring. The collected statistics are kept.
+        """
+        self.enabled = False
+
+    def reset(self):
+        """
+        Delete the collected statistics.
+        """
+        # phase -> [number of timed calls, total time in seconds]
+        self.timers = {}
+        # name -> count
+        self.counters = {}
+
+    def sample(self, site:str):
+        """
+        Decide if the current call of an instrumented code path is timed. Only call this if self.enabled is True.
+
+        Parameters
+        ----------
+        site : str
+            Name of the instrumented code path (e.g. "Snake.move"). The calls of every code path are counted separately.
+
+        Returns
+        -------
+        bool
+            True for every n-th call of the code path (n = sample_every).
+
+        """
+        calls = self._calls.get(site, 0) + 1
+        self._calls[site] = calls
+        return calls % self.sample_every == 0
+
+    def add_time(self, phase:str, seconds:float):
+        """
+        Add the time of one timed call to a phase.
+        """
+        timer = self.timers.get(phase)
+        if timer is None:
+            self.timers[phase] = [1, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+
+    def lap(self, phase:str, start:float):
+        """
+        Add the time since start to a phase and start the next phase.
+
+        Parameters
+        ----------
+        phase : str
+            Name of the phase that ends now.
+        start : float
+            perf_counter() at the start of the phase.
+
+        Returns
+        -------
+        float
+            perf_counter() now. The start of the next phase.
+
+        """
+        now = perf_counter()
+        self.add_time(phase, now - start)
+        return now
+
+    def count(self, name:str, n:int=1):
+        """
+        Increase a counter.
+        """
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        """
+        Get the collected statistics.
+
+        Returns
+        -------
+        dict
+            sample_every, counters (name -> count) and timers (phase -> number of timed calls, total and mean time in seconds).
+
+        """
+        return {"sample_every": self.sample_every,
+                "counters": dict(self.counters),
+                "timers": { phase: {"samples": samples, "total": total, "mean": total/samples} for phase, (samples, total) in self.timers.items() }}
+
+    def merge(self, summary:dict):
+        """
+        Add the statistics of another process (the output of its summary()).
+        """
+        for name, count in summary["counters"].items():
+            self.count(name, count)
+        for phase, timer in summary["timers"].items():
+            samples, total = self.timers.get(phase, [0, 0.0])
+            self.timers[phase] = [samples + timer["samples"], total + timer["total"]]
+
+    def write(self, path:Path):
+        """
+        Save the statistics as json file.
+        """
+        Path(path).write_text(json.dumps(self.summary(), indent=2) + "\n")
+
+    def __str__(self):
+        """
+        Table of all timers and counters.
+        """
+        lines = [f"{'phase':16s} {'samples':>10s} {'mean [us]':>12s} {'total [s]':>12s}"]
+        for phase, timer in self.summary()["timers"].items():
+            lines.append(f"{phase:16s} {timer['samples']:10d} {timer['mean']*1e6:12.2f} {timer['total']:12.4f}")
+        lines.append("")
+        lines += [ f"{name:16s} {count:10d}" for name, count in self.counters.items() ]
+        return "\n".join(lines)
+#
+#
+#   END OF CLASS STATS
+#
+#
+
+
+# The instrumentation of this process. All instrumented code paths report here.
+STATS = Stats()
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 08:41:19 2026
+
+@author: jonas
+
+
+This file implements random access into recorded games (game logs, see game_log.py). A game log only stores the actions and the apples,
+so the state of step k has to be rebuilt by replaying the game from the start. A keyframe index stores the full game state (body, apple,
+score, step counter, whether the snake is dead and the position in the stream of records) every K steps. It is saved next to the recording:
+humanGame_1625154970.snakelog -> humanGame_1625154970.keyframes.npz
+
+GameReader.seek(k) loads the nearest keyframe before step k, reads only the records between the keyframe and step k from the file and
+replays at most K steps. The memory needed for a replay depends on K, not on the length of the game.
+
+Old recordings in the json format have to be converted into game logs first (see game_log.convert_json_games()).
+
+"""
+
+# Replay recorded games
+from game_log import GameLog, ReplaySnake, _ACTION_OFFSET, _APPLE_RECORD, _APPLE_STRUCT
+from snake import LEFT, FORWARD, RIGHT
+
+# Import Pathlib for reading, writing files
+from pathlib import Path
+# Read the header of game logs
+import json
+
+import numpy as np
+
+
+# Version of the index format. Increase it, if the arrays in the index change.
+INDEX_VERSION = 1
+
+
+def index_path(path:Path):
+    """
+    Get the path of the keyframe index of a game log: NAME.snakelog -> NAME.keyframes.npz
+    """
+    path = Path(path)
+    return path.with_name(path.stem + ".keyframes.npz")
+
+
+def _read_header(file):
+    """
+    Read the header of a game log.
+
+    Parameters
+    ----------
+    file : file object
+        Opened game log (binary mode), positioned at the start of the file.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a game log or was written by an unknown version of the format.
+
+    Returns
+    -------
+    header : dict
+        The header of the game log.
+    records_start : int
+        Position of the first record in the file.
+
+    """
+    magic = file.read(len(GameLog.MAGIC) + 1)
+    if not magic.startswith(GameLog.MAGIC): raise ValueError("Not a game log. The file doesn't start with b'SNAKELOG'.")
+    if magic[-1] != GameLog.VERSION: raise ValueError(f"Unknown version {magic[-1]} of the game log format.")
+    header = json.loads(file.readline())
+    return header, file.tell()
+
+
+def _decode_records(records:bytes, n_actions:int):
+    """
+    Decode the first actions of a stream of records and the apples between them. Works with streams that are cut off anywhere after the
+    requested actions.
+
+    Parameters
+    ----------
+    records : bytes
+        Part of the stream of records of a game log. Must start with a record.
+    n_actions : int
+        Number of actions to decode.
+
+    Raises
+    ------
+    ValueError
+        If the stream of records is corrupt.
+
+    Returns
+    -------
+    actions : list of ints
+        At most n_actions actions.
+    apples : list
+        Positions of the apples spawned before the last decoded action and directly after it.
+
+    """
+    actions, apples, position = [], [], 0
+    while position < len(records):
+        record = records[position]
+        if record == _APPLE_RECORD:
+            # An apple record cut off by the end of the chunk belongs to a later step
+            if position + 1 + _APPLE_STRUCT.size > len(records): break
+            apples.append(list(_APPLE_STRUCT.unpack_from(records, position+1)))
+            position += 1 + _APPLE_STRUCT.size
+        elif record - _ACTION_OFFSET in (LEFT, FORWARD, RIGHT):
+            if len(actions) == n_actions: break
+            actions.append(record - _ACTION_OFFSET)
+            position += 1
+        else:
+            raise ValueError(f"Corrupt game log: unknown record {record} at byte {position}.")
+    return actions, apples
+
+
+def build_index(path:Path, interval:int=256):
+    """
+    Replay a game log once and save a keyframe every interval steps next to it.
+
+    Parameters
+    ----------
+    path : Path
+        The game log (*.snakelog).
+    interval : int, optional
+        Number of steps between two keyframes. The default is 256.
+
+    Returns
+    -------
+    Path
+        The keyframe index (see index_path()).
+
+    """
+    if not isinstance(interval, int) or interval < 1: raise ValueError("The interval must be a positive integer.")
+    path = Path(path)
+    if path.suffix != ".snakelog": raise ValueError(f"{path} is not a game log. Convert json files with game_log.convert_json_games() first.")
+
+    game_log = GameLog.read(path)
+    records = game_log.records
+    actions, apples = game_log.decode()
+    snake = ReplaySnake(game_log.header, apples)
+
+    steps, record_offsets, positions_apple, scores, step_counters, dead, body, body_offsets = [], [], [], [], [], [], [], [0]
+    step, position = 0, 0
+    while position < len(records):
+        if records[position] == _APPLE_RECORD:
+            position += 1 + _APPLE_STRUCT.size
+            continue
+
+        # Save the state before this step
+        if step % interval == 0:
+            steps.append(step)
+            record_offsets.append(position)
+            positions_apple.append(snake.position_apple.tolist())
+            scores.append(snake.score)
+            step_counters.append(snake.step_counter)
+            # Recordings of human games continue after the snake died
+            dead.append(snake._snake_dead)
+            body += [ segment.tolist() for segment in snake.position_snake_body ]
+            body_offsets.append(len(body))
+
+        snake.move(records[position] - _ACTION_OFFSET)
+        step += 1
+        position += 1
+
+    stat = path.stat()
+    with open(index_path(path), "wb") as file:
+        np.savez(file, version=np.array(INDEX_VERSION), interval=np.array(interval), n_steps=np.array(step),
+                 source_size=np.array(stat.st_size), source_mtime_ns=np.array(stat.st_mtime_ns),
+                 steps=np.array(steps, dtype=np.int64), record_offsets=np.array(record_offsets, dtype=np.int64),
+                 apples=np.array(positions_apple, dtype=np.int16).reshape(-1, 2), scores=np.array(scores, dtype=np.int64),
+                 step_counters=np.array(step_counters, dtype=np.int64), dead=np.array(dead, dtype=bool),
+                 body=np.array(body, dtype=np.int16).reshape(-1, 2), body_offsets=np.array(body_offsets, dtype=np.int64))
+    return index_path(path)
+
+
+class GameReader:
+    """
+    Random access to the game states of one game log with a keyframe index.
+    """
+
+    def __init__(self, path:Path, interval:int=256):
+        """
+        Open a game log. The keyframe index is built, if it doesn't exist or is older than the game log.
+
+        Parameters
+        ----------
+        path : Path
+            The game log (*.snakelog).
+        interval : int, optional
+            Number of steps between two keyframes, if the index has to be built. The default is 256.
+
+        Returns
+        -------
+        Instance of the GameReader class.
+
+        """
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self.header, self._records_start = _read_header(file)
+
+        self._load_index(interval)
+
+    def _load_index(self, interval:int):
+        """
+        Load the keyframe index and rebuild it, if it is missing, stale or was written by another version.
+        """
+        stat = self.path.stat()
+        index = index_path(self.path)
+        if index.exists():
+            with np.load(index) as arrays:
+                valid = ( int(arrays["version"]) == INDEX_VERSION and int(arrays["source_size"]) == stat.st_size
+                          and int(arrays["source_mtime_ns"]) == stat.st_mtime_ns )
+        if not index.exists() or not valid:
+            build_index(self.path, interval)
+
+        with np.load(index) as arrays:
+            for name in ("steps", "record_offsets", "apples", "scores", "step_counters", "dead", "body", "body_offsets"):
+                setattr(self, "_" + name, arrays[name])
+            self.interval, self.n_steps = int(arrays["interval"]), int(arrays["n_steps"])
+
+    def __len__(self):
+        """
+        Number of game states (one per recorded step).
+        """
+        return self.n_steps
+
+    def _replay_from_keyframe(self, keyframe:int, n_actions:int):
+        """
+        Rebuild the game at a keyframe and read the following actions from the file.
+
+        Returns
+        -------
+        snake : ReplaySnake
+            The game at the keyframe.
+        actions : list of ints
+            At most n_actions actions following the keyframe.
+
+        """
+        # Every step needs at most one action record and one apple record
+        chunk_size = n_actions * (2 + _APPLE_STRUCT.size)
+        with open(self.path, "rb") as file:
+            file.seek(self._records_start + int(self._record_offsets[keyframe]))
+            actions, apples = _decode_records(file.read(chunk_size), n_actions)
+
+        header = dict(self.header)
+        header["snake_position"] = self._body[self._body_offsets[keyframe]:self._body_offsets[keyframe+1]].tolist()
+        header["score"] = int(self._scores[keyframe])
+        header["steps_walked_since_last_apple"] = int(self._step_counters[keyframe])
+        snake = ReplaySnake(header, [ self._apples[keyframe].tolist() ] + apples)
+        snake._snake_dead = bool(self._dead[keyframe])
+        return snake, actions
+
+    def states(self, steps):
+        """
+        Rebuild the game states of some steps. Steps that share a keyframe are rebuilt with one replay.
+
+        Parameters
+        ----------
+        steps : sequence of ints
+            Steps between 0 and len(self)-1.
+
+        Raises
+        ------
+        IndexError
+            If a step is out of range.
+
+        Returns
+        -------
+        list of dicts
+            The game states in the same format as GameLog.replay() yields them, in the order of steps.
+
+        """
+        steps = np.asarray(steps, dtype=np.int64)
+        if len(steps) > 0 and ( steps.min() < 0 or steps.max() >= self.n_steps ):
+            raise IndexError(f"Step out of range. The game has {self.n_steps} steps.")
+
+        states = [None]*len(steps)
+        keyframes = steps // self.interval
+        for keyframe in np.unique(keyframes).tolist():
+            wanted = np.flatnonzero(keyframes == keyframe)
+            first_step = keyframe*self.interval
+            last_step = int(steps[wanted].max())
+            snake, actions = self._replay_from_keyframe(keyframe, last_step - first_step + 1)
+
+            # Replay up to the last wanted step of this keyframe and keep the wanted states
+            order = wanted[np.argsort(steps[wanted], kind="stable")]
+            next_wanted = 0
+            for step, action in enumerate(actions, start=first_step):
+                state = {"snake_position": [ elem.tolist() for elem in snake.position_snake_body ],
+                         "apple_position": snake.position_apple.tolist(),
+                         "board_size": list(snake.BOARD_SIZE),
+                         "steps_walked_since_last_apple": snake.step_counter,
+                         "next_action": action}
+                state["next_action_deadly"] = snake.move(action)
+                while next_wanted < len(order) and steps[order[next_wanted]] == step:
+                    states[order[next_wanted]] = state
+                    next_wanted += 1
+        return states
+
+    def seek(self, step:int):
+        """
+        Rebuild the game state of one step. Replays at most interval steps.
+
+        Returns
+        -------
+        dict
+            The game state (see GameReader.states()).
+
+        """
+        return self.states([step])[0]
+
+    def sample(self, n:int, rng:np.random.Generator=None):
+        """
+        Draw random game states (uniform over all steps, with replacement).
+
+        Parameters
+        ----------
+        n : int
+            Number of game states.
+        rng : np.random.Generator, optional
+            The default is None (a new generator with a random seed).
+
+        Returns
+        -------
+        list of dicts
+            The game states.
+
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        return self.states(rng.integers(0, self.n_steps, size=n))
+#
+#
+#   END OF CLASS GAMEREADER
+#
+#
+
+
+def sample_states(paths:list, n:int, rng:np.random.Generator=None, interval:int=256):
+    """
+    Draw random game states from many game logs (uniform over all steps of all games, with replacement). Only the keyframe indices and
+    the needed parts of the game logs are read.
+
+    Parameters
+    ----------
+    paths : list of Paths
+        The game logs (*.snakelog). Use dataset.list_game_files() to get all games in a directory.
+    n : int
+        Number of game states.
+    rng : np.random.Generator, optional
+        The default is None (a new generator with a random seed).
+    interval : int, optional
+        Number of steps between two keyframes, if an index has to be built. The default is 256.
+
+    Returns
+    -------
+    list of dicts
+        The game states (see GameReader.states()). Pass them to NeuralNetwork.preprocess_gameStates() to use them for training.
+
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    readers = [ GameReader(path, interval) for path in paths ]
+    lengths = np.array([ len(reader) for reader in readers ], dtype=np.int64)
+    if lengths.sum() == 0: raise ValueError("The game logs don't contain any game states.")
+
+    # Draw global step numbers and find the game of every step
+    picks = rng.integers(0, lengths.sum(), size=n)
+    starts = np.concatenate([ [0], np.cumsum(lengths) ])
+    games = np.searchsorted(starts, picks, side="right") - 1
+
+    states = [None]*n
+    for game in np.unique(games).tolist():
+        wanted = np.flatnonzero(games == game)
+        for row, state in zip(wanted, readers[game].states(picks[wanted] - starts[game])):
+            states[row] = state
+    return states
+
+
+if __name__ == "__main__":
+
+    import argparse
+    from dataset import list_game_files
+
+    parser = argparse.ArgumentParser(description="Build keyframe indices for all game logs in some directories.")
+    parser.add_argument("directories", type=Path, nargs="+", help="directories with game logs (*.snakelog)")
+    parser.add_argument("--interval", type=int, default=256, help="steps between two keyframes (default 256)")
+    arguments = parser.parse_args()
+
+    files = [ file for file in list_game_files(arguments.directories) if file.suffix == ".snakelog" ]
+    for file in files:
+        build_index(file, arguments.interval)
+    print(f"Indexed {len(files)} game logs.")
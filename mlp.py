@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:14:05 2026
+
+@author: jonas
+
+
+This file implements a small multi-layer perceptron in numpy (float32) and the code to train it on the output of
+NeuralNetwork.preprocess_gameStates(): input_state (N, 6), output_action (N, 3) and action_value (N,).
+
+The network maps the features of a game state to one output per action (LEFT, FORWARD, RIGHT). The forward and the backward pass work on
+whole minibatches, so all the work is done by matrix multiplications (BLAS). Two losses are implemented:
+    weighted_cross_entropy  softmax cross entropy with the recorded action as target, every game state weighted with its action value.
+                            Good moves are imitated, deadly moves (value 0) are ignored.
+    value                   squared error between the output of the recorded action and its action value. The network learns the value
+                            of every action.
+In both cases the policy takes the action with the biggest output.
+
+"""
+
+# Import the relative directions
+from snake import LEFT
+
+# Import Pathlib for reading, writing files
+from pathlib import Path
+# Used to measure the time per epoch
+from time import perf_counter
+# Used to save the state of the random number generator in checkpoints
+import json
+
+import numpy as np
+
+
+# Supported losses
+LOSSES = ("weighted_cross_entropy", "value")
+
+
+class MLP:
+    """
+    Multi-layer perceptron with ReLU activations in the hidden layers and a linear output layer. All parameters are float32.
+    """
+
+    def __init__(self, layer_sizes:tuple=(6, 64, 64, 3), seed:int=None):
+        """
+        Create a network with random weights (He initialisation) and zero biases.
+
+        Parameters
+        ----------
+        layer_sizes : tuple of ints, optional
+            Number of neurons of every layer, from the input to the output layer. The default is (6, 64, 64, 3).
+        seed : int, optional
+            Seed of the initial weights. The default is None.
+
+        Returns
+        -------
+        Instance of the MLP class.
+
+        """
+        if len(layer_sizes) < 2 or not all( isinstance(size, (int, np.integer)) and size > 0 for size in layer_sizes ):
+            raise ValueError("The network needs at least two layers and every layer needs at least one neuron.")
+
+        self.layer_sizes = tuple( int(size) for size in layer_sizes )
+        rng = np.random.default_rng(seed)
+        self.weights = [ (rng.standard_normal((n_in, n_out))*np.sqrt(2/n_in)).astype(np.float32)
+                         for n_in, n_out in zip(self.layer_sizes[:-1], self.layer_sizes[1:]) ]
+        self.biases = [ np.zeros(n_out, dtype=np.float32) for n_out in self.layer_sizes[1:] ]
+
+    @property
+    def parameters(self):
+        """
+        All parameters in a fixed order: weights and bias of the first layer, weights and bias of the second layer, ...
+        """
+        return [ parameter for layer in zip(self.weights, self.biases) for parameter in layer ]
+
+    def forward(self, x:np.ndarray):
+        """
+        Compute the output of the network for a batch of inputs and keep the activations for the backward pass.
+
+        Parameters
+        ----------
+        x : np.ndarray (N, layer_sizes[0])
+            The inputs.
+
+        Returns
+        -------
+        output : np.ndarray (N, layer_sizes[-1])
+            The outputs.
+        activations : list of np.ndarrays
+            The input of every layer (needed by backward()).
+
+        """
+        activation = np.asarray(x, dtype=np.float32)
+        activations = [activation]
+        for layer, (weights, bias) in enumerate(zip(self.weights, self.biases)):
+            activation = activation @ weights + bias
+            # ReLU in all hidden layers
+            if layer < len(self.weights) - 1:
+                np.maximum(activation, 0, out=activation)
+                activations.append(activation)
+        return activation, activations
+
+    def backward(self, gradient_output:np.ndarray, activations:list):
+        """
+        Backpropagate the gradient of the loss with respect to the outputs.
+
+        Parameters
+        ----------
+        gradient_output : np.ndarray (N, layer_sizes[-1])
+            Gradient of the loss with respect to the outputs.
+        activations : list of np.ndarrays
+            Returned by forward().
+
+        Returns
+        -------
+        list of np.ndarrays
+            Gradients of all parameters (same order as self.parameters).
+
+        """
+        gradients = []
+        gradient = gradient_output
+        for layer in reversed(range(len(self.weights))):
+            gradients.append(gradient.sum(axis=0))
+            gradients.append(activations[layer].T @ gradient)
+            if layer > 0:
+                # Derivative of the ReLU: only neurons with a positive output pass the gradient
+                gradient = ( gradient @ self.weights[layer].T ) * ( activations[layer] > 0 )
+        # The gradients were collected from the last to the first layer (bias before weights)
+        return gradients[::-1]
+
+    def predict(self, x:np.ndarray):
+        """
+        Compute the output of the network for a batch of inputs.
+        """
+        return self.forward(x)[0]
+
+    def act(self, x:np.ndarray):
+        """
+        Choose the action with the biggest output for every input.
+
+        Parameters
+        ----------
+        x : np.ndarray (N, 6)
+            Features of the game states (see NeuralNetwork.reduce_gameState_dimensions()).
+
+        Returns
+        -------
+        np.ndarray (N,)
+            LEFT, FORWARD or RIGHT.
+
+        """
+        return np.argmax(self.predict(x), axis=1) + LEFT
+
+    def loss(self, x:np.ndarray, output_action:np.ndarray, action_value:np.ndarray, loss:str="weighted_cross_entropy"):
+        """
+        Compute the loss of a minibatch and its gradients.
+
+        Parameters
+        ----------
+        x : np.ndarray (N, 6)
+            Features of the game states.
+        output_action : np.ndarray (N, 3)
+            The recorded actions (one-hot).
+        action_value : np.ndarray (N,)
+            Value of the recorded actions (see NeuralNetwork.evaluate_action()).
+        loss : str, optional
+            "weighted_cross_entropy" or "value" (see the description of this module). The default is "weighted_cross_entropy".
+
+        Returns
+        -------
+        loss : float
+            The loss of the minibatch.
+        gradients : list of np.ndarrays
+            Gradients of all parameters (same order as self.parameters).
+
+        """
+        if loss not in LOSSES: raise ValueError(f"Unknown loss {loss}. Use one of {', '.join(LOSSES)}.")
+        output, activations = self.forward(x)
+        target = np.asarray(output_action, dtype=np.float32)
+        value = np.asarray(action_value, dtype=np.float32)
+
+        if loss == "weighted_cross_entropy":
+            # Numerically stable softmax
+            shifted = output - output.max(axis=1, keepdims=True)
+            log_probability = shifted - np.log(np.exp(shifted).sum(axis=1, keepdims=True))
+            total_weight = max(float(value.sum()), 1e-12)
+            loss_value = -float(( value * (log_probability*target).sum(axis=1) ).sum()) / total_weight
+            gradient = ( np.exp(log_probability) - target ) * ( value / total_weight )[:,None]
+        else:
+            error = (output*target).sum(axis=1) - value
+            loss_value = float((error**2).mean())
+            gradient = target * ( 2*error/len(error) )[:,None]
+
+        return loss_value, self.backward(gradient.astype(np.float32), activations)
+
+    def save(self, path:Path, **extra):
+        """
+        Save the network (and optional extra arrays, e.g. the state of an optimizer) as .npz file.
+
+        Parameters
+        ----------
+        path : Path
+            The file.
+        **extra : np.ndarrays
+            Saved with the network. Returned by MLP.load().
+
+        Returns
+        -------
+        None.
+
+        """
+        arrays = { f"parameter_{index}": parameter for index, parameter in enumerate(self.parameters) }
+        with open(path, "wb") as file:
+            np.savez(file, layer_sizes=np.array(self.layer_sizes), **arrays, **extra)
+
+    @classmethod
+    def load(cls, path:Path):
+        """
+        Load a network saved with MLP.save().
+
+        Returns
+        -------
+        model : MLP
+            The network.
+        extra : dict
+            The extra arrays saved with the network.
+
+        """
+        with np.load(path) as arrays:
+            model = cls(tuple(arrays["layer_sizes"].tolist()))
+            parameters = [ arrays[f"parameter_{index}"] for index in range(2*len(model.weights)) ]
+            model.weights, model.biases = parameters[0::2], parameters[1::2]
+            extra = { name: arrays[name] for name in arrays.files if name != "layer_sizes" and not name.startswith("parameter_") }
+        return model, extra
+#
+#
+#   END OF CLASS MLP
+#
+#
+
+
+class SGD:
+    """
+    Minibatch stochastic gradient descent with optional momentum.
+    """
+
+    def __init__(self, learning_rate:float=0.01, momentum:float=0.0):
+        self.learning_rate = learning_rate
+        self.momentum = momentum
+        self._velocity = None
+
+    def hyperparameters(self):
+        """
+        Arguments of the constructor (saved in checkpoints).
+        """
+        return {"learning_rate": self.learning_rate, "momentum": self.momentum}
+
+    def step(self, parameters:list, gradients:list):
+        """
+        Update the parameters in place.
+        """
+        if self._velocity is None: self._velocity = [ np.zeros_like(parameter) for parameter in parameters ]
+        for parameter, gradient, velocity in zip(parameters, gradients, self._velocity):
+            velocity *= self.momentum
+            velocity -= self.learning_rate * gradient
+            parameter += velocity
+
+    def state(self):
+        """
+        State of the optimizer as dict of arrays (saved in checkpoints).
+        """
+        return { f"velocity_{index}": velocity for index, velocity in enumerate(self._velocity or []) }
+
+    def load_state(self, state:dict):
+        """
+        Restore the state returned by state().
+        """
+        velocities = sorted( name for name in state if name.startswith("velocity_") )
+        self._velocity = [ state[f"velocity_{index}"] for index in range(len(velocities)) ] or None
+#
+#
+#   END OF CLASS SGD
+#
+#
+
+
+class Adam:
+    """
+    Adam optimizer (Kingma and Ba, 2014).
+    """
+
+    def __init__(self, learning_rate:float=0.001, beta1:float=0.9, beta2:float=0.999, epsilon:float=1e-8):
+        self.learning_rate = learning_rate
+        self.beta1, self.beta2, self.epsilon = beta1, beta2, epsilon
+        self._steps = 0
+        self._first_moment = None
+        self._second_moment = None
+
+    def hyperparameters(self):
+        """
+        Arguments of the constructor (saved in checkpoints).
+        """
+        return {"learning_rate": self.learning_rate, "beta1": self.beta1, "beta2": self.beta2, "epsilon": self.epsilon}
+
+    def step(self, parameters:list, gradients:list):
+        """
+        Update the parameters in place.
+        """
+        if self._first_moment is None:
+            self._first_moment = [ np.zeros_like(parameter) for parameter in parameters ]
+            self._second_moment = [ np.zeros_like(parameter) for parameter in parameters ]
+        self._steps += 1
+        # Bias correction of the moments is folded into the step size
+        step_size = np.float32(self.learning_rate * np.sqrt(1 - self.beta2**self._steps) / (1 - self.beta1**self._steps))
+
+        for parameter, gradient, first_moment, second_moment in zip(parameters, gradients, self._first_moment, self._second_moment):
+            first_moment *= self.beta1
+            first_moment += (1 - self.beta1) * gradient
+            second_moment *= self.beta2
+            second_moment += (1 - self.beta2) * gradient**2
+            parameter -= step_size * first_moment / (np.sqrt(second_moment) + np.float32(self.epsilon))
+
+    def state(self):
+        """
+        State of the optimizer as dict of arrays (saved in checkpoints).
+        """
+        state = {"adam_steps": np.array(self._steps)}
+        for index, (first_moment, second_moment) in enumerate(zip(self._first_moment or [], self._second_moment or [])):
+            state[f"first_moment_{index}"], state[f"second_moment_{index}"] = first_moment, second_moment
+        return state
+
+    def load_state(self, state:dict):
+        """
+        Restore the state returned by state().
+        """
+        self._steps = int(state["adam_steps"])
+        moments = len([ name for name in state if name.startswith("first_moment_") ])
+        self._first_moment = [ state[f"first_moment_{index}"] for index in range(moments) ] or None
+        self._second_moment = [ state[f"second_moment_{index}"] for index in range(moments) ] or None
+#
+#
+#   END OF CLASS ADAM
+#
+#
+
+
+def _minibatches(data, batch_size:int, rng:np.random.Generator):
+    """
+    Split the training data into shuffled minibatches.
+
+    Parameters
+    ----------
+    data : tuple of np.ndarrays or callable
+        (input_state, output_action, action_value) or a function without arguments that returns an iterable of minibatches
+        (e.g. lambda: network.iter_preprocessed(directories)).
+    batch_size : int
+        Number of game states per minibatch (only used for arrays).
+    rng : np.random.Generator
+        Used to shuffle the arrays.
+
+    Yields
+    ------
+    input_state, output_action, action_value : np.ndarrays
+        One minibatch.
+
+    """
+    if callable(data):
+        yield from data()
+        return
+
+    input_state, output_action, action_value = data
+    order = rng.permutation(len(input_state))
+    for start in range(0, len(order), batch_size):
+        rows = order[start:start+batch_size]
+        yield input_state[rows], output_action[rows], action_value[rows]
+
+
+def train(model:MLP, data, epochs:int=10, batch_size:int=256, optimizer=None, loss:str="weighted_cross_entropy", checkpoint:Path=None, seed:int=None, verbose:bool=True,
+          start_epoch:int=0, rng:np.random.Generator=None):
+    """
+    Train a network on preprocessed training data.
+
+    Parameters
+    ----------
+    model : MLP
+        The network. Trained in place.
+    data : tuple of np.ndarrays or callable
+        Output of NeuralNetwork.preprocess_trainingDataFile() (or preprocess_gameStates(), preprocess_dataset()) or a function without arguments
+        that returns an iterable of minibatches, e.g. lambda: network.iter_preprocessed(directories). Minibatches of a function are not shuffled.
+    epochs : int, optional
+        Number of passes over the training data. The default is 10.
+    batch_size : int, optional
+        Number of game states per minibatch. The default is 256.
+    optimizer : SGD or Adam, optional
+        The default is None (Adam with learning rate 0.001).
+    loss : str, optional
+        "weighted_cross_entropy" or "value" (see the description of this module). The default is "weighted_cross_entropy".
+    checkpoint : Path, optional
+        Directory for checkpoints. The network and the optimizer are saved after every epoch as epoch_001.npz, epoch_002.npz, ...
+        Non existing directory will be created. The default is None (no checkpoints).
+    seed : int, optional
+        Seed for shuffling the training data. Ignored if rng is given. The default is None.
+    verbose : bool, optional
+        Print the loss and the time of every epoch. The default is True.
+    start_epoch : int, optional
+        Number of already finished epochs. Training continues with epoch start_epoch+1, so earlier checkpoints are not overwritten.
+        The default is 0.
+    rng : np.random.Generator, optional
+        Used to shuffle the training data. Pass the generator returned by load_checkpoint() to continue training exactly like without
+        interruption. The default is None (new generator from seed).
+
+    Returns
+    -------
+    list of dicts
+        One entry per epoch: epoch, loss (mean over all minibatches), seconds and samples_per_second.
+
+    """
+    if loss not in LOSSES: raise ValueError(f"Unknown loss {loss}. Use one of {', '.join(LOSSES)}.")
+    if not isinstance(batch_size, int) or batch_size < 1: raise ValueError("batch_size must be a positive integer.")
+    if not isinstance(start_epoch, int) or start_epoch < 0: raise ValueError("start_epoch must be a non-negative integer.")
+    optimizer = Adam() if optimizer is None else optimizer
+    rng = np.random.default_rng(seed) if rng is None else rng
+    if checkpoint is not None: Path(checkpoint).mkdir(parents=True, exist_ok=True)
+    if not callable(data):
+        # Convert the training data once, not for every minibatch
+        data = tuple( np.asarray(array, dtype=np.float32) for array in data )
+
+    history = []
+    for epoch in range(start_epoch+1, start_epoch+epochs+1):
+        start = perf_counter()
+        total_loss, batches, samples = 0.0, 0, 0
+        for input_state, output_action, action_value in _minibatches(data, batch_size, rng):
+            batch_loss, gradients = model.loss(input_state, output_action, action_value, loss)
+            optimizer.step(model.parameters, gradients)
+            total_loss += batch_loss
+            batches += 1
+            samples += len(input_state)
+        seconds = perf_counter() - start
+
+        history.append({"epoch": epoch, "loss": total_loss/max(batches, 1), "seconds": seconds, "samples_per_second": samples/seconds if seconds > 0 else 0.0})
+        if verbose:
+            print(f"Epoch {epoch}/{start_epoch+epochs}: loss {history[-1]['loss']:.5f}, {seconds:.2f} s, {history[-1]['samples_per_second']:.0f} samples/s")
+        if checkpoint is not None:
+            save_checkpoint(Path(checkpoint)/f"epoch_{epoch:03d}.npz", model, optimizer, epoch, rng)
+
+    return history
+
+
+def save_checkpoint(path:Path, model:MLP, optimizer, epoch:int, rng:np.random.Generator=None):
+    """
+    Save the network, the optimizer (hyperparameters and state), the epoch and the state of the random number generator used for shuffling,
+    so training can be continued with load_checkpoint().
+    """
+    extra = { f"hyperparameter_{name}": np.array(value) for name, value in optimizer.hyperparameters().items() }
+    if rng is not None: extra["rng_state"] = np.array(json.dumps(rng.bit_generator.state))
+    model.save(path, epoch=np.array(epoch), optimizer=np.array(type(optimizer).__name__), **extra, **optimizer.state())
+
+
+def load_checkpoint(path:Path):
+    """
+    Load a checkpoint written by save_checkpoint() (or by train()).
+
+    Returns
+    -------
+    model : MLP
+        The network.
+    optimizer : SGD or Adam
+        The optimizer with its hyperparameters and its state. Pass it to train() to continue training.
+    epoch : int
+        The last finished epoch. Pass it to train() as start_epoch.
+    rng : np.random.Generator or None
+        The random number generator used for shuffling in the state after the last finished epoch. Pass it to train(). None if the
+        checkpoint has no generator.
+
+    """
+    model, extra = MLP.load(path)
+    hyperparameters = { name[len("hyperparameter_"):]: float(value) for name, value in extra.items() if name.startswith("hyperparameter_") }
+    # Checkpoints of older versions only have the learning rate
+    if not hyperparameters: hyperparameters = {"learning_rate": float(extra["learning_rate"])}
+    optimizer = {"SGD": SGD, "Adam": Adam}[str(extra["optimizer"])](**hyperparameters)
+    optimizer.load_state(extra)
+
+    rng = None
+    if "rng_state" in extra:
+        state = json.loads(str(extra["rng_state"]))
+        rng = np.random.Generator(getattr(np.random, state["bit_generator"])())
+        rng.bit_generator.state = state
+    return model, optimizer, int(extra["epoch"]), rng
+
+
+if __name__ == "__main__":
+
+    import argparse
+    from neural_network import NeuralNetwork
+
+    parser = argparse.ArgumentParser(description="Train a multi-layer perceptron on recorded games.")
+    parser.add_argument("directories", type=Path, nargs="+", help="directories with recorded games (*.json, *.snakelog)")
+    parser.add_argument("--hidden", type=int, nargs="*", default=[64, 64], help="neurons per hidden layer (default 64 64)")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--optimizer", choices=("adam", "sgd"), default="adam")
+    parser.add_argument("--learning-rate", type=float, default=None, help="default 0.001 (adam) or 0.01 (sgd)")
+    parser.add_argument("--loss", choices=LOSSES, default="weighted_cross_entropy")
+    parser.add_argument("--checkpoint", type=Path, help="directory for checkpoints")
+    parser.add_argument("--cache", type=Path, help="cache for preprocessed training data (see feature_cache.py)")
+    parser.add_argument("--workers", type=int, default=1, help="processes preprocessing the recorded games (default 1)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--resume", type=Path, help="checkpoint to continue training from (network, optimizer, epoch and shuffling)")
+    arguments = parser.parse_args()
+
+    data = NeuralNetwork().preprocess_trainingDataFile(arguments.directories, cache=arguments.cache, workers=arguments.workers)
+    if arguments.optimizer == "adam":
+        optimizer = Adam(arguments.learning_rate or 0.001)
+    else:
+        optimizer = SGD(arguments.learning_rate or 0.01, momentum=0.9)
+
+    model = MLP((data[0].shape[1], *arguments.hidden, data[1].shape[1]), seed=arguments.seed)
+    start_epoch, rng = 0, None
+    if arguments.resume is not None: model, optimizer, start_epoch, rng = load_checkpoint(arguments.resume)
+    train(model, data, arguments.epochs, arguments.batch_size, optimizer, arguments.loss, arguments.checkpoint, arguments.seed,
+          start_epoch=start_epoch, rng=rng)
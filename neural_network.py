@@ -12,18 +12,34 @@ This file implements a class that learns to play the game snake with a neural ne
 
 # Import the snake game logic
 from snake import Snake, FORWARD, LEFT, RIGHT
+# Compact file format for recorded games
+from game_log import GameLog, GameLogWriter, read_game_states
+# Memory-mapped training data
+from dataset import TrainingDataset, list_game_files, iter_recorded_games, states_to_columns
+# Containers with many recorded games
+from shards import ShardWriter, is_container
+# On-disk cache of preprocessed training data
+from feature_cache import FeatureCache
+# Timers and counters of the hot code paths
+from instrumentation import STATS, Stats
 
 # Import Pathlib for reading, writing files
 from pathlib import Path
-# Import random to do random walks
-import random as r
-# Store training data as json
-import json
-# Progress bar
-from tqdm import tqdm
+# Used to measure the time
+from time import perf_counter
 
 # Used for math and neural network
 import numpy as np
+# Used for the square root of python floats
+import math
+# Sorted lists of body segments per row and column
+from bisect import bisect_left, bisect_right, insort
+
+
+# Version of the code that computes the features (reduce_gameState_dimensions, evaluate_action). Increase it, when the features or their
+# dtypes change, so cached training data (see feature_cache.FeatureCache) is preprocessed again.
+# Version 2: the features and values of preprocess_trainingDataFile() are float32.
+FEATURE_VERSION = 2
 
 
 class NeuralNetwork(Snake):
@@ -51,8 +67,186 @@ class NeuralNetwork(Snake):
         # Initialise parent
         super().__init__(*args, **kwargs)    
         
-        # Initialise array. Will hold all game states of one game before they're written to file.
-        self.game_state_history = []
+        # Initialise the recording of the game. Will hold the actions and apples of one game before they're written to file.
+        # Set self.recording to False to play without recording (e.g. in env.SnakeEnv).
+        self.game_log = GameLog.from_snake(self)
+        self.recording = True
+        # Writes the recording to disk while the game is played (see generate_human_training_data()). None keeps the whole recording in memory.
+        self._log_writer = None
+        
+        # Initialise the sorted positions of the body segments per row and column. Used to compute the features of the current game state in O(log n).
+        self._rebuild_ray_cache()
+    
+    #
+    #   >>> RAY CACHE
+    #
+    def _rebuild_ray_cache(self):
+        """
+        Rebuild the sorted lists of body segments per row and per column from the body of the snake.
+        self._body_rows[y] holds the x-coordinates of all body segments in row y, self._body_columns[x] holds the y-coordinates of all body segments in column x.
+
+        Returns
+        -------
+        None.
+
+        """
+        self._body_rows, self._body_columns = {}, {}
+        for cell in self._body_cells:
+            self._add_to_ray_cache(cell)
+    
+    def _add_to_ray_cache(self, cell:int):
+        """
+        Add one body segment to the sorted lists of body segments.
+        """
+        y, x = divmod(cell, self._GRID_STRIDE)
+        x, y = x - 1, y - self._GRID_OFFSET_Y
+        insort(self._body_rows.setdefault(y, []), x)
+        insort(self._body_columns.setdefault(x, []), y)
+    
+    def _remove_from_ray_cache(self, cell:int):
+        """
+        Remove one body segment from the sorted lists of body segments.
+        """
+        y, x = divmod(cell, self._GRID_STRIDE)
+        x, y = x - 1, y - self._GRID_OFFSET_Y
+        row, column = self._body_rows[y], self._body_columns[x]
+        del row[bisect_left(row, x)]
+        del column[bisect_left(column, y)]
+    
+    def _occupy_cell(self, cell:int):
+        """
+        Wrapper around the parents _occupy_cell() method. Only the new head of the snake changes the sorted lists of body segments.
+        """
+        super()._occupy_cell(cell)
+        self._add_to_ray_cache(cell)
+    
+    def _release_cell(self, cell:int):
+        """
+        Wrapper around the parents _release_cell() method. Only the old tail of the snake changes the sorted lists of body segments.
+        """
+        super()._release_cell(cell)
+        self._remove_from_ray_cache(cell)
+
+    def snapshot(self):
+        """
+        Save the state of the game, the length of the recording and the sorted lists of body segments (see Snake.snapshot()). Records
+        already handed over to the writer of the game log (see generate_human_training_data()) count to the length.
+        """
+        pushed = self._log_writer.records_pushed if self._log_writer is not None else 0
+        return (super().snapshot(), pushed + len(self.game_log.records),
+                { y: row[:] for y, row in self._body_rows.items() }, { x: column[:] for x, column in self._body_columns.items() })
+
+    def restore(self, state:tuple):
+        """
+        Go back to a state saved with snapshot() (see Snake.restore()). Moves made after the snapshot are removed from the recording
+        (and from the file, if they were written already).
+        """
+        super().restore(state[0])
+        pushed = self._log_writer.records_pushed if self._log_writer is not None else 0
+        if state[1] < pushed:
+            self._log_writer.truncate(state[1])
+            self.game_log.records.clear()
+        else:
+            del self.game_log.records[state[1]-pushed:]
+        # Copy the sorted lists of body segments, so the snapshot can be restored again
+        self._body_rows = { y: row[:] for y, row in state[2].items() }
+        self._body_columns = { x: column[:] for x, column in state[3].items() }
+
+    def clone(self):
+        """
+        Create an independent copy of the game with its own copy of the recording (see Snake.clone()).
+        """
+        game = super().clone()
+        game._body_rows = { y: row[:] for y, row in self._body_rows.items() }
+        game._body_columns = { x: column[:] for x, column in self._body_columns.items() }
+        game.game_log = GameLog(dict(self.game_log.header), self.game_log.records)
+        # Only the original game streams its recording to disk
+        game._log_writer = None
+        return game
+
+    def _steps_to_obstacle(self, head_x:int, head_y:int, direction_x:int, direction_y:int):
+        """
+        Count the steps from the head to the nearest body segment or the first cell outside of the board along a straight line.
+
+        Parameters
+        ----------
+        head_x, head_y : int
+            Position of the snake's head.
+        direction_x, direction_y : int
+            Absolute direction (NORTH, EAST, SOUTH or WEST).
+
+        Returns
+        -------
+        int
+            Number of steps.
+
+        """
+        # Walk along the row of the head
+        if direction_x != 0:
+            segments, position, steps = self._body_rows.get(head_y, []), head_x, ( self.BOARD_SIZE[0] - head_x if direction_x == 1 else head_x + 1 )
+            direction = direction_x
+        # Walk along the column of the head
+        else:
+            segments, position, steps = self._body_columns.get(head_x, []), head_y, ( self.BOARD_SIZE[1] - head_y if direction_y == 1 else head_y + 1 )
+            direction = direction_y
+        
+        # Find the nearest segment in front of the head with a binary search. The head itself is not an obstacle.
+        if direction == 1:
+            index = bisect_right(segments, position)
+            if index < len(segments): steps = min(steps, segments[index] - position)
+        else:
+            index = bisect_left(segments, position)
+            if index > 0: steps = min(steps, position - segments[index-1])
+        
+        return steps
+    
+    def reduce_current_gameState_dimensions(self, out:np.ndarray=None):
+        """
+        Compute the features of the current game state in O(log n). Returns the same numbers as self.reduce_gameState_dimensions() for the current
+        game state, but uses the sorted lists of body segments instead of looking at every segment of the body. Used when playing live.
+
+        Parameters
+        ----------
+        out : np.ndarray, optional
+            Array with 6 elements. The features are written into it instead of a new array. The default is None.
+
+        Returns
+        -------
+        np.ndarray
+            Same as self.reduce_gameState_dimensions(). out, if it is given.
+
+        """
+        head_x, head_y = divmod(self._body_cells[0], self._GRID_STRIDE)[::-1]
+        head_x, head_y = head_x - 1, head_y - self._GRID_OFFSET_Y
+        forward_x, forward_y = self._get_current_direction().tolist()
+        right_x, right_y = -forward_y, forward_x
+        width, height = self.BOARD_SIZE
+        
+        # The snake is dead, if the head is outside of the board or on top of another segment. Every obstacle has the distance 0.
+        row = self._body_rows[head_y]
+        if not ( 0 <= head_x < width and 0 <= head_y < height ) or bisect_right(row, head_x) - bisect_left(row, head_x) > 1:
+            relativeDistanceObstacleForward = relativeDistanceObstacleRight = relativeDistanceObstacleLeft = 0.0
+        else:
+            # Normalise the distances with the size of the board along the direction
+            relativeDistanceObstacleForward = self._steps_to_obstacle(head_x, head_y, forward_x, forward_y) / ( width if forward_x != 0 else height )
+            relativeDistanceObstacleRight = self._steps_to_obstacle(head_x, head_y, right_x, right_y) / ( width if right_x != 0 else height )
+            relativeDistanceObstacleLeft = self._steps_to_obstacle(head_x, head_y, -right_x, -right_y) / ( width if right_x != 0 else height )
+        
+        # Get the normalised difference vector from the snakes head to the apple and transform it into a vector relative to the snakes travelling direction.
+        absoluteDirectionAppleX = ( int(self.position_apple[0]) - head_x ) / width
+        absoluteDirectionAppleY = ( int(self.position_apple[1]) - head_y ) / height
+        directionAppleX = absoluteDirectionAppleX*forward_x + absoluteDirectionAppleY*forward_y
+        directionAppleY = absoluteDirectionAppleX*right_x + absoluteDirectionAppleY*right_y
+        distanceApple = math.sqrt(directionAppleX**2 + directionAppleY**2)
+        
+        features = ( directionAppleX, directionAppleY, distanceApple,
+                     relativeDistanceObstacleForward, relativeDistanceObstacleRight, relativeDistanceObstacleLeft )
+        if out is None: return np.array(features)
+        out[:] = features
+        return out
+    #
+    #   <<< RAY CACHE
+    #
     
     #
     #   >>> PREPROCESS GAME STATES
@@ -88,7 +282,7 @@ class NeuralNetwork(Snake):
         # Get the position of the snakes head
         SNAKE_HEAD = np.array(gameState["snake_position"][0])
         # Get the size of the board
-        BOARD_SIZE = np.array(gameState["BOARD_SIZE"])
+        BOARD_SIZE = np.array(gameState["board_size"])
         # Get the direction the snake is currently facing
         FORWARD_ABSOLUTE = SNAKE_HEAD - np.array(gameState["snake_position"][1])
         # Rotate the direction the snake is currently facing by 90° clockwise
@@ -98,24 +292,22 @@ class NeuralNetwork(Snake):
         # This is done by writing the basis vectors of the new basis columnwise in the matrix.
         ABSOLUTE_TO_RELATIVE_DIRECTION= np.array([ FORWARD_ABSOLUTE, RIGHT_ABSOLUTE ]).T
         
-        # Get the normalised position of the snake's head
-        # Normalise with the board size. This way the neural net knows where the walls are. If one component is either 0 or 1, it hot a wall.
-        snakeHeadX, snakeHeadY = SNAKE_HEAD / BOARD_SIZE
-        
         #
         # >>> DISTANCE TO WALL OR BODY
         #
         # Get the distance to the nearest part of the snake body
         # If the body is not in the way, use the distance to the wall
         
-        # Get the relative and normalised position of the snakes body and view them relative to the direction of travel
-        relativeSnakeBody = [ ( ( SNAKE_HEAD - np.array(body) ) / BOARD_SIZE ) @ ABSOLUTE_TO_RELATIVE_DIRECTION 
-                              for body in gameState["snake_position"] ]
+        # Get the relative and normalised position of the snakes body (without the head) and view them relative to the direction of travel
+        relativeSnakeBody = [ ( ( np.array(body) - SNAKE_HEAD ) / BOARD_SIZE ) @ ABSOLUTE_TO_RELATIVE_DIRECTION 
+                              for body in gameState["snake_position"][1:] ]
         # Make a list of the points on the wall the snake can run into, when walking along a straight line (relative positions).
-        relativeWallPosition = [ np.array(0         , snakeHeadY),
-                                 np.array(snakeHeadX, 0         ),
-                                 np.array(1         , snakeHeadY),
-                                 np.array(snakeHeadX, 1         ) ]
+        # The wall is the first row or column outside of the board. If the snake is already dead, the distance to the obstacle it ran into is 0.
+        relativeWallPosition = [ ( ( np.array(wall) - SNAKE_HEAD ) / BOARD_SIZE ) @ ABSOLUTE_TO_RELATIVE_DIRECTION
+                                 for wall in [ [-1           , SNAKE_HEAD[1]],
+                                               [SNAKE_HEAD[0], -1           ],
+                                               [BOARD_SIZE[0], SNAKE_HEAD[1]],
+                                               [SNAKE_HEAD[0], BOARD_SIZE[1]] ] ]
         # Make a list of all things that the snake might run into (relative positions of the snake body and the walls)
         relativeSnakeObstacles = relativeSnakeBody + relativeWallPosition
         
@@ -126,7 +318,7 @@ class NeuralNetwork(Snake):
                                             # Loop over all obstacles
                                             for pos in relativeSnakeObstacles
                                             # Use only obstacles that are in the FORWARD direction ([1,0]).
-                                            if ( np.linalg.norm(pos) == np.array([1,0]) ).all() ]
+                                            if pos[1] == 0 and pos[0] >= 0 ]
         # Get the smallest distance in front of the snake
         relativeDistanceObstacleForward = min(relativeDistanceObstacleForward)
         
@@ -136,7 +328,7 @@ class NeuralNetwork(Snake):
                                           # Loop over all obstacles
                                           for pos in relativeSnakeObstacles
                                           # Use only obstacles that are in the RIGHT direction ([0,1]).
-                                          if ( np.linalg.norm(pos) == np.array([0,1]) ).all() ]
+                                          if pos[0] == 0 and pos[1] >= 0 ]
         # Get the smallest distance to the right
         relativeDistanceObstacleRight = min(relativeDistanceObstacleRight)
         
@@ -146,7 +338,7 @@ class NeuralNetwork(Snake):
                                           # Loop over all obstacles
                                           for pos in relativeSnakeObstacles
                                           # Use only obstacles that are in the LEFT direction ([0,-1]).
-                                          if ( np.linalg.norm(pos) == np.array([0,-1]) ).all() ]
+                                          if pos[0] == 0 and pos[1] <= 0 ]
         # Get the smallest distance to the left
         relativeDistanceObstacleLeft = min(relativeDistanceObstacleLeft)
         #
@@ -165,6 +357,108 @@ class NeuralNetwork(Snake):
                           relativeDistanceObstacleForward, relativeDistanceObstacleRight, relativeDistanceObstacleLeft
                         ])
     
+    def reduce_gameStates_dimensions(self, heads, directions, apples, board_sizes, body, body_offsets):
+        """
+        Batched version of self.reduce_gameState_dimensions(). Computes the same numbers for many game states at once with numpy operations
+        over the whole batch instead of python loops over every body segment.
+
+        Parameters
+        ----------
+        heads : np.ndarray (N, 2)
+            Position of the snake's head of every game state.
+        directions : np.ndarray (N, 2)
+            Direction the snake is facing (head minus second body segment).
+        apples : np.ndarray (N, 2)
+            Position of the apple.
+        board_sizes : np.ndarray (N, 2)
+            Width and height of the board.
+        body : np.ndarray (M, 2)
+            Positions of the body segments of all game states. The body of game state i is body[body_offsets[i]:body_offsets[i+1]] (head first).
+        body_offsets : np.ndarray (N+1,)
+            Offsets of the bodies in body.
+
+        Returns
+        -------
+        np.ndarray (N, 6)
+            One row per game state. Same columns as self.reduce_gameState_dimensions().
+
+        """
+        heads = np.asarray(heads, dtype=np.int64)
+        FORWARD_ABSOLUTE = np.asarray(directions, dtype=np.int64)
+        BOARD_SIZES = np.asarray(board_sizes, dtype=np.int64)
+        n_states = len(heads)
+        if n_states == 0: return np.zeros((0, 6))
+        
+        # Rotate the direction the snake is facing by 90° clockwise (same as FORWARD_ABSOLUTE @ [[0, 1], [-1, 0]])
+        RIGHT_ABSOLUTE = np.stack([ -FORWARD_ABSOLUTE[:,1], FORWARD_ABSOLUTE[:,0] ], axis=1)
+        # The snake only moves along the axes. Get the board size along the forward and the right direction to normalise distances.
+        board_forward = np.where(FORWARD_ABSOLUTE[:,0] != 0, BOARD_SIZES[:,0], BOARD_SIZES[:,1])
+        board_right = np.where(RIGHT_ABSOLUTE[:,0] != 0, BOARD_SIZES[:,0], BOARD_SIZES[:,1])
+        
+        #
+        # >>> DISTANCE TO WALL
+        #
+        def steps_to_wall(direction):
+            # Number of steps from the head to the first cell outside of the board, when walking in direction
+            return np.where(direction[:,0] ==  1, BOARD_SIZES[:,0] - heads[:,0],
+                   np.where(direction[:,0] == -1, heads[:,0] + 1,
+                   np.where(direction[:,1] ==  1, BOARD_SIZES[:,1] - heads[:,1],
+                                                  heads[:,1] + 1 )))
+        wall_forward = steps_to_wall(FORWARD_ABSOLUTE)
+        wall_right = steps_to_wall(RIGHT_ABSOLUTE)
+        wall_left = steps_to_wall(-RIGHT_ABSOLUTE)
+        # A wall at distance 0 (the snake is dead) is in front, to the right and to the left of the snake at the same time
+        wall_at_head = (wall_forward == 0) | (wall_right == 0) | (wall_left == 0) | (steps_to_wall(-FORWARD_ABSOLUTE) == 0)
+        
+        relativeDistanceObstacleForward = np.where(wall_at_head, 0, wall_forward / board_forward)
+        relativeDistanceObstacleRight = np.where(wall_at_head, 0, wall_right / board_right)
+        relativeDistanceObstacleLeft = np.where(wall_at_head, 0, wall_left / board_right)
+        #
+        # >>> DISTANCE TO BODY
+        #
+        # Only use the part of body that belongs to this batch. int32 is plenty for positions and halves the memory traffic.
+        body_offsets = np.asarray(body_offsets, dtype=np.int64)
+        segments = np.asarray(body[body_offsets[0]:body_offsets[-1]], dtype=np.int32)
+        starts = body_offsets[:-1] - body_offsets[0]
+        # Index of the game state every body segment belongs to
+        owner = np.repeat(np.arange(n_states), np.diff(body_offsets))
+        # Position of every segment relative to the head along the forward and the right direction (in steps)
+        forward_x, forward_y = FORWARD_ABSOLUTE[:,0].astype(np.int32)[owner], FORWARD_ABSOLUTE[:,1].astype(np.int32)[owner]
+        delta_x = segments[:,0] - heads[:,0].astype(np.int32)[owner]
+        delta_y = segments[:,1] - heads[:,1].astype(np.int32)[owner]
+        steps_forward = delta_x*forward_x + delta_y*forward_y
+        steps_right = delta_y*forward_x - delta_x*forward_y
+        
+        # Number of steps to every segment, that is in the FORWARD, RIGHT or LEFT direction. Every other segment is too far away to matter.
+        FAR_AWAY = np.iinfo(np.int32).max
+        body_forward = np.where((steps_right == 0) & (steps_forward >= 0), steps_forward, FAR_AWAY)
+        beside = steps_forward == 0
+        body_right = np.where(beside & (steps_right >= 0), steps_right, FAR_AWAY)
+        body_left = np.where(beside & (steps_right <= 0), -steps_right, FAR_AWAY)
+        # The head itself is not an obstacle
+        body_forward[starts] = body_right[starts] = body_left[starts] = FAR_AWAY
+        
+        # Get the smallest distance per game state, normalise it and compare it with the distance to the wall
+        body_forward, body_right, body_left = ( np.minimum.reduceat(steps, starts) for steps in (body_forward, body_right, body_left) )
+        relativeDistanceObstacleForward = np.where(body_forward < FAR_AWAY, np.minimum(relativeDistanceObstacleForward, body_forward / board_forward), relativeDistanceObstacleForward)
+        relativeDistanceObstacleRight = np.where(body_right < FAR_AWAY, np.minimum(relativeDistanceObstacleRight, body_right / board_right), relativeDistanceObstacleRight)
+        relativeDistanceObstacleLeft = np.where(body_left < FAR_AWAY, np.minimum(relativeDistanceObstacleLeft, body_left / board_right), relativeDistanceObstacleLeft)
+        #
+        # <<< DISTANCE TO WALL OR BODY DONE
+        #
+        
+        # Get the normalised difference vector from the snakes head to the apple and transform it into a vector relative to the snakes travelling direction.
+        absoluteDirectionApple = ( np.asarray(apples, dtype=np.int64) - heads ) / BOARD_SIZES
+        directionAppleX = absoluteDirectionApple[:,0]*FORWARD_ABSOLUTE[:,0] + absoluteDirectionApple[:,1]*FORWARD_ABSOLUTE[:,1]
+        directionAppleY = absoluteDirectionApple[:,0]*RIGHT_ABSOLUTE[:,0] + absoluteDirectionApple[:,1]*RIGHT_ABSOLUTE[:,1]
+        # Get the normalised distance from the snake's head to the apple
+        distanceApple = np.sqrt(directionAppleX**2 + directionAppleY**2)
+        
+        # Return 2D numpy array to describe the states of the games (with reduced dimensions)
+        return np.stack([ directionAppleX, directionAppleY, distanceApple,
+                          relativeDistanceObstacleForward, relativeDistanceObstacleRight, relativeDistanceObstacleLeft
+                        ], axis=1)
+    
     def evaluate_action(self, gameState):
         """
         This function takes in the current gameState and the planned action (the action is part of the gameState dictionary) to create a score. This score determines how good the move was.
@@ -235,6 +529,43 @@ class NeuralNetwork(Snake):
         # Return single number between 0 and 1. Describes the value of the move. 0: bad, 1: good.
         return GAMESCORE
     
+    def evaluate_actions(self, heads, directions, apples, actions, deadly):
+        """
+        Batched version of self.evaluate_action(). Computes the same scores for many game states at once.
+
+        Parameters
+        ----------
+        heads, directions, apples : np.ndarray (N, 2)
+            Position of the snake's head, direction the snake is facing and position of the apple of every game state.
+        actions : np.ndarray (N,)
+            The next action (LEFT, FORWARD, RIGHT).
+        deadly : np.ndarray (N,)
+            True if the next action killed the snake.
+
+        Returns
+        -------
+        np.ndarray (N,)
+            Score between 0 and 1 for every action.
+
+        """
+        directionToApple = np.asarray(apples, dtype=np.int64) - np.asarray(heads, dtype=np.int64)
+        current_direction = np.asarray(directions, dtype=np.int64)
+        actions = np.asarray(actions, dtype=np.int64)
+        # Rotate the current direction by actions*90°. cos is 1 for FORWARD and 0 else, sin is equal to the relative direction.
+        cos, sin = 1 - np.abs(actions), actions
+        absoluteAction = np.stack([ current_direction[:,0]*cos - current_direction[:,1]*sin,
+                                    current_direction[:,0]*sin + current_direction[:,1]*cos ], axis=1)
+        
+        currentDistanceToApple = np.sqrt((directionToApple**2).sum(axis=1))
+        newDistanceToApple = np.sqrt(((absoluteAction + directionToApple)**2).sum(axis=1))
+        
+        # Same rules as in self.evaluate_action()
+        GAMESCORE = np.where(newDistanceToApple > currentDistanceToApple, 0.1 + 0.3, 0.1)
+        GAMESCORE = np.where(newDistanceToApple == 0, 1, GAMESCORE)
+        GAMESCORE = np.where(np.asarray(deadly, dtype=bool), 0, GAMESCORE)
+        
+        return GAMESCORE
+    
     def preprocess_gameStates(self, gameStates):
         """
         Convert a single game state into a numpy array that can be inputed into a neural network. This function expects the game state as a dictionary of a specific form. Therefore this method should not be called directly. There are other methods, that create the right formatted dictionary and call this method.
@@ -277,37 +608,269 @@ class NeuralNetwork(Snake):
         # Return the preprocessed information
         return input_state, output_action, action_value
     
-    def preprocess_trainingDataFile(self, path_to_files):
+    def preprocess_trainingDataFile(self, path_to_files, cache=None, workers:int=1):
         """
         Convert the game states generated by generate_human_training_data() and generate_random_training_data() into a numpy arrays that can be put into the neueral network.
+        Every file is preprocessed on its own. With a cache, only files that are new or changed since the last call are preprocessed.
+        Games in containers (see shards.py) are read through the index of the container and are not cached.
         
-        TODO: DOCSTRING
+        With more than one worker, the files that are not in the cache are split into contiguous shards and a pool of processes reads and
+        preprocesses the shards. The workers return the arrays of a shard in one block of shared memory (see _preprocess_files()) instead of
+        pickling them. The shards are put together in the order of the files, so the result is the same for any number of workers.
+        
+        input_state and action_value are float32 (the dtype the network is trained with), no matter if they were preprocessed in this process,
+        by a worker or loaded from the cache.
 
         Parameters
         ----------
-        gameStates : TYPE
-            DESCRIPTION.
+        path_to_files : list of Paths
+            Directories with recorded games (*.json, *.snakelog) or containers.
+        cache : Path or feature_cache.FeatureCache, optional
+            Directory of the cache for preprocessed files or an opened cache. The default is None (don't use a cache).
+        workers : int, optional
+            Number of processes preprocessing the files in parallel. The default is 1 (preprocess all files in this process).
 
         Returns
         -------
-        None.
+        Same as self.preprocess_gameStates(), but input_state and action_value are float32.
+
+        """
+        if not isinstance(workers, int) or workers < 1: raise ValueError("The number of workers must be a positive integer.")
+        
+        # Progress bar. Imported here, so headless workers that never show progress don't pay for the import.
+        from tqdm import tqdm
+        
+        # Open the cache
+        if cache is not None and not isinstance(cache, FeatureCache):
+            cache = FeatureCache(cache, FEATURE_VERSION)
+        
+        # Get a list of all json-files and game logs in the directories. Containers are not listed, their games are read through their index.
+        files = [ file for folder in path_to_files if not is_container(folder) for file in list_game_files([folder]) ]
+        containers = [ folder for folder in path_to_files if is_container(folder) ]
+        
+        # Try the cache first. Only the files that are not cached are read.
+        preprocessed = [ cache.get(file) if cache is not None else None for file in files ]
+        missing = [ file for file, arrays in zip(files, preprocessed) if arrays is None ]
+        
+        if workers == 1:
+            # Read the files (game logs are replayed to get the game states) and preprocess all game states of a file at once
+            results = ( self._preprocess_file(file) for file in missing )
+        else:
+            results = self._preprocess_files_parallel(missing, workers)
+        
+        # Put the arrays of the missing files into the gaps. Files without game states stay None.
+        # Close the results in any case, so the workers are stopped and their shared memory is freed, even if something goes wrong.
+        try:
+            missing_arrays = iter(tqdm(results, total=len(missing), desc="Read training data", unit=" files"))
+            for index, arrays in enumerate(preprocessed):
+                if arrays is not None: continue
+                preprocessed[index] = next(missing_arrays)
+                if cache is not None and preprocessed[index] is not None: cache.put(files[index], *preprocessed[index])
+        finally:
+            results.close()
+        preprocessed = [ arrays for arrays in preprocessed if arrays is not None ]
+        
+        for _, gameStates in tqdm(iter_recorded_games(containers), desc="Read containers", unit=" games"):
+            if len(gameStates) > 0: preprocessed.append(_compact(*self._preprocess_columns(**states_to_columns(gameStates))))
+        
+        # Nothing to preprocess
+        if len(preprocessed) == 0:
+            return np.zeros((0, 6), dtype=np.float32), np.zeros((0, 3), dtype=int), np.zeros(0, dtype=np.float32)
+        
+        # Put the arrays of all files together
+        return tuple( np.concatenate(arrays) for arrays in zip(*preprocessed) )
+    
+    def _preprocess_file(self, file:Path):
+        """
+        Read a recorded game and preprocess all its game states at once.
+
+        Parameters
+        ----------
+        file : Path
+            A recorded game (*.json, *.snakelog).
+
+        Returns
+        -------
+        Same as self.preprocess_gameStates() (input_state and action_value as float32) or None, if the file has no game states.
+
+        """
+        gameStates = read_game_states(file)
+        if len(gameStates) == 0: return None
+        return _compact(*self._preprocess_columns(**states_to_columns(gameStates)))
+    
+    def _preprocess_files_parallel(self, files:list, workers:int):
+        """
+        Preprocess recorded games with a pool of processes. Used by self.preprocess_trainingDataFile().
+        
+        The files are split into contiguous shards (a few per worker, so the workers stay busy if the files differ in size). The results of
+        the shards are read in the order of the shards, copied out of the shared memory and the shared memory is freed. If the generator is
+        closed early (or reading fails), the shards that were not read yet are cancelled or their shared memory is freed.
+
+        Parameters
+        ----------
+        files : list of Paths
+            The recorded games.
+        workers : int
+            Number of processes.
+
+        Yields
+        ------
+        Same as self._preprocess_file(). One result per file, in the order of files.
 
         """
+        if len(files) == 0: return
+        
+        # Pool of processes and shared memory. Imported here, so worker processes don't pay for the imports.
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import resource_tracker
+        from multiprocessing.shared_memory import SharedMemory
         
-        # Get a list of genertors. For every element of path_to_files exists a generator with all json-files in that directory.
-        files = [ Path(folder).glob("*.json") for folder in path_to_files ]
-        # Flatten the list
-        files = [ file for file_glob in files for file in file_glob ]
+        # Split the files into contiguous shards
+        bounds = np.linspace(0, len(files), min(len(files), 4*workers)+1).astype(int).tolist()
+        shards = [ (self._get_game_settings(), files[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:]) ]
+        
+        # The workers have to share the resource tracker of this process. Otherwise the tracker of a worker would free the shared memory
+        # of its results, when the worker exits.
+        resource_tracker.ensure_running()
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [ executor.submit(_preprocess_files, shard) for shard in shards ]
+            # Number of shards that were read
+            done = 0
+            try:
+                for future in futures:
+                    name, counts = future.result()
+                    done += 1
+                    if name is None:
+                        yield from ( None for _ in counts )
+                        continue
+                    
+                    # Copy the arrays of every file out of the shared memory and free it
+                    shared_memory = SharedMemory(name=name)
+                    input_state, output_action, action_value = _shard_arrays(shared_memory.buf, sum(counts))
+                    try:
+                        start = 0
+                        for count in counts:
+                            if count == 0:
+                                yield None
+                                continue
+                            yield (input_state[start:start+count].copy(), output_action[start:start+count].astype(int),
+                                   action_value[start:start+count].copy())
+                            start += count
+                    finally:
+                        # Release the views of the shared memory before closing it
+                        del input_state, output_action, action_value
+                        shared_memory.close()
+                        shared_memory.unlink()
+            finally:
+                # Free the shared memory of the shards that were not read
+                for future in futures[done:]:
+                    if future.cancel(): continue
+                    try:
+                        name, _ = future.result()
+                    except Exception:
+                        continue
+                    if name is not None: _unlink_shared_memory(name)
+    
+    def preprocess_dataset(self, dataset):
+        """
+        Convert the game states of a dataset written by dataset.build_dataset() into numpy arrays that can be put into the neural network.
+        The dataset is memory-mapped. There are no files to list and no json to parse. Pass a slice of a dataset to preprocess only a part of it.
 
-        # Read every file and convert the json format into a python object.
-        gameStates = ( json.loads(file.read_text()) for file 
-                       in tqdm(files, desc="Read training data", unit=" files") )
-        # Flatten the list, because every file contains a list of game states.
-        gameStates = [ state for game in gameStates for state in game ]
+        Parameters
+        ----------
+        dataset : Path or dataset.TrainingDataset
+            Directory of the dataset or an opened (and maybe sliced) dataset.
 
-        # Input the list of game states into the preprocessing routine
-        return self.preprocess_gameStates(gameStates)
+        Returns
+        -------
+        Same as self.preprocess_gameStates().
 
+        """
+        # Open the dataset
+        if not isinstance(dataset, TrainingDataset):
+            dataset = TrainingDataset(dataset)
+        
+        # Preprocess all game states at once
+        return self._preprocess_columns(dataset.head, dataset.apple, dataset.board_size, dataset.next_action,
+                                        dataset.next_action_deadly, dataset.body, dataset.body_offsets)
+    
+    def _preprocess_columns(self, head, apple, board_size, next_action, next_action_deadly, body, body_offsets, **_):
+        """
+        Batched version of self.preprocess_gameStates() for game states stored as columns (see the module dataset).
+        Additional columns (like steps_walked_since_last_apple) are ignored, so a dict returned by dataset.states_to_columns() can be passed with **.
+
+        Returns
+        -------
+        Same as self.preprocess_gameStates().
+
+        """
+        body_offsets = np.asarray(body_offsets)
+        head = np.asarray(head)
+        # The direction the snake is facing is the difference between the head and the second body segment
+        directions = head.astype(np.int64) - np.asarray(body[body_offsets[:-1]+1], dtype=np.int64)
+        
+        input_state = self.reduce_gameStates_dimensions(head, directions, apple, board_size, body, body_offsets)
+        # LEFT = [ 1 0 0 ], FORWARD = [ 0 1 0 ], RIGHT = [ 0 0 1 ]
+        output_action = np.eye(3, dtype=int)[np.asarray(next_action, dtype=np.int64) - LEFT]
+        action_value = self.evaluate_actions(head, directions, apple, next_action, next_action_deadly)
+        
+        return input_state, output_action, action_value
+
+    def iter_preprocessed(self, path_to_files, batch_size:int=1024):
+        """
+        Stream the preprocessed training data in minibatches. Files are read one by one, when they are needed, the features are computed for one
+        file (or one batch of a dataset) at a time and written into preallocated buffers (same dtypes as preprocess_trainingDataFile()). Memory stays constant no matter how big the training data is and training can start after the first batch.
+        
+        The same buffers are reused for every batch. Copy a batch, if you want to keep it after requesting the next one.
+
+        Parameters
+        ----------
+        path_to_files : list of Paths or dataset.TrainingDataset
+            Directories with recorded games (*.json, *.snakelog), containers (see shards.py) or a dataset written by dataset.build_dataset().
+        batch_size : int, optional
+            Number of game states per batch. The default is 1024.
+
+        Yields
+        ------
+        input_state, output_action, action_value : np.ndarrays
+            Same as self.preprocess_gameStates(), but with at most batch_size game states. The last batch may be smaller.
+
+        """
+        if not isinstance(batch_size, int) or batch_size < 1: raise ValueError("batch_size must be a positive integer.")
+        
+        # Read the game states lazily. Only one file (or one batch of the dataset) is kept in memory at a time.
+        if isinstance(path_to_files, TrainingDataset):
+            chunks = ( self.preprocess_dataset(path_to_files[start:start+batch_size]) for start in range(0, len(path_to_files), batch_size) )
+        else:
+            chunks = ( self._preprocess_columns(**states_to_columns(gameStates)) for _, gameStates in iter_recorded_games(path_to_files) if len(gameStates) > 0 )
+        
+        # Preallocate the buffers for one batch
+        input_state = np.zeros((batch_size, 6), dtype=np.float32)
+        output_action = np.zeros((batch_size, 3), dtype=int)
+        action_value = np.zeros(batch_size, dtype=np.float32)
+        
+        row = 0
+        for chunk_input, chunk_output, chunk_value in chunks:
+            # Copy the chunk into the buffers. A chunk may fill more than one batch.
+            position = 0
+            while position < len(chunk_input):
+                count = min(batch_size - row, len(chunk_input) - position)
+                input_state[row:row+count] = chunk_input[position:position+count]
+                output_action[row:row+count] = chunk_output[position:position+count]
+                action_value[row:row+count] = chunk_value[position:position+count]
+                row += count
+                position += count
+                
+                # The batch is full
+                if row == batch_size:
+                    yield input_state, output_action, action_value
+                    row = 0
+        
+        # Return the remaining game states
+        if row > 0:
+            yield input_state[:row], output_action[:row], action_value[:row]
+    
     #
     #   <<< PREPROCESS GAME STATES
     #
@@ -315,43 +878,51 @@ class NeuralNetwork(Snake):
     #
     #   >>> GENERATE TRAINING DATA
     #
-    def generate_human_training_data(self, save_gamestate_to:Path, *args, **kwargs):
+    def generate_human_training_data(self, save_gamestate_to:Path, *args, fsync_interval:float=1.0, **kwargs):
         """
         Wrapper for Snake.play() method. This is used to generate training data from the games played by a human.
-        This wrapper saves the location of a file, where the gamestates will be saved after every move and then it calls it's play() method (inherited from Snake class).
-        The NeuralNetwork method move() uses the file path to save the gamestate. 
+        This wrapper starts a new recording of the game and then it calls it's play() method (inherited from Snake class).
+        The NeuralNetwork method move() adds every step to the recording. The recording is streamed to the game log (see game_log.GameLogWriter)
+        by a background thread while the game is played, so there is no pause at the end of the game and a crash doesn't lose the game.
 
         Parameters
         ----------
         save_gamestate_to : Path
-            Directory where to save the gamestates?
+            File where to save the game log.
         *args : TYPE
             Some shit passed to self.play().
+        fsync_interval : float, optional
+            Seconds between two flushes of the game log to disk. The default is 1.0.
         **kwargs : TYPE
             Some shit passed to self.play().
 
         Returns
         -------
-        None.
+        dict
+            Timing of the game loop (see Snake.play()).
 
         """
         # Create the empty file to store the game states in
         save_gamestate_to = Path(save_gamestate_to)
         
-        # Wipe the variable storing a list of all previous game states
-        # It will be refilled during the executiion of self.play()
-        self.game_state_history = []
+        # Start a new recording of the game
+        # It will be filled during the executiion of self.play() and handed over to the writer in chunks
+        self.game_log = GameLog.from_snake(self)
+        self._log_writer = GameLogWriter(save_gamestate_to, self.game_log, fsync_interval=fsync_interval)
         
-        # Play the game
-        self.play(*args, **kwargs)
-        
-        # Write all previous states of the game to json-file
-        save_gamestate_to.write_text(json.dumps(self.game_state_history)+"\n")
+        # Play the game. Write the rest of the recording, even if the game crashes.
+        try:
+            timing = self.play(*args, **kwargs)
+        finally:
+            self._log_writer.close(self.game_log.records)
+            self.game_log.records.clear()
+            self._log_writer = None
+        return timing
         
         
     def move(self, action, *args, **kwargs):
         """
-        Wrapper around the parents move() method. It saves the game state to a file, when moving the snake
+        Wrapper around the parents move() method. It adds the action and newly spawned apples to the recording of the game (self.game_log).
 
         Parameters
         ----------
@@ -362,7 +933,8 @@ class NeuralNetwork(Snake):
 
         Returns
         -------
-        None.
+        bool
+            The status of the snake: True=GameOver, False=Snake is alive and well.
 
         """
         # Check if the action the snake should perform is a relative direction
@@ -370,28 +942,36 @@ class NeuralNetwork(Snake):
             # Check if the parameter direction is a valid relative direction. Valid relative directions are the ints LEFT, RIGHT and FORWARD (defined above the class snake.Snake.)
             raise ValueError("Wrong value passed for parameter 'action'. neural_network.NeuralNetwork.move() expects the directions Snake.LEFT, Snake.FORWARD and Snake.RIGHT.")
         
-        # GET PREV. GAME STATE
-        # Get the state of the game BEFORE moving the snake. Save also the intended walking direction
-        # Convert numpy arrays of numpy ints to tuples for python ints so they can be saved as in json
-        prev_game_state = {"snake_position": [ elem.tolist() for elem in self.position_snake_body ],
-                           "apple_position": self.position_apple.tolist(),
-                           "board_size": self.BOARD_SIZE,
-                           "steps_walked_since_last_apple": self.step_counter,
-                           "next_action": action}
+        # Remember the apple BEFORE moving the snake. Snake._spawn_apple() replaces the array, when a new apple is spawned.
+        prev_apple = self.position_apple
         
         # Move the snake
-        super().move(action, *args, **kwargs)
+        snake_dead = super().move(action, *args, **kwargs)
         
-        # Was the move deadly? Append this information to the game_state
-        prev_game_state["next_action_deadly"] = self._snake_dead
+        # Save the action and the new apple. The full game state can be rebuild by replaying the game log.
+        if self.recording:
+            timing = STATS.enabled and STATS.sample("NeuralNetwork.move")
+            if timing: phase_start = perf_counter()
+            self.game_log.append_action(action)
+            if self.position_apple is not prev_apple:
+                self.game_log.append_apple(self.position_apple)
+            # Hand over full chunks (or the records of the last fsync_interval seconds) to the background writer, so the recording in memory
+            # stays small and reaches the disk soon
+            if self._log_writer is not None and self._log_writer.is_due(len(self.game_log.records)):
+                self._log_writer.push(self.game_log.records)
+                self.game_log.records.clear()
+            if timing: STATS.lap("serialization", phase_start)
         
-        # Save the game state
-        self.game_state_history.append(prev_game_state)
+        # Return the status of the snake (same as Snake.move())
+        return snake_dead
             
         
-    def generate_random_training_data(self, save_to:Path, training_games:int=1000, maximal_steps_per_game:int=500):
+    def generate_random_training_data(self, save_to:Path, training_games:int=1000, maximal_steps_per_game:int=500, workers:int=1, seed:int=None, stats:Path=None, sample_every:int=10, sharded:bool=False):
         """
         Generate training data by random walking a bunch of games. The data is not processed in anyway. It's just the raw game output
+        
+        Every game gets its own seed, that is derived from the master seed. The generated files are the same no matter how many workers are used.
+        The games are played with the settings of this instance (board size, initial length, ...). The state of this instance is not changed.
 
         Parameters
         ----------
@@ -401,62 +981,78 @@ class NeuralNetwork(Snake):
             How many games should the programm play? The default is 100.
         maximal_steps_per_game : int, optional
             After how many steps should the programm abort a training game? The default is 100.
+        workers : int, optional
+            Number of processes playing games in parallel. The default is 1 (play all games in this process).
+        seed : int, optional
+            Master seed. The default is None (random seed).
+        stats : Path, optional
+            Measure the phases of every step and the file writes (see instrumentation.py) and save the statistics of all games as json file.
+            Resets the instrumentation (instrumentation.STATS) of this process. The default is None (no instrumentation).
+        sample_every : int, optional
+            Only time every n-th step, if stats is given. The default is 10.
+        sharded : bool, optional
+            Append the games in batches to a container in save_to (see shards.py) instead of writing one file per game. The games are
+            appended in the order of the game numbers, named like the files. The default is False.
 
         Returns
         -------
         Exit status (0=OK).
 
         """
+        if not isinstance(workers, int) or workers < 1: raise ValueError("The number of workers must be a positive integer.")
         
         # Convert directory to Path object
         training_directory = Path(save_to)
         # Create the directory if it doesn't exist
         training_directory.mkdir(parents=True, exist_ok=True)
         
-        # Create progress bar for a loop that plays snake games with random walks
-        with tqdm(iterable=range(training_games),
-                         unit=" games", desc="Playing Random",
-                         position=1, leave=False) as outer_progressbar:
-            # Start playing snake games with random walk
-            for game_number in range(training_games):
-                # Convert game number to easy readable string
-                game_number_string = "0"*(len(str(training_games))-1-len(str(game_number))) + str(game_number)
-                
-                # Generate a file name. This random walk will be saved to that file
-                game_file = training_directory/("randomGame_"+  game_number_string + ".json")
-                
-                # Update the outer progress bar (this progressbar keeps track of the whole process and not just one game)
-                outer_progressbar.update()
-                
-                # Reset the memory holding the whole history of the game
-                self.game_state_history = []
-                
-                # Play the game and add a progressbar with tqdm
-                for _ in tqdm(iterable=range(maximal_steps_per_game),
-                             desc=f"Game {game_number_string}", unit=" steps",
-                             position=0):
-                    # Generate a random walking direction
-                    action = r.choice([LEFT, FORWARD, RIGHT])
-
-                    # Move the snake
-                    self.move(action)
-                    
-                    # End the game if the player died
-                    if self._snake_dead == True:
-                        break
-                    
-                    # Redraw outer progress bar (this progressbar keeps track of the whole process and not just one game)
-                    outer_progressbar.refresh()
-                
-                # Write all previous states of the game to json-file
-                game_file.write_text(json.dumps(self.game_state_history)+"\n")
-                
-            
-                # Rerun the constructor of the Snake class. This resets the state of the game. 
-                # Make sure to pass all arguments, if you're not using the default settings!
-                super().__init__(board_width=self.BOARD_SIZE[0], board_height=self.BOARD_SIZE[1], box_size=self.BOX_SIZE, 
-                                 initial_length=self.initial_length, max_score_per_apple=self.MAXIMAL_SCORE_PER_APPLE,
-                                 min_score_per_apple=self.MINIMAL_SCORE_PER_APPLE, max_step_to_apple=self.MAXIMAL_STEP_COUNT)
+        # Derive one seed per game from the master seed. The seed of a game only depends on the master seed and the game number.
+        game_seeds = [ int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(training_games) ]
+        
+        # Generate a file name for every game. The random walk will be saved to that file
+        # Convert game number to easy readable string
+        game_files = [ training_directory/("randomGame_" + "0"*(len(str(training_games))-1-len(str(game_number))) + str(game_number) + ".snakelog")
+                       for game_number in range(training_games) ]
+        
+        # Arguments for _play_random_game(). Every game is played with the settings of this instance.
+        games = [ (self._get_game_settings(), game_seed, maximal_steps_per_game, None if sharded else game_file, sample_every if stats is not None else None)
+                  for game_seed, game_file in zip(game_seeds, game_files) ]
+        
+        # Progress bar and pool of processes. Imported here, so worker processes don't pay for the imports.
+        from tqdm import tqdm
+        from concurrent.futures import ProcessPoolExecutor
+        from contextlib import nullcontext
+        
+        # Statistics of all games. Every game returns its own statistics (also from worker processes).
+        collected = Stats()
+        
+        # The container for all games (the workers return the games instead of writing them) is closed and the pool of processes is shut
+        # down, even if something goes wrong.
+        with ( ShardWriter(training_directory) if sharded else nullcontext() ) as writer, \
+             ( ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() ) as executor:
+            # Create progress bar for a loop that plays snake games with random walks
+            # The progress bar is updated once per game. tqdm limits the refreshs of the terminal to 10 per second.
+            with tqdm(total=training_games, unit=" games", desc="Playing Random") as progressbar:
+                if executor is None:
+                    # Play all games in this process
+                    results = map(_play_random_game, games)
+                else:
+                    # Spread the games over a pool of processes
+                    results = executor.map(_play_random_game, games, chunksize=max(1, training_games//(16*workers)))
+                try:
+                    for game_file, (game_data, game_stats) in zip(game_files, results):
+                        if game_data is not None: writer.append(game_data, name=game_file.name)
+                        if game_stats is not None: collected.merge(game_stats)
+                        progressbar.update()
+                except BaseException:
+                    # Don't play the games that didn't start yet. Leaving the with-block waits for the running games.
+                    if executor is not None: executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+        
+        # Save the statistics
+        if stats is not None:
+            collected.sample_every = sample_every
+            collected.write(stats)
         
         # Return exit status
         return 0
@@ -464,7 +1060,155 @@ class NeuralNetwork(Snake):
     #
     #   <<< GENERATE TRAINING DATA
     #
+
+
+def _play_random_game(game:tuple):
+    """
+    Play one game with a random walk and write it to a file. Used by NeuralNetwork.generate_random_training_data(). This is a module level
+    function, so it can be send to worker processes.
+
+    Parameters
+    ----------
+    game : tuple
+        Settings of the game (keyword arguments for Snake.__init__()), seed of the game, maximal number of steps, the file for the game log
+        (None to return the game log instead of writing it) and sample_every for the instrumentation (None to play without instrumentation).
+
+    Returns
+    -------
+    bytes or None
+        The game log (see GameLog.to_bytes()), if no file is given.
+    dict or None
+        Statistics of the game (see instrumentation.Stats.summary()). None without instrumentation.
+
+    """
+    settings, game_seed, maximal_steps_per_game, game_file, sample_every = game
+    
+    # Collect the statistics of this game only
+    if sample_every is not None:
+        STATS.reset()
+        STATS.enable(sample_every)
     
+    # The seed controls the apples and the random walk
+    snake = NeuralNetwork(**settings, seed=game_seed)
+    
+    # Play the game
+    for _ in range(maximal_steps_per_game):
+        # Generate a random walking direction
+        action = snake._random.choice([LEFT, FORWARD, RIGHT])
+        
+        # Move the snake
+        snake.move(action)
+        
+        # End the game if the player died
+        if snake._snake_dead == True:
+            break
+    
+    # Write the recording of the game to file or send it to the process writing the container
+    if game_file is not None:
+        snake.game_log.write(game_file)
+        game_data = None
+    else:
+        game_data = snake.game_log.to_bytes()
+    
+    if sample_every is None: return game_data, None
+    STATS.disable()
+    return game_data, STATS.summary()
+
+
+# Bytes per game state in the shared memory block of a shard (see _shard_arrays()): input_state (6 float32), action_value (float32)
+# and output_action (3 int8)
+_SHARD_BYTES_PER_STATE = 6*4 + 4 + 3
+
+
+def _shard_arrays(buffer, n_states:int):
+    """
+    Views of the arrays in the shared memory block of a shard. Used by _preprocess_files() and NeuralNetwork._preprocess_files_parallel().
+
+    Parameters
+    ----------
+    buffer : memoryview
+        The shared memory block (at least n_states * _SHARD_BYTES_PER_STATE bytes).
+    n_states : int
+        Number of game states in the shard.
+
+    Returns
+    -------
+    input_state : np.ndarray
+        float32 array of shape (n_states, 6).
+    output_action : np.ndarray
+        int8 array of shape (n_states, 3).
+    action_value : np.ndarray
+        float32 array of shape (n_states,).
+
+    """
+    input_state = np.ndarray((n_states, 6), dtype=np.float32, buffer=buffer)
+    action_value = np.ndarray(n_states, dtype=np.float32, buffer=buffer, offset=n_states*6*4)
+    output_action = np.ndarray((n_states, 3), dtype=np.int8, buffer=buffer, offset=n_states*7*4)
+    return input_state, output_action, action_value
+
+
+def _compact(input_state:np.ndarray, output_action:np.ndarray, action_value:np.ndarray):
+    """
+    Convert the output of NeuralNetwork.preprocess_gameStates() to the dtypes of NeuralNetwork.preprocess_trainingDataFile(): input_state and
+    action_value as float32, output_action as int.
+    """
+    return input_state.astype(np.float32), output_action.astype(int, copy=False), action_value.astype(np.float32)
+
+
+def _unlink_shared_memory(name:str):
+    """
+    Free a block of shared memory returned by _preprocess_files() without reading it.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+    shared_memory = SharedMemory(name=name)
+    shared_memory.close()
+    shared_memory.unlink()
+
+
+def _preprocess_files(shard:tuple):
+    """
+    Read and preprocess a shard of recorded games and put the arrays of all files into one block of shared memory. Used by
+    NeuralNetwork.preprocess_trainingDataFile(). This is a module level function, so it can be send to worker processes.
+    
+    The block belongs to the caller: it has to copy the arrays out of it (see _shard_arrays()), close and unlink it.
+
+    Parameters
+    ----------
+    shard : tuple
+        Settings of the network (keyword arguments for Snake.__init__()) and the list of files.
+
+    Returns
+    -------
+    str or None
+        Name of the shared memory block. None, if no file has game states.
+    list of ints
+        Number of game states per file.
+
+    """
+    settings, files = shard
+    network = NeuralNetwork(**settings)
+    
+    # Preprocess all files of the shard
+    preprocessed = [ network._preprocess_file(file) for file in files ]
+    counts = [ 0 if arrays is None else len(arrays[2]) for arrays in preprocessed ]
+    if sum(counts) == 0: return None, counts
+    
+    # Copy the arrays of all files into one block of shared memory
+    from multiprocessing.shared_memory import SharedMemory
+    shared_memory = SharedMemory(create=True, size=sum(counts)*_SHARD_BYTES_PER_STATE)
+    input_state, output_action, action_value = _shard_arrays(shared_memory.buf, sum(counts))
+    start = 0
+    for count, arrays in zip(counts, preprocessed):
+        if arrays is None: continue
+        input_state[start:start+count], output_action[start:start+count], action_value[start:start+count] = arrays
+        start += count
+    
+    # Release the views of the shared memory before closing it. The block stays until the caller unlinks it.
+    del input_state, output_action, action_value
+    shared_memory.close()
+    return shared_memory.name, counts
+
+
 if __name__ == "__main__":
     
     import time
@@ -473,6 +1217,6 @@ if __name__ == "__main__":
     snake = NeuralNetwork()
     
     # Start a game of snake
-    save_games_to = Path(f"/home/jonas/code/python/snake/training_data/human_walk/humanGame_{int(time.time())}.json")
+    save_games_to = Path(f"/home/jonas/code/python/snake/training_data/human_walk/humanGame_{int(time.time())}.snakelog")
     snake.generate_human_training_data(save_gamestate_to=save_games_to)
     #snake.preprocess_trainingDataFile(["/home/jonas/code/python/snake/training_data/human_walk"])
\ No newline at end of file
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:12:37 2026
+
+@author: jonas
+
+
+This file renders recorded games without a display. The games are replayed with the game logic of the Snake class and drawn with
+Snake.draw_incremental() on an off-screen pygame surface, so the frames look exactly like the game in Snake.play(). Rendering is much
+faster than real time, because only the cells that changed are drawn and there is no frame rate limit.
+
+A rendered game is either a stacked uint8 array of shape (frames, height, width, 3), a directory of PNG images or an animated GIF.
+The first frame shows the recorded state before the first action, every further frame the state after one action.
+
+"""
+
+# Import the game logic and the recorded games
+from snake import Snake
+from game_log import GameLog, ReplaySnake
+
+# Import Pathlib for reading, writing files
+from pathlib import Path
+# Read recorded games in the old json format
+import json
+# Render many games in parallel
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pygame
+# Import progressbar
+from tqdm import tqdm
+
+
+# Supported output formats of save_game() and render_games()
+FORMATS = ("npy", "png", "gif")
+
+
+def read_game_log(path:Path):
+    """
+    Read a recorded game as game log. Works with game logs (*.snakelog) and the old json format (*.json).
+
+    Parameters
+    ----------
+    path : Path
+        The recorded game.
+
+    Returns
+    -------
+    GameLog
+        The recorded game.
+
+    """
+    path = Path(path)
+    if path.suffix == ".snakelog":
+        return GameLog.read(path)
+    return GameLog.from_states(json.loads(path.read_text()))
+
+
+def _iter_surfaces(game_log:GameLog, box_size:int=Snake.BOX_SIZE):
+    """
+    Replay a recorded game and draw every step on an off-screen surface.
+
+    Parameters
+    ----------
+    game_log : GameLog
+        The recorded game.
+    box_size : int, optional
+        Size of one cell of the board in pixels. The default is Snake.BOX_SIZE.
+
+    Yields
+    ------
+    surface : pygame.Surface
+        The rendered game. The same surface is reused for all frames.
+    changed : list of pygame.Rects
+        Areas of the surface that changed since the last frame (see Snake.draw_incremental()).
+
+    """
+    if not isinstance(box_size, int) or box_size < 1: raise ValueError("box_size must be a positive integer.")
+
+    actions, apples = game_log.decode()
+    snake = ReplaySnake(game_log.header, apples)
+    snake.BOX_SIZE = box_size
+
+    # Off-screen surface. Drawing on it doesn't need a display.
+    surface = pygame.Surface(tuple([ length*box_size for length in snake.BOARD_SIZE ]))
+
+    yield surface, snake.draw_incremental(surface)
+    for action in actions.tolist():
+        snake.move(action)
+        yield surface, snake.draw_incremental(surface)
+
+
+def iter_frames(game_log:GameLog, box_size:int=Snake.BOX_SIZE):
+    """
+    Replay a recorded game and render every step into a numpy array.
+
+    Parameters
+    ----------
+    game_log : GameLog
+        The recorded game.
+    box_size : int, optional
+        Size of one cell of the board in pixels. The default is Snake.BOX_SIZE.
+
+    Yields
+    ------
+    np.ndarray
+        uint8 array of shape (height, width, 3) with the RGB values of the frame. The same array is reused for all frames, copy it to keep a frame.
+
+    """
+    frame = None
+    for surface, changed in _iter_surfaces(game_log, box_size):
+        if frame is None:
+            frame = np.zeros((surface.get_height(), surface.get_width(), 3), dtype=np.uint8)
+
+        # Copying the whole surface is much slower than drawing a step. Copy only the areas that changed.
+        # surfarray uses (width, height) as shape.
+        pixels = pygame.surfarray.pixels3d(surface)
+        for rect in changed:
+            rect = rect.clip(surface.get_rect())
+            frame[rect.top:rect.bottom, rect.left:rect.right] = pixels[rect.left:rect.right, rect.top:rect.bottom].transpose(1, 0, 2)
+        # Unlock the surface
+        del pixels
+
+        yield frame
+
+
+def render_game(path:Path, box_size:int=Snake.BOX_SIZE):
+    """
+    Render a recorded game into a stacked frame array.
+
+    Parameters
+    ----------
+    path : Path
+        The recorded game (*.snakelog or *.json).
+    box_size : int, optional
+        Size of one cell of the board in pixels. The default is Snake.BOX_SIZE.
+
+    Returns
+    -------
+    np.ndarray
+        uint8 array of shape (frames, height, width, 3). There is one frame more than there are actions in the recording.
+        Long games need a lot of memory (about 2.8 MB per frame with the default box size). Use save_game() to write them to disk instead.
+
+    """
+    game_log = read_game_log(path)
+    width, height = game_log.header["board_size"]
+
+    frames = np.empty((len(game_log)+1, height*box_size, width*box_size, 3), dtype=np.uint8)
+    for index, frame in enumerate(iter_frames(game_log, box_size)):
+        frames[index] = frame
+    return frames
+
+
+def save_game(path:Path, out:Path, file_format:str="npy", box_size:int=Snake.BOX_SIZE, fps:int=15):
+    """
+    Render a recorded game and save it.
+
+    Parameters
+    ----------
+    path : Path
+        The recorded game (*.snakelog or *.json).
+    out : Path
+        Where to save the rendered game. A .npy file for "npy", a directory for "png" (non existing directory will be created) and a .gif
+        file for "gif".
+    file_format : str, optional
+        "npy" (stacked frame array, see render_game()), "png" (one image per frame: frame_00000.png, ...) or "gif" (animated image).
+        The default is "npy".
+    box_size : int, optional
+        Size of one cell of the board in pixels. The default is Snake.BOX_SIZE.
+    fps : int, optional
+        Frames per second of the animated GIF. The default is 15 (same as Snake.play()).
+
+    Raises
+    ------
+    ValueError
+        If the format is not supported.
+
+    Returns
+    -------
+    Path
+        Where the rendered game was saved.
+
+    """
+    if file_format not in FORMATS: raise ValueError(f"Unknown format {file_format}. Use one of {', '.join(FORMATS)}.")
+    out = Path(out)
+
+    if file_format == "npy":
+        # Write the frames directly into the file, so long games don't have to fit into memory
+        game_log = read_game_log(path)
+        width, height = game_log.header["board_size"]
+        frames = np.lib.format.open_memmap(out, mode="w+", dtype=np.uint8, shape=(len(game_log)+1, height*box_size, width*box_size, 3))
+        for index, frame in enumerate(iter_frames(game_log, box_size)):
+            frames[index] = frame
+        frames.flush()
+        del frames
+
+    elif file_format == "png":
+        out.mkdir(parents=True, exist_ok=True)
+        game_log = read_game_log(path)
+        digits = len(str(len(game_log)))
+        for index, (surface, _) in enumerate(_iter_surfaces(game_log, box_size)):
+            pygame.image.save(surface, str(out/f"frame_{index:0{digits}d}.png"))
+
+    elif file_format == "gif":
+        # Pillow is only needed for animated images
+        from PIL import Image
+        images = [ Image.fromarray(frame) for frame in render_game(path, box_size) ]
+        images[0].save(out, save_all=True, append_images=images[1:], duration=round(1000/fps), loop=0)
+
+    return out
+
+
+def _save_game(job:tuple):
+    """
+    Render and save one game. Used by render_games(). This is a module level function, so it can be send to worker processes.
+
+    Parameters
+    ----------
+    job : tuple
+        Arguments of save_game(): recorded game, output path, format, box size and frames per second.
+
+    Returns
+    -------
+    Path
+        Where the rendered game was saved.
+
+    """
+    return save_game(*job)
+
+
+def render_games(paths:list, out_directory:Path, file_format:str="npy", box_size:int=Snake.BOX_SIZE, fps:int=15, workers:int=1):
+    """
+    Render many recorded games. Every game path/NAME.snakelog is saved as out_directory/NAME.npy, out_directory/NAME/ or out_directory/NAME.gif.
+
+    Parameters
+    ----------
+    paths : list of Paths
+        The recorded games (*.snakelog or *.json). Use dataset.list_game_files() to get all games in a directory.
+    out_directory : Path
+        Directory for the rendered games. Non existing directory will be created.
+    file_format : str, optional
+        "npy", "png" or "gif" (see save_game()). The default is "npy".
+    box_size : int, optional
+        Size of one cell of the board in pixels. The default is Snake.BOX_SIZE.
+    fps : int, optional
+        Frames per second of animated GIFs. The default is 15.
+    workers : int, optional
+        Number of processes rendering games in parallel. The default is 1 (render all games in this process).
+
+    Returns
+    -------
+    list of Paths
+        Where the rendered games were saved. Same order as paths.
+
+    """
+    if not isinstance(workers, int) or workers < 1: raise ValueError("The number of workers must be a positive integer.")
+    if file_format not in FORMATS: raise ValueError(f"Unknown format {file_format}. Use one of {', '.join(FORMATS)}.")
+
+    out_directory = Path(out_directory)
+    out_directory.mkdir(parents=True, exist_ok=True)
+
+    suffix = "" if file_format == "png" else "." + file_format
+    jobs = [ (path, out_directory/(Path(path).stem + suffix), file_format, box_size, fps) for path in paths ]
+
+    saved = []
+    with tqdm(total=len(jobs), unit=" games", desc="Rendering") as progressbar:
+        if workers == 1:
+            for job in jobs:
+                saved.append(_save_game(job))
+                progressbar.update()
+        else:
+            # Spread the games over a pool of processes
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for out in executor.map(_save_game, jobs, chunksize=max(1, len(jobs)//(16*workers))):
+                    saved.append(out)
+                    progressbar.update()
+
+    return saved
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Render recorded games without a display.")
+    parser.add_argument("out", type=Path, help="directory for the rendered games")
+    parser.add_argument("games", type=Path, nargs="+", help="recorded games (*.snakelog, *.json)")
+    parser.add_argument("--format", choices=FORMATS, default="npy", help="npy (frame array), png (image sequence) or gif (animation)")
+    parser.add_argument("--box-size", type=int, default=Snake.BOX_SIZE, help="size of one cell in pixels")
+    parser.add_argument("--fps", type=int, default=15, help="frames per second of animations")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes")
+    arguments = parser.parse_args()
+
+    render_games(arguments.games, arguments.out, arguments.format, arguments.box_size, arguments.fps, arguments.workers)
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:12:36 2026
+
+@author: jonas
+
+
+This file implements a container for many recorded games. Writing one file per game (randomGame_NNNN.snakelog) makes listing, opening and
+stat'ing the files the slowest part of generating and reading training data. A container stores the games (game logs, see game_log.py) in a
+few large append-only shard files and finds them with an index, so the directory never has to be listed.
+
+Games are appended in blocks of many games. Every block can be compressed on its own (zlib), so a game can be read without decompressing
+the whole shard. Blocks are written to the shard before they are added to the index, so a crash can't leave the index pointing to missing data.
+
+Layout of a container directory:
+    container.json      version, compression and maximal shard size
+    shard_00000.bin     MAGIC + version, followed by blocks of game logs (GameLog.to_bytes()), maybe compressed
+    index.bin           one record per game (see INDEX_DTYPE), in the order the games were appended
+    names.txt           one name per game (e.g. the file name of a migrated game), same order as the index
+
+Migrate directories with one file per game:
+    python shards.py OUT DIRECTORY [DIRECTORY ...] [--compression zlib]
+
+"""
+
+# Read and write game logs
+from game_log import GameLog
+
+# Import Pathlib for reading, writing files
+from pathlib import Path
+# Store the description of the container as json
+import json
+# Compress blocks
+import zlib
+# Flush the shards to disk
+import os
+
+import numpy as np
+
+
+# Beginning of every shard file
+MAGIC = b"SNAKESHD"
+# Version of the container format. Increase it, if the layout changes.
+CONTAINER_VERSION = 1
+# Supported compressions of the blocks
+COMPRESSIONS = (None, "zlib")
+
+# One record of the index per game. The game is data[offset:offset+size] of the (decompressed) block at block_offset of the shard.
+INDEX_DTYPE = np.dtype([("shard", "<u4"), ("block_offset", "<u8"), ("block_size", "<u4"), ("offset", "<u4"), ("size", "<u4"), ("n_steps", "<u4")])
+
+
+def is_container(path:Path):
+    """
+    Check if a directory is a container written by ShardWriter.
+    """
+    return (Path(path)/"container.json").exists()
+
+
+class ShardWriter:
+    """
+    Append games to a container. Games are collected in memory and written as one block, when block_games games are collected.
+    """
+
+    def __init__(self, path:Path, compression:str="zlib", block_games:int=256, shard_bytes:int=1<<28):
+        """
+        Open a container for appending. A new container is created, if the directory doesn't contain one yet.
+
+        Parameters
+        ----------
+        path : Path
+            Directory of the container. Non existing directory will be created.
+        compression : str, optional
+            Compression of the blocks of a new container: "zlib" or None. An existing container keeps its compression. The default is "zlib".
+        block_games : int, optional
+            Number of games per block. The default is 256.
+        shard_bytes : int, optional
+            Start a new shard when the current shard is bigger than this. The default is 256 MiB.
+
+        Raises
+        ------
+        ValueError
+            If the compression is unknown or the container was written by another version.
+
+        Returns
+        -------
+        Instance of the ShardWriter class.
+
+        """
+        if compression not in COMPRESSIONS: raise ValueError(f"Unknown compression {compression}. Use one of {COMPRESSIONS}.")
+        if not isinstance(block_games, int) or block_games < 1: raise ValueError("block_games must be a positive integer.")
+        if not isinstance(shard_bytes, int) or shard_bytes < 1: raise ValueError("shard_bytes must be a positive integer.")
+
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.block_games = block_games
+
+        if is_container(self.path):
+            self.meta = _read_meta(self.path)
+        else:
+            self.meta = {"version": CONTAINER_VERSION, "compression": compression, "shard_bytes": shard_bytes}
+            (self.path/"container.json").write_text(json.dumps(self.meta) + "\n")
+            (self.path/"index.bin").touch()
+            (self.path/"names.txt").touch()
+
+        # Continue with the last shard. Data after the last indexed block (left by a crash) is overwritten.
+        index = _read_index(self.path)
+        os.truncate(self.path/"index.bin", index.nbytes)
+        self.n_games = len(index)
+        if len(index) > 0:
+            self._shard = int(index["shard"][-1])
+            self._shard_size = int(index["block_offset"][-1] + index["block_size"][-1])
+        else:
+            self._shard, self._shard_size = 0, 0
+        self._open_shard()
+
+        # A crash between writing the index and the names can leave fewer names than games
+        names = (self.path/"names.txt").read_text().split("\n")[:-1]
+        if len(names) != self.n_games:
+            names = (names + [""]*self.n_games)[:self.n_games]
+            (self.path/"names.txt").write_text("".join( name + "\n" for name in names ))
+
+        self._index_file = open(self.path/"index.bin", "ab")
+        self._names_file = open(self.path/"names.txt", "a")
+        # Serialised games and their names that are not written yet
+        self._pending = []
+
+    def _open_shard(self):
+        """
+        Open the current shard for writing and write the beginning of a new shard.
+        """
+        shard_path = self.path/f"shard_{self._shard:05d}.bin"
+        if self._shard_size == 0:
+            self._shard_file = open(shard_path, "wb")
+            self._shard_file.write(MAGIC + bytes([CONTAINER_VERSION]))
+            self._shard_size = len(MAGIC) + 1
+        else:
+            self._shard_file = open(shard_path, "r+b")
+            self._shard_file.truncate(self._shard_size)
+            self._shard_file.seek(self._shard_size)
+
+    def append(self, game_log:GameLog, name:str=""):
+        """
+        Append a game to the container. The game is written, when the block is full or the writer is closed.
+
+        Parameters
+        ----------
+        game_log : GameLog or bytes
+            The game. Bytes must be the output of GameLog.to_bytes().
+        name : str, optional
+            Name of the game, e.g. the name of the file it was read from. Must not contain line breaks. The default is "".
+
+        Returns
+        -------
+        None.
+
+        """
+        if "\n" in name: raise ValueError("The name of a game must not contain line breaks.")
+        if isinstance(game_log, GameLog):
+            data, n_steps = game_log.to_bytes(), len(game_log)
+        else:
+            data, n_steps = bytes(game_log), len(GameLog.from_bytes(game_log))
+        self._pending.append((data, n_steps, name))
+        if len(self._pending) >= self.block_games: self.flush()
+
+    def flush(self):
+        """
+        Write the collected games as one block and add them to the index.
+        """
+        if not self._pending: return
+
+        # Start a new shard, if the current one is full
+        if self._shard_size >= self.meta["shard_bytes"]:
+            self._shard_file.close()
+            self._shard, self._shard_size = self._shard + 1, 0
+            self._open_shard()
+
+        block = b"".join( data for data, _, _ in self._pending )
+        if self.meta["compression"] == "zlib": block = zlib.compress(block)
+
+        records = np.zeros(len(self._pending), dtype=INDEX_DTYPE)
+        records["shard"] = self._shard
+        records["block_offset"] = self._shard_size
+        records["block_size"] = len(block)
+        sizes = [ len(data) for data, _, _ in self._pending ]
+        records["offset"] = np.concatenate([ [0], np.cumsum(sizes)[:-1] ])
+        records["size"] = sizes
+        records["n_steps"] = [ n_steps for _, n_steps, _ in self._pending ]
+
+        # Write the data before the index, so the index never points to missing data
+        self._shard_file.write(block)
+        self._shard_file.flush()
+        self._shard_size += len(block)
+        self._index_file.write(records.tobytes())
+        self._index_file.flush()
+        self._names_file.write("".join( name + "\n" for _, _, name in self._pending ))
+        self._names_file.flush()
+
+        self.n_games += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        """
+        Write the remaining games and flush the container to disk.
+        """
+        self.flush()
+        for file in (self._shard_file, self._index_file, self._names_file):
+            os.fsync(file.fileno())
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+#
+#
+#   END OF CLASS SHARDWRITER
+#
+#
+
+
+class ShardedGames:
+    """
+    Read-only access to the games of a container. Opening a container only reads the index.
+    """
+
+    def __init__(self, path:Path):
+        """
+        Open a container.
+
+        Parameters
+        ----------
+        path : Path
+            Directory of the container.
+
+        Raises
+        ------
+        ValueError
+            If the directory is not a container or the container was written by another version.
+
+        Returns
+        -------
+        Instance of the ShardedGames class.
+
+        """
+        self.path = Path(path)
+        if not is_container(self.path): raise ValueError(f"{self.path} is not a container. Use ShardWriter or migrate() to create it.")
+        self.meta = _read_meta(self.path)
+        self.index = _read_index(self.path)
+        # Names of games that are not in the index (crash) are ignored
+        self.names = (self.path/"names.txt").read_text().split("\n")[:len(self.index)]
+        self.names += [""]*(len(self.index) - len(self.names))
+
+        # Opened shard files and the last decompressed block (shard, block_offset, data)
+        self._shard_files = {}
+        self._block = (None, None, b"")
+
+    def __len__(self):
+        """
+        Number of games in the container.
+        """
+        return len(self.index)
+
+    @property
+    def n_states(self):
+        """
+        Number of game states of all games (one per step).
+        """
+        return int(self.index["n_steps"].sum())
+
+    def _read_block(self, shard:int, block_offset:int, block_size:int):
+        """
+        Read and decompress a block. The last block is kept in memory, so reading the games of a block one after another reads it only once.
+        """
+        if self._block[:2] == (shard, block_offset): return self._block[2]
+
+        if shard not in self._shard_files:
+            self._shard_files[shard] = open(self.path/f"shard_{shard:05d}.bin", "rb")
+        file = self._shard_files[shard]
+        file.seek(block_offset)
+        data = file.read(block_size)
+        if self.meta["compression"] == "zlib": data = zlib.decompress(data)
+
+        self._block = (shard, block_offset, data)
+        return data
+
+    def __getitem__(self, index:int):
+        """
+        Get one game.
+
+        Returns
+        -------
+        GameLog
+            The game.
+
+        """
+        record = self.index[index]
+        block = self._read_block(int(record["shard"]), int(record["block_offset"]), int(record["block_size"]))
+        return GameLog.from_bytes(block[record["offset"]:record["offset"]+record["size"]])
+
+    def __iter__(self):
+        """
+        Iterate over all games in the order they were appended. Every block is read once.
+        """
+        return ( self[index] for index in range(len(self)) )
+
+    def game_states(self, index:int):
+        """
+        Get the game states of one game (see game_log.GameLog.replay()).
+        """
+        return list(self[index].replay())
+
+    def close(self):
+        """
+        Close the shard files.
+        """
+        for file in self._shard_files.values():
+            file.close()
+        self._shard_files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+#
+#
+#   END OF CLASS SHARDEDGAMES
+#
+#
+
+
+def _read_meta(path:Path):
+    """
+    Read the description of a container and check its version.
+    """
+    meta = json.loads((Path(path)/"container.json").read_text())
+    if meta["version"] != CONTAINER_VERSION:
+        raise ValueError(f"The container {path} has version {meta['version']}, but version {CONTAINER_VERSION} is needed.")
+    return meta
+
+
+def _read_index(path:Path):
+    """
+    Read the index of a container. An incomplete record at the end (crash while writing) is ignored.
+    """
+    data = (Path(path)/"index.bin").read_bytes()
+    return np.frombuffer(data, dtype=INDEX_DTYPE, count=len(data)//INDEX_DTYPE.itemsize)
+
+
+def migrate(directories:list, out:Path, compression:str="zlib", block_games:int=256, verify:bool=True):
+    """
+    Copy all recorded games (*.json, *.snakelog) of some directories into a container. Games in the json format are converted into game logs.
+    The original files are not changed.
+
+    Parameters
+    ----------
+    directories : list of Paths
+        Directories with one file per game.
+    out : Path
+        Directory of the container. Games are appended, if it already contains a container.
+    compression : str, optional
+        Compression of the blocks, "zlib" or None. The default is "zlib".
+    block_games : int, optional
+        Number of games per block. The default is 256.
+    verify : bool, optional
+        Replay every converted json game and compare it with the json file. The default is True.
+
+    Raises
+    ------
+    ValueError
+        If verify is True and the replay of a game differs from the recorded game states.
+
+    Returns
+    -------
+    int
+        Number of migrated games.
+
+    """
+    # Imported here, because dataset imports this module
+    from dataset import list_game_files
+    from game_log import read_game_states
+
+    files = list_game_files(directories)
+    with ShardWriter(out, compression, block_games) as writer:
+        for file in files:
+            if file.suffix == ".snakelog":
+                game_log = GameLog.read(file)
+            else:
+                gameStates = read_game_states(file)
+                game_log = GameLog.from_states(gameStates)
+                if verify and list(game_log.replay()) != gameStates:
+                    raise ValueError(f"The replay of {file} doesn't match the recorded game states.")
+            writer.append(game_log, name=f"{file.parent.name}/{file.name}")
+    return len(files)
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Migrate directories with one file per recorded game into a sharded container.")
+    parser.add_argument("out", type=Path, help="directory of the container")
+    parser.add_argument("directories", type=Path, nargs="+", help="directories with recorded games (*.json, *.snakelog)")
+    parser.add_argument("--compression", choices=["zlib", "none"], default="zlib", help="compression of the blocks (default zlib)")
+    parser.add_argument("--block-games", type=int, default=256, help="games per block (default 256)")
+    parser.add_argument("--no-verify", action="store_true", help="don't compare converted json games with the original files")
+    arguments = parser.parse_args()
+
+    n_games = migrate(arguments.directories, arguments.out, None if arguments.compression == "none" else arguments.compression,
+                      arguments.block_games, not arguments.no_verify)
+    games = ShardedGames(arguments.out)
+    print(f"Migrated {n_games} games. The container holds {len(games)} games with {games.n_states} game states.")
@@ -9,12 +9,56 @@ Created on Mon Jun 21 22:46:06 2021
 # Used for coordinates
 import numpy as np
 # Used to generate random coordinates
-from random import randint
+from random import Random
+# Used to store the cells occupied by the snake's body
+from collections import deque
+# Snapshots of the game state (see Snake.snapshot())
+from typing import NamedTuple
+# Timers and counters of the hot code paths
+from time import perf_counter
+from instrumentation import STATS
 
 # Import game engine pygame
-import pygame
-import pygame.locals    
-    
+# pygame is imported when the game is drawn for the first time (see _load_pygame()). Headless code (training, worker processes) only needs numpy.
+pygame = None
+
+
+def _load_pygame():
+    """
+    Import pygame on first use.
+
+    Returns
+    -------
+    module
+        pygame.
+
+    """
+    global pygame
+    if pygame is None:
+        import pygame.locals
+    return pygame
+
+
+def _timing_percentiles(seconds:list):
+    """
+    Summarize measured times (e.g. the frame times of Snake.play()).
+
+    Parameters
+    ----------
+    seconds : list or deque
+        Measured times in seconds.
+
+    Returns
+    -------
+    dict
+        count and the p50, p95, p99 and max in milliseconds (nan, if nothing was measured).
+
+    """
+    if len(seconds) == 0:
+        return {"count": 0, "p50": float("nan"), "p95": float("nan"), "p99": float("nan"), "max": float("nan")}
+    p50, p95, p99, maximum = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99, 100])
+    return {"count": len(seconds), "p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(maximum)}
+
 
 # Create macros to make controlling the snake with absolute directions easier
 # Do not change these values. They are important for converting between relative and absolute directions
@@ -26,6 +70,22 @@ LEFT, FORWARD, RIGHT = -1, 0, 1
 FLOOR, SNAKE, APPLE = 0, 1, 2
 
 
+class SnakeState(NamedTuple):
+    """
+    State of a game saved by Snake.snapshot().
+    """
+    body_cells: tuple
+    # Copy of Snake._state_buffer: the occupancy grid, the free cells and the index of free cells
+    state_buffer: bytes
+    free_cell_count: int
+    # The apple array is shared with the game. The game replaces the array when an apple spawns, it never changes it in place.
+    position_apple: np.ndarray
+    score: int
+    step_counter: int
+    snake_dead: bool
+    random_state: tuple
+
+
 class Snake:
     """
     TODO: DOCSTRING
@@ -45,11 +105,15 @@ class Snake:
     APPLE_MARGIN = 4
     APPLE_BORDER_RADIUS = 2
     
-    def __init__(self, board_width:int=32, board_height:int=18, box_size:int=BOX_SIZE, initial_length:int=3, max_score_per_apple:int=50, min_score_per_apple:int=10, max_step_to_apple:int=20):
+    def __init__(self, board_width:int=32, board_height:int=18, box_size:int=BOX_SIZE, initial_length:int=3, max_score_per_apple:int=50, min_score_per_apple:int=10, max_step_to_apple:int=20, seed:int=None):
         #
         #   TODO: DOCSTRING, Initialise game score
         #
         
+        # Random number generator of this game. Used to spawn the apples. Every game has its own generator, so games can be reproduced with the seed.
+        # It is stored in self._generator and used through the property self._random (see there).
+        self._random = Random(seed)
+        
         #   SET BOARD SIZE
         # 
         # Check the requested size of the board
@@ -69,13 +133,31 @@ class Snake:
         # Set the initial size and position of the snake
         # The snake may not be shorter than 2. If it's to short, moving with relative directions doesn't work anymore.
         if not isinstance(initial_length, int) or not initial_length >= 2: raise ValueError("The snake must have a length of at least 1 (only integer values allowed).")
-        # Initialise position and length of the snake
-        # The snake head will be placed in the middle of the first row. The body will be placed of screen.
-        # Position of the body of the snake. List of tupels. Every np.array ist one point on the board. The first element is the head. The last element is the tail.
-        self.position_snake_body = [ np.array([self._get_max_x()//2, i]) for i in range(0, -initial_length, -1) ]
         # Save the initial length of the snake. Used when generating trainging data for neural networks.
         self.initial_length = initial_length
         
+        # The body of the snake is stored as integer cell indices on a padded grid. The padding is needed, because the body of the snake starts off screen
+        # and the head leaves the board when the snake runs into a wall. The padding adds one column left and right of the board, one row below the board
+        # and initial_length rows above the board.
+        self._GRID_STRIDE = board_width + 2
+        self._GRID_OFFSET_Y = initial_length
+        # Occupancy grid. Every cell of the padded grid that is covered by the snake is True. Used for O(1) collision detection.
+        self._allocate_state_buffer()
+        # Initialise position and length of the snake
+        # The snake head will be placed in the middle of the first row. The body will be placed of screen.
+        # Cell indices of the body of the snake. The first element is the head. The last element is the tail.
+        self._body_cells = deque()
+        for i in range(0, -initial_length, -1):
+            cell = self._position_to_cell(self._get_max_x()//2, i)
+            self._body_cells.append(cell)
+            self._occupancy_grid[cell] = True
+        
+        # Mask of all cells of the padded grid that are part of the game board
+        self._BOARD_MASK = np.zeros(self._occupancy_grid.shape, dtype=bool)
+        self._BOARD_MASK.reshape(-1, self._GRID_STRIDE)[self._GRID_OFFSET_Y:self._GRID_OFFSET_Y+board_height, 1:board_width+1] = True
+        # Index of all free cells on the board. Used to spawn the apple in O(1).
+        self._rebuild_free_cells()
+        
         #   PLACE THE FIRST APPLE
         self._spawn_apple()
         
@@ -104,6 +186,11 @@ class Snake:
         # Step counter. Integer keeping track of how many steps the player needed to get the apple. Used for score computation
         self.step_counter = 0
         
+        # State of the game when it was drawn the last time. Used by draw_incremental() to find the cells that changed. None forces a full redraw.
+        self._drawn_state = None
+        # States saved by push_state(). Used for depth-first search (see push_state() and pop_state()).
+        self._undo_stack = []
+        
     def _get_max_x(self):
         """
         This function returns the x-coordinate of the point with the biggest x-coordinate on the game board.
@@ -128,6 +215,223 @@ class Snake:
         """
         return self.BOARD_SIZE[1]-1
     
+    def _get_game_settings(self):
+        """
+        Get the arguments of Snake.__init__() that were used to create this game (without the seed). Used to start new games with the same settings.
+
+        Returns
+        -------
+        dict
+            Keyword arguments for Snake.__init__().
+
+        """
+        return {"board_width": self.BOARD_SIZE[0], "board_height": self.BOARD_SIZE[1], "box_size": self.BOX_SIZE,
+                "initial_length": self.initial_length, "max_score_per_apple": self.MAXIMAL_SCORE_PER_APPLE,
+                "min_score_per_apple": self.MINIMAL_SCORE_PER_APPLE, "max_step_to_apple": self.MAXIMAL_STEP_COUNT}
+    
+    def _position_to_cell(self, x:int, y:int):
+        """
+        Convert a position on the game board into the index of a cell on the padded occupancy grid.
+
+        Parameters
+        ----------
+        x : int
+            x-coordinate of the position. Must be between -1 and the board width.
+        y : int
+            y-coordinate of the position. Must be between -initial_length and the board height.
+
+        Returns
+        -------
+        int
+            Index of the cell in self._occupancy_grid.
+
+        """
+        return (y + self._GRID_OFFSET_Y) * self._GRID_STRIDE + (x + 1)
+    
+    def _cell_to_position(self, cell:int):
+        """
+        Convert the index of a cell on the padded occupancy grid into a position on the game board. Inverse of self._position_to_cell().
+
+        Parameters
+        ----------
+        cell : int
+            Index of the cell in self._occupancy_grid.
+
+        Returns
+        -------
+        np.ndarray
+            Position on the game board.
+
+        """
+        y, x = divmod(cell, self._GRID_STRIDE)
+        return np.array([x - 1, y - self._GRID_OFFSET_Y])
+    
+    def _allocate_state_buffer(self):
+        """
+        Allocate the arrays of the game state that change with every move: the occupancy grid, the free cells and the index of free cells
+        (see _rebuild_free_cells()). They are views of one contiguous buffer, so snapshot() copies them with one call of bytes() and restore()
+        writes them back with one copy.
+
+        Returns
+        -------
+        None.
+
+        """
+        grid_size = self._GRID_STRIDE * (self.BOARD_SIZE[1] + self._GRID_OFFSET_Y + 1)
+        board_size = self.BOARD_SIZE[0] * self.BOARD_SIZE[1]
+        # The grid is padded to a multiple of 4 bytes, so the int32 arrays behind it are aligned
+        grid_bytes = -(-grid_size // 4) * 4
+        # Ends of the grid and the free cells in the buffer (see _create_state_views())
+        self._STATE_LAYOUT = (grid_size, grid_bytes, grid_bytes + 4*board_size)
+        self._state_buffer = np.zeros(grid_bytes + 4*board_size + 4*grid_size, dtype=np.uint8)
+        self._create_state_views()
+    
+    def _create_state_views(self):
+        """
+        Create the views of the occupancy grid, the free cells and the index of free cells into self._state_buffer (see _allocate_state_buffer()).
+
+        Returns
+        -------
+        None.
+
+        """
+        grid_size, grid_end, free_cells_end = self._STATE_LAYOUT
+        buffer = self._state_buffer
+        self._occupancy_grid = buffer[:grid_size].view(bool)
+        self._free_cells = buffer[grid_end:free_cells_end].view(np.int32)
+        self._free_cell_index = buffer[free_cells_end:].view(np.int32)
+        # Writing into a memoryview is the cheapest way to copy a snapshot back into the buffer
+        self._state_view = memoryview(buffer)
+    
+    @property
+    def _random(self):
+        """
+        Random number generator of the game. Any use of the generator changes its state, so every access drops the cached state of the
+        generator (see snapshot()). That includes uses outside of the game, e.g. choosing random actions with game._random.choice().
+        Don't keep a reference to the generator: uses through the reference are not noticed.
+        
+        A clone (see clone()) or a restored game (see restore()) creates its generator from the saved state on first use.
+        """
+        generator = self._generator
+        if generator is None:
+            # Seeding a new generator is slow. Create it empty and set the saved state.
+            generator = self._generator = Random.__new__(Random)
+            generator.setstate(self._random_state)
+        self._random_state = None
+        return generator
+
+    @_random.setter
+    def _random(self, generator:Random):
+        self._generator = generator
+        # Cached state of the random number generator (see snapshot()). None if the generator was used since the state was read.
+        self._random_state = None
+    
+    def __getstate__(self):
+        """
+        Pickle (and copy.deepcopy()) the game without the views of self._state_buffer. __setstate__() creates them again, so the copy doesn't
+        end up with arrays that are no longer part of its buffer.
+        """
+        state = self.__dict__.copy()
+        for name in ("_occupancy_grid", "_free_cells", "_free_cell_index", "_state_view"): del state[name]
+        return state
+
+    def __setstate__(self, state:dict):
+        """
+        Restore a pickled game (see __getstate__()).
+        """
+        self.__dict__.update(state)
+        self._create_state_views()
+    
+    def _rebuild_free_cells(self):
+        """
+        Rebuild the index of free cells from the occupancy grid. The index is a swap-remove array: self._free_cells[:self._free_cell_count] holds
+        the cell indices of all cells on the board that are not occupied by the snake and self._free_cell_index maps every cell to its position in
+        self._free_cells (-1 if the cell is not free).
+
+        Returns
+        -------
+        None.
+
+        """
+        # The arrays are overwritten in place. They are views of self._state_buffer (see _allocate_state_buffer()).
+        free_cells = np.flatnonzero(self._BOARD_MASK & ~self._occupancy_grid)
+        self._free_cells[:len(free_cells)] = free_cells
+        self._free_cell_count = len(free_cells)
+        self._free_cell_index[:] = -1
+        self._free_cell_index[free_cells] = np.arange(len(free_cells))
+    
+    def _occupy_cell(self, cell:int):
+        """
+        Mark a cell as occupied by the snake and remove it from the index of free cells in O(1).
+
+        Parameters
+        ----------
+        cell : int
+            Index of the cell in self._occupancy_grid.
+
+        Returns
+        -------
+        None.
+
+        """
+        self._occupancy_grid[cell] = True
+        index = self._free_cell_index[cell]
+        # Cells outside of the board and cells that are already occupied are not part of the index
+        if index >= 0:
+            # Move the last free cell into the gap and shrink the array by one
+            self._free_cell_count -= 1
+            last_cell = self._free_cells[self._free_cell_count]
+            self._free_cells[index] = last_cell
+            self._free_cell_index[last_cell] = index
+            self._free_cell_index[cell] = -1
+    
+    def _release_cell(self, cell:int):
+        """
+        Mark a cell as not occupied by the snake and add it to the index of free cells in O(1).
+
+        Parameters
+        ----------
+        cell : int
+            Index of the cell in self._occupancy_grid.
+
+        Returns
+        -------
+        None.
+
+        """
+        self._occupancy_grid[cell] = False
+        # Only cells on the board can hold an apple
+        if self._BOARD_MASK[cell] and self._free_cell_index[cell] < 0:
+            self._free_cells[self._free_cell_count] = cell
+            self._free_cell_index[cell] = self._free_cell_count
+            self._free_cell_count += 1
+    
+    @property
+    def position_snake_body(self):
+        """
+        Read-only view of the position of the body of the snake. Every np.array is one point on the board. The first element is the head. The last element is the tail.
+        The list is rebuild from self._body_cells on every access. Changing the list will not change the snake.
+
+        Returns
+        -------
+        list of np.ndarrays
+            Positions of the snake's body.
+
+        """
+        return [ self._cell_to_position(cell) for cell in self._body_cells ]
+    
+    def _get_current_direction(self):
+        """
+        Get the direction the snake is currently moving in by subtracting the position of the second element of the snake's body from the head.
+
+        Returns
+        -------
+        np.ndarray
+            Absolute direction the snake is facing (NORTH, EAST, SOUTH or WEST).
+
+        """
+        return self._cell_to_position(self._body_cells[0]) - self._cell_to_position(self._body_cells[1])
+    
     def _is_array_in_list(self, array:np.ndarray, array_list:list):
         """
         Check if a np.ndarray is part of a list of np.ndarrays.
@@ -150,26 +454,24 @@ class Snake:
     def _spawn_apple(self):
         """
         This function will position the apple at a random position on the game board. Positions occupied by the snakes body will be avoided.
+        The apple is drawn uniformly from the index of free cells, so spawning costs O(1) no matter how full the board is.
+        If there is no free cell left, the board is full and the game is over.
 
         Returns
         -------
         None.
 
         """
-        # Generate random positions on the game board until one is found, that is not occupied by the snake
-        while True:
-            # Generate a random position on the game board
-            new_position_x = randint(0, self._get_max_x())
-            new_position_y = randint(0, self._get_max_y())
-            # Convert random position to numpy array
-            new_position = np.array([new_position_x, new_position_y])
-            
-            # Check if the random position is part of the list position_snake_body (all positions occupied by the snake). If it is not, break the loop.
-            if not self._is_array_in_list(new_position, self.position_snake_body):
-                break
+        # The snake covers the whole board. There is no place left for the apple.
+        if self._free_cell_count == 0:
+            self._snake_dead = True
+            return
+        
+        # Pick a random free cell
+        new_cell = self._free_cells[self._random.randint(0, self._free_cell_count-1)]
         
         # Overwrite the current position of the apple with the new position
-        self.position_apple = new_position        
+        self.position_apple = self._cell_to_position(int(new_cell))
     
     def _update_score(self):
         """
@@ -210,6 +512,10 @@ class Snake:
             DESCRIPTION.
 
         """
+        # Time the phases of this step (see instrumentation.py). Costs one check, if the instrumentation is off.
+        timing = STATS.enabled and STATS.sample("Snake.move")
+        if timing: phase_start = perf_counter()
+        
         # >>>> CHECK IF INPUT IS A VALID DIRECTION
         #
         # Check if the parameter direction is a valid relative direction. Valid relative directions are the integerss LEFT, FORWARD and RIGHT (defined above the class Snake.)
@@ -222,13 +528,14 @@ class Snake:
         # CHECK IF ABSOLUTE DIRECTION POINTS AGAINST CURRENT MOVING DIRECTION
         #
         # Get current direction by subtraction the second and the first element of the snake body.
-        current_direction = self.position_snake_body[0]-self.position_snake_body[1]
+        current_direction = self._get_current_direction()
         # Is the passed direction an absolute direction?
         if isinstance(direction, np.ndarray) or self._is_array_in_list(direction, [NORTH, EAST, SOUTH, WEST]):
             # Is the passed direction opposite to the current direction? If so ignore the user input and move the snake one step FORWARD.
             if (direction==-1*current_direction).all() == True: direction = FORWARD
         #    
         # <<<< CHECK INPUT
+        if timing: phase_start = STATS.lap("validation", phase_start)
         
         #   IS THE GAME OVER?
         #
@@ -256,6 +563,7 @@ class Snake:
         elif not isinstance(direction, np.ndarray) or not self._is_array_in_list(direction, [NORTH, EAST, SOUTH, WEST]):
             # Parameter direction is neither relative nor absolute direction. Raise ValueError
             raise ValueError("Wrong value passed for parameter 'direction'. Snake.Snake.move() expects the directions Snake.NORTH, Snake.EAST, Snake.SOUTH and Snake.WEST or Snake.LEFT, Snake.FORWARD and Snake.RIGHT.")
+        if timing: phase_start = STATS.lap("direction", phase_start)
 
         # 2. MOVE THE SNAKE AND DETECT APPLE
         #
@@ -263,45 +571,165 @@ class Snake:
         self.step_counter += 1
         
         # Compute the future position of the snakes head
-        future_snake_head_position = self.position_snake_body[0] + direction
-        # Add a new element at the beginning of the list for the new position of the snakes head
-        self.position_snake_body.insert(0, future_snake_head_position)
+        future_snake_head_position = self._cell_to_position(self._body_cells[0]) + direction
+        head_x, head_y = int(future_snake_head_position[0]), int(future_snake_head_position[1])
         
         # Check if the snake has reached the apple
         collision_with_apple = (future_snake_head_position == self.position_apple).all()
         
-        if collision_with_apple == True:
-            # Spawn a new apple if the snake has reached the apple
-            # Do not delete the tail of the snake. The snake will become longe because of that
-            self._spawn_apple()
-            self._update_score()
-        else:
-            # Delete the tail of the snake if the apple was not reached. This will make the snake move and keep their length, because the head of the snake was already moved.
-            del self.position_snake_body[-1]
+        if collision_with_apple == False:
+            # Delete the tail of the snake if the apple was not reached. This will make the snake move and keep their length.
+            # The tail is deleted before the head is placed, so the snake is allowed to move into the cell its tail just left.
+            self._release_cell(self._body_cells.pop())
         #
         # <<<< MOVE SNAKE AND DETECT APPLE
+        if timing: phase_start = STATS.lap("movement", phase_start)
             
         # >>>> COLLISION DETECTION WALL AND SNAKE
         #
         # Check if the snake is hitting the wall or itself and update self._snake_dead
-        # Get the position of the snakes head
-        snake_head = self.position_snake_body[0]
         # COLLISION WIHT WALL: Check if head of snake is outside of the board game.
-        if (snake_head >= np.array(self.BOARD_SIZE) ).any() or ( snake_head < np.zeros(2) ).any() == True:
+        if not ( 0 <= head_x < self.BOARD_SIZE[0] and 0 <= head_y < self.BOARD_SIZE[1] ):
             self._snake_dead = True
-        # COLLISION WIHT SNAKE: Check if the head of the snake matches the position of any other part of the snake.
-        elif self._is_array_in_list(snake_head, self.position_snake_body[1:]) == True:
+        # COLLISION WIHT SNAKE: Check if the head of the snake matches the position of any other part of the snake. The occupancy grid makes this O(1).
+        elif self._occupancy_grid[self._position_to_cell(head_x, head_y)] == True:
             self._snake_dead = True
         #
         # <<<< COLLISTION DETECTION
         
+        # Add the new position of the snakes head at the beginning of the body
+        # The head is added even if it is outside of the board, so the position of the dead snake can still be drawn.
+        head_cell = self._position_to_cell(head_x, head_y)
+        self._body_cells.appendleft(head_cell)
+        self._occupy_cell(head_cell)
+        if timing: phase_start = STATS.lap("collision", phase_start)
+        
+        if collision_with_apple == True:
+            # Spawn a new apple if the snake has reached the apple
+            # The tail of the snake was not deleted. The snake will become longe because of that
+            self._spawn_apple()
+            self._update_score()
+            if timing: STATS.lap("spawning", phase_start)
+        
+        if STATS.enabled:
+            STATS.count("moves")
+            if collision_with_apple: STATS.count("apples")
+            if self._snake_dead: STATS.count("deaths")
+        
         # Return the status of the snake: True=GameOver, False=Snake is alive and well.
         return self._snake_dead
-    
+
+    #
+    #   >>> SNAPSHOTS
+    #
+    def snapshot(self):
+        """
+        Save the state of the game, e.g. to try some moves and go back (lookahead search). The state has a fixed size: one bytes copy of the
+        occupancy grid and the index of free cells (see _allocate_state_buffer()), the body as tuple of cell indices, the apple, score, step
+        counter and the state of the random number generator. The order of the free cells can't be recomputed from the body, so it is saved:
+        together with the state of the random number generator it makes sure the restored game spawns the same apples.
+        Reading the state of the generator is the expensive part, so it is only read again after the generator was used (see _random).
+
+        Returns
+        -------
+        SnakeState
+            The state of the game. Only pass it to restore() of the same game or of a clone.
+
+        """
+        # The generator exists, if there is no cached state (see _random)
+        if self._random_state is None: self._random_state = self._generator.getstate()
+        # tuple.__new__() skips the argument handling of the NamedTuple constructor, which costs more than copying the arrays
+        return tuple.__new__(SnakeState, (tuple(self._body_cells), self._state_buffer.tobytes(), self._free_cell_count, self.position_apple,
+                                          self.score, self.step_counter, self._snake_dead, self._random_state))
+
+    def restore(self, state:"SnakeState"):
+        """
+        Go back to a state saved with snapshot(). Overwrites the arrays of the game in place with one copy, no new arrays are allocated.
+
+        Parameters
+        ----------
+        state : SnakeState
+            Output of snapshot().
+
+        Returns
+        -------
+        None.
+
+        """
+        self._body_cells.clear()
+        self._body_cells.extend(state.body_cells)
+        self._state_view[:] = state.state_buffer
+        self._free_cell_count = state.free_cell_count
+        self.position_apple = state.position_apple
+        self.score, self.step_counter, self._snake_dead = state.score, state.step_counter, state.snake_dead
+        # The generator only has to be reset, if it was used since the snapshot. It gets the saved state on its next use (see _random).
+        if state.random_state is not self._random_state:
+            self._generator, self._random_state = None, state.random_state
+        # The cells that changed since the last frame are unknown
+        self._drawn_state = None
+
+    def push_state(self):
+        """
+        Save the state of the game on the undo stack. Use it with pop_state() for a depth-first search:
+            game.push_state()
+            game.move(action)
+            ... search deeper ...
+            game.pop_state()
+
+        Returns
+        -------
+        None.
+
+        """
+        self._undo_stack.append(self.snapshot())
+
+    def pop_state(self):
+        """
+        Go back to the state saved by the last call of push_state().
+
+        Raises
+        ------
+        IndexError
+            If the undo stack is empty.
+
+        Returns
+        -------
+        None.
+
+        """
+        if not self._undo_stack: raise IndexError("The undo stack is empty. Call push_state() first.")
+        self.restore(self._undo_stack.pop())
+
+    def clone(self):
+        """
+        Create an independent copy of the game. Cheaper than copy.deepcopy(): only the state of the game is copied, constants like the board mask
+        are shared. The clone spawns the same apples as the original, if both get the same moves.
+
+        Returns
+        -------
+        Snake
+            The copy. It has the same class as this game and an empty undo stack.
+
+        """
+        # Read the state of the generator, so the clone can create its own generator from it on first use (see _random)
+        if self._random_state is None: self._random_state = self._generator.getstate()
+        # Shallow copy without calling __init__(). The mutable state is copied below, subclasses copy their own mutable state.
+        game = self.__class__.__new__(self.__class__)
+        game.__dict__.update(self.__dict__)
+        game._body_cells = self._body_cells.copy()
+        game._state_buffer = self._state_buffer.copy()
+        game._create_state_views()
+        game._generator = None
+        game._undo_stack = []
+        # The cells that changed since the last frame are unknown
+        game._drawn_state = None
+        return game
+
     def draw(self, SURFACE, origin:tuple=(0,0)):
         """
         Draw the current state of the game in a pygame window. SURFACE must be a pygame display.
         """
+        _load_pygame()
         
         # Clear the screen
         background = pygame.Rect( origin, tuple([length*self.BOX_SIZE for length in self.BOARD_SIZE])  )
@@ -314,8 +742,11 @@ class Snake:
         apple = pygame.Rect(position_apple, (self.BOX_SIZE-2*self.APPLE_MARGIN, self.BOX_SIZE-2*self.APPLE_MARGIN))
         pygame.draw.rect(SURFACE, self.APPLE_COLOR, apple, border_radius=self.APPLE_BORDER_RADIUS)
         
+        # Get the positions of the snake's body once. The list is rebuild every time position_snake_body is accessed.
+        position_snake_body = self.position_snake_body
+        
         # Draw the snake
-        for snake_element in self.position_snake_body:
+        for snake_element in position_snake_body:
             # Ignore all elements that are outside if the game board (the head is outside, when the snake's dead)
             if ( snake_element >= np.zeros(2) ).all() and ( snake_element < np.array(self.BOARD_SIZE) ).all():
                 position_snake = tuple(snake_element*self.BOX_SIZE+self.SNAKE_MARGIN) + np.array(origin)
@@ -323,7 +754,7 @@ class Snake:
                 pygame.draw.rect(SURFACE, self.SNAKE_COLOR, snake, border_radius=self.SNAKE_BORDER_RADIUS)
         
         # So far the body of the snake is a bunch of unconnected boxes. This loop connects them together by drawing new boxes between the segments of the snake.
-        for snake_current, snake_next in zip(self.position_snake_body[:-1], self.position_snake_body[1:]):
+        for snake_current, snake_next in zip(position_snake_body[:-1], position_snake_body[1:]):
             # Ignore all elements that are outside if the game board (the head is outside, when the snake's dead)
             if ( snake_current >= np.zeros(2) ).all() and ( snake_current < np.array(self.BOARD_SIZE) ).all():
                 direction_snake_tail = (snake_next-snake_current)
@@ -333,50 +764,196 @@ class Snake:
         #
         # <<<< RENDER SNAKE AND APPLE
         
-    def play(self, fps:int=15):
+        # Remember what was drawn, so draw_incremental() can continue from here
+        self._remember_drawn_state(SURFACE, origin)
+    
+    def _remember_drawn_state(self, SURFACE, origin:tuple):
+        """
+        Save the parts of the game state that draw_incremental() needs to find the cells that changed: the surface, the origin, the head,
+        the last two segments of the tail, the length of the snake and the apple.
+        """
+        self._drawn_state = (id(SURFACE), tuple(origin), self._body_cells[0], self._body_cells[-1], self._body_cells[-2],
+                             len(self._body_cells), tuple(self.position_apple.tolist()))
+    
+    def _draw_cell(self, SURFACE, origin:tuple, cell:int, neighbours:list=None):
+        """
+        Repaint one cell of the board with the same colors and geometry as draw(): background, apple, snake box and the connectors to the
+        given neighbouring body segments. Cells outside of the board are ignored.
+
+        Parameters
+        ----------
+        SURFACE : pygame.Surface
+            Where to draw.
+        origin : tuple
+            Pixel position of the top left corner of the board.
+        cell : int
+            Index of the cell (see self._position_to_cell()).
+        neighbours : list of ints, optional
+            Cells of the body segments that are connected to this cell. The default is None (no connectors).
+
+        Returns
+        -------
+        list of pygame.Rects
+            Areas of the surface that were changed.
+
+        """
+        if neighbours is None: neighbours = []
+        position = self._cell_to_position(cell)
+        # Ignore all cells that are outside if the game board (same as in draw())
+        if not ( ( position >= 0 ).all() and ( position < np.array(self.BOARD_SIZE) ).all() ):
+            return []
+        
+        # Clear the cell
+        background = pygame.Rect(tuple(position*self.BOX_SIZE + np.array(origin)), (self.BOX_SIZE, self.BOX_SIZE))
+        pygame.draw.rect(SURFACE, self.BACKGROUND_COLOR, background)
+        changed = [background]
+        
+        # Draw the apple
+        if (position == self.position_apple).all():
+            apple = pygame.Rect(tuple(position*self.BOX_SIZE + self.APPLE_MARGIN + np.array(origin)), (self.BOX_SIZE-2*self.APPLE_MARGIN, self.BOX_SIZE-2*self.APPLE_MARGIN))
+            pygame.draw.rect(SURFACE, self.APPLE_COLOR, apple, border_radius=self.APPLE_BORDER_RADIUS)
+        
+        # Draw the snake
+        if self._occupancy_grid[cell]:
+            snake = pygame.Rect(tuple(position*self.BOX_SIZE + self.SNAKE_MARGIN + np.array(origin)), (self.BOX_SIZE-2*self.SNAKE_MARGIN, self.BOX_SIZE-2*self.SNAKE_MARGIN))
+            pygame.draw.rect(SURFACE, self.SNAKE_COLOR, snake, border_radius=self.SNAKE_BORDER_RADIUS)
+        
+        # Connect the segment to its neighbours. The connectors reach half way into the neighbouring cells.
+        for neighbour in neighbours:
+            direction = self._cell_to_position(neighbour) - position
+            connector = pygame.Rect((0,0), (self.BOX_SIZE-2*self.SNAKE_MARGIN, self.BOX_SIZE-2*self.SNAKE_MARGIN))
+            connector.center = position*self.BOX_SIZE + self.BOX_SIZE/2 + direction*self.BOX_SIZE/2 + np.array(origin)
+            pygame.draw.rect(SURFACE, self.SNAKE_COLOR, connector)
+            changed.append(connector)
+        
+        return changed
+    
+    def draw_incremental(self, SURFACE, origin:tuple=(0,0)):
+        """
+        Draw the current state of the game, but only repaint the cells that changed since the last call of draw() or draw_incremental():
+        the new head, the old and the new tail and the new apple. The whole board is redrawn, if the changes can't be found (first frame,
+        other surface or origin, more than one move since the last frame) or if the snake is dead.
+
+        Parameters
+        ----------
+        SURFACE : pygame.Surface
+            Where to draw. Must be the same surface as in the last call, otherwise the whole board is drawn.
+        origin : tuple, optional
+            Pixel position of the top left corner of the board. The default is (0,0).
+
+        Returns
+        -------
+        list of pygame.Rects
+            Areas of the surface that were changed. Pass them to pygame.display.update().
+
+        """
+        _load_pygame()
+        body = self._body_cells
+        drawn_state = self._drawn_state
+        
+        # Nothing changed
+        if drawn_state is not None and drawn_state == (id(SURFACE), tuple(origin), body[0], body[-1], body[-2], len(body), tuple(self.position_apple.tolist())):
+            return []
+        
+        # Find out if the snake moved exactly one step since the last frame. If it didn't, draw everything.
+        one_step = ( drawn_state is not None and not self._snake_dead and drawn_state[:2] == (id(SURFACE), tuple(origin)) and body[1] == drawn_state[2]
+                     and ( ( len(body) == drawn_state[5] and body[-1] == drawn_state[4] ) or ( len(body) == drawn_state[5] + 1 and body[-1] == drawn_state[3] ) ) )
+        if not one_step:
+            self.draw(SURFACE, origin)
+            return [ pygame.Rect(origin, tuple([length*self.BOX_SIZE for length in self.BOARD_SIZE])) ]
+        
+        changed = []
+        # The tail moved: clear the old tail and redraw the last two segments without the connector to the old tail
+        if len(body) == drawn_state[5]:
+            changed += self._draw_cell(SURFACE, origin, drawn_state[3])
+            changed += self._draw_cell(SURFACE, origin, body[-1])
+            changed += self._draw_cell(SURFACE, origin, body[-2], [body[-3], body[-1]] if len(body) > 2 else [body[-1]])
+        # The apple moved: draw the new apple
+        if tuple(self.position_apple.tolist()) != drawn_state[6]:
+            changed += self._draw_cell(SURFACE, origin, self._position_to_cell(*self.position_apple.tolist()))
+        # Draw the new head last (it may cover the old tail) and connect it to the rest of the body
+        changed += self._draw_cell(SURFACE, origin, body[0], [body[1]])
+        
+        self._remember_drawn_state(SURFACE, origin)
+        return changed
+        
+    def play(self, fps:int=15, render_fps:int=60, max_catch_up:int=5, timing_window:int=36000):
         """
         Play a game of snake.
+        
+        The game loop uses a fixed timestep: the snake moves every 1/fps seconds, no matter how long drawing takes, so games played by a human
+        (see NeuralNetwork.generate_human_training_data()) are recorded at the same speed on every computer. Key presses are read as soon
+        as they arrive (the loop waits for events until the next step or frame is due) and every step uses one of them. The display is
+        drawn render_fps times per second. If the loop falls behind (e.g. the window was dragged), at most max_catch_up steps are made at
+        once and the rest of the missed time is dropped, so the snake never jumps ahead.
 
         Parameters
         ----------
         fps : int, optional
-            Frames per Second. The default is 15.
+            Steps of the snake per second. The default is 15.
+        render_fps : int, optional
+            Frames drawn per second. The default is 60.
+        max_catch_up : int, optional
+            Maximal number of steps made at once, if the game loop fell behind. The default is 5.
+        timing_window : int, optional
+            Number of measurements per timing that are kept for the percentiles. Only the latest ones are kept, so the memory stays the same
+            however long the game is. The default is 36000 (10 minutes of frames at 60 fps).
 
         Returns
         -------
-        None.
+        dict
+            Timing of the game. steps (number of steps), input_latency (time from the key press to the step that used it), frame_time
+            (time between two drawn frames), render_time (time to draw a frame) and step_jitter (how late the steps were made). Each
+            timing has count, p50, p95, p99 and max in milliseconds of the last timing_window measurements (see _timing_percentiles()).
 
         """
+        if fps <= 0 or render_fps <= 0:
+            raise ValueError(f"fps and render_fps must be positive (got {fps} and {render_fps})")
+        if max_catch_up < 1:
+            raise ValueError(f"max_catch_up must be at least 1 (got {max_catch_up})")
+        if timing_window < 1:
+            raise ValueError(f"timing_window must be at least 1 (got {timing_window})")
+        
         # Initialise game engine
+        _load_pygame()
         pygame.init()
         
+        # Latest measured timings (seconds)
+        input_latencies, frame_times, render_times, step_jitters = ( deque(maxlen=timing_window) for _ in range(4) )
+        steps = 0
+        
         # Run the pygame code in a try-catch-block, so pygame can be quit savely if something goes wrong
         try:
             SCREEN_SIZE = tuple([i*self.BOX_SIZE for i in self.BOARD_SIZE])
-            FPS = fps
+            STEP_TIME = 1 / fps
+            FRAME_TIME = 1 / render_fps
             
             # >>>> SETUP GAME
             #
-            # Setup the game clock
-            frame_rate = pygame.time.Clock()
-            
             # Setup display
             SCREEN = pygame.display.set_mode(SCREEN_SIZE)
             #
             # <<<< SETUP GAME
             
             # >>>> START GAME LOOP
-            # direction_stack is used to memorize which direction the player wants to go
-            direction_stack = []
+            # direction_stack is used to memorize which direction the player wants to go and when the key was pressed
+            direction_stack = deque()
             running = True  
+            # Score shown in the caption of the display window
+            caption_score = None
+            # Times when the next step is made and the next frame is drawn and when the last frame was drawn
+            next_step = next_frame = perf_counter()
+            last_frame = None
             while running:
                 
-                # Clear the screen
-                SCREEN.fill((0,0,0))
-                
                 # >>>> HANDLE EVENTS AND KEY PRESSES
                 #
-                for event in pygame.event.get():
+                # Wait for the next event, but not longer than until the next step or frame is due
+                timeout = int((min(next_step, next_frame) - perf_counter()) * 1000)
+                # pygame.event.wait() waits forever with a timeout of 0, so only poll the events if something is due within a millisecond
+                events = [pygame.event.wait(timeout)] + pygame.event.get() if timeout > 0 else pygame.event.get()
+                pressed = perf_counter()
+                for event in events:
                     
                     # Quit if the user closes the gui.
                     if event.type == pygame.locals.QUIT:
@@ -387,42 +964,74 @@ class Snake:
                     if event.type == pygame.KEYDOWN:
                         # Check all the arrow keys and save the direction the player wants to go.
                         # This allows the player to push multiple keys by turn and the game will execute each direction turn by turn
-                        if event.key == pygame.K_UP: direction_stack.append(NORTH)
-                        if event.key == pygame.K_RIGHT: direction_stack.append(EAST)
-                        if event.key == pygame.K_LEFT: direction_stack.append(WEST)
-                        if event.key == pygame.K_DOWN: direction_stack.append(SOUTH)
-                            
-                try:
-                    # Get the direction the player wants to go in the next move
-                    absolute_direction = direction_stack.pop(0)
-                    
-                    #   CONVERT ABSOLUTE DIRECTIONS TO RELATIVE DIRECTIONS
-                    #   This is done, because the neural network should be trained with relative directions and I want to use games played by the user as training data.
-                    #
-                    # Get the current direction of the snake
-                    current_direction = self.position_snake_body[0]-self.position_snake_body[1]
-                    # Compute the relative direction with the inner product
-                    # This relise on the definition of snake.LEFT, snake.FORWARD and snake.RIGHT to be integers -1, 0 and 1
-                    direction = int(absolute_direction[1]*current_direction[0]-absolute_direction[0]*current_direction[1])
-                    
-                except IndexError:
-                    # If the player didn't push a key don't change the direction
-                    direction = FORWARD
+                        if event.key == pygame.K_UP: direction_stack.append((NORTH, pressed))
+                        if event.key == pygame.K_RIGHT: direction_stack.append((EAST, pressed))
+                        if event.key == pygame.K_LEFT: direction_stack.append((WEST, pressed))
+                        if event.key == pygame.K_DOWN: direction_stack.append((SOUTH, pressed))
                 #
                 # <<<< HANDLE EVENTS AND KEY PRESSES
+                if not running: break
                 
-                # Move the snake by one step
-                self.move(direction)
-                # Draw the snake game to the pygame displayy
-                self.draw(SCREEN)
-                
-                # Set the caption of the display window with the current game score
-                pygame.display.set_caption(f"Snake - Score: {self.score}")
+                # >>>> SIMULATION
+                #
+                # Make all steps that are due (at most max_catch_up)
+                now = perf_counter()
+                catch_up = 0
+                while now >= next_step and catch_up < max_catch_up:
+                    if direction_stack:
+                        # Get the direction the player wants to go in the next move
+                        absolute_direction, pressed = direction_stack.popleft()
+                        
+                        #   CONVERT ABSOLUTE DIRECTIONS TO RELATIVE DIRECTIONS
+                        #   This is done, because the neural network should be trained with relative directions and I want to use games played by the user as training data.
+                        #
+                        # Get the current direction of the snake
+                        current_direction = self._get_current_direction()
+                        # Compute the relative direction with the inner product
+                        # This relise on the definition of snake.LEFT, snake.FORWARD and snake.RIGHT to be integers -1, 0 and 1
+                        direction = int(absolute_direction[1]*current_direction[0]-absolute_direction[0]*current_direction[1])
+                    else:
+                        # If the player didn't push a key don't change the direction
+                        direction, pressed = FORWARD, None
+                    
+                    # Move the snake by one step
+                    self.move(direction)
+                    moved = perf_counter()
+                    if pressed is not None:
+                        input_latencies.append(moved - pressed)
+                        if STATS.enabled: STATS.add_time("input_latency", moved - pressed)
+                    step_jitters.append(now - next_step)
+                    steps += 1
+                    catch_up += 1
+                    next_step += STEP_TIME
+                # Drop the steps that were missed, if the game loop fell too far behind
+                if now >= next_step: next_step = now + STEP_TIME
+                #
+                # <<<< SIMULATION
                 
-                # Update display
-                pygame.display.update()
-                # Tick the clock
-                frame_rate.tick(FPS)
+                # >>>> RENDERING
+                #
+                if now >= next_frame:
+                    render_start = perf_counter()
+                    # Draw the cells of the snake game that changed to the pygame display
+                    changed = self.draw_incremental(SCREEN)
+                    
+                    # Set the caption of the display window with the current game score, if the score changed
+                    if self.score != caption_score:
+                        caption_score = self.score
+                        pygame.display.set_caption(f"Snake - Score: {self.score}")
+                    
+                    # Update the changed parts of the display
+                    pygame.display.update(changed)
+                    
+                    render_times.append(perf_counter() - render_start)
+                    if STATS.enabled: STATS.add_time("render", render_times[-1])
+                    if last_frame is not None: frame_times.append(render_start - last_frame)
+                    last_frame = render_start
+                    # Keep the frame rate, but don't draw the missed frames
+                    next_frame = max(next_frame + FRAME_TIME, now)
+                #
+                # <<<< RENDERING
             #
             # <<<< END GAME LOOP
             
@@ -435,6 +1044,12 @@ class Snake:
         
         # Exit the game
         pygame.quit()
+        
+        return {"steps": steps,
+                "input_latency": _timing_percentiles(input_latencies),
+                "frame_time": _timing_percentiles(frame_times),
+                "render_time": _timing_percentiles(render_times),
+                "step_jitter": _timing_percentiles(step_jitters)}
 #        
 #
 #   END OF CLASS SNAKE
@@ -444,6 +1059,10 @@ class Snake:
     
 if __name__ == "__main__":
     
-    # Play Snake
+    # Play Snake and print the timing of the game loop
     snake = Snake()
-    snake.play()
\ No newline at end of file
+    timing = snake.play()
+    print(f"{timing['steps']} steps")
+    for name in ("input_latency", "frame_time", "render_time", "step_jitter"):
+        print(f"{name:14s} " + "  ".join( f"{key} {value:.2f}" if key != "count" else f"{key} {value}" for key, value in timing[name].items() )
+              + " (ms)")
\ No newline at end of file
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regression tests for the checkpoints of mlp.train(): training continued from a checkpoint must end exactly like training without
+interruption (same hyperparameters of the optimizer, same state, same shuffling, same epoch numbers).
+
+Run from the root of the repository: python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+
+from mlp import MLP, SGD, Adam, train, load_checkpoint
+
+
+def _data(samples:int=300, seed:int=0):
+    """
+    Random training data with the shapes of NeuralNetwork.preprocess_gameStates().
+    """
+    rng = np.random.default_rng(seed)
+    input_state = rng.random((samples, 6), dtype=np.float32)
+    output_action = np.eye(3, dtype=int)[rng.integers(0, 3, samples)]
+    action_value = rng.random(samples, dtype=np.float32)
+    return input_state, output_action, action_value
+
+
+@pytest.mark.parametrize("optimizer", [lambda: SGD(0.01, momentum=0.9), lambda: Adam(0.005, beta1=0.8, beta2=0.99, epsilon=1e-6)])
+def test_resume_from_checkpoint_matches_uninterrupted_training(tmp_path, optimizer):
+    data = _data()
+    epochs, interrupted_after = 5, 2
+
+    straight = MLP((6, 16, 3), seed=1)
+    straight_history = train(straight, data, epochs, 32, optimizer(), seed=7, verbose=False)
+
+    model = MLP((6, 16, 3), seed=1)
+    train(model, data, interrupted_after, 32, optimizer(), checkpoint=tmp_path, seed=7, verbose=False)
+    model, resumed_optimizer, start_epoch, rng = load_checkpoint(tmp_path/f"epoch_{interrupted_after:03d}.npz")
+    assert resumed_optimizer.hyperparameters() == optimizer().hyperparameters()
+    resumed_history = train(model, data, epochs - interrupted_after, 32, resumed_optimizer, checkpoint=tmp_path, verbose=False,
+                            start_epoch=start_epoch, rng=rng)
+
+    assert [ entry["epoch"] for entry in resumed_history ] == list(range(interrupted_after+1, epochs+1))
+    assert [ entry["loss"] for entry in resumed_history ] == [ entry["loss"] for entry in straight_history[interrupted_after:] ]
+    for resumed, expected in zip(model.parameters, straight.parameters):
+        np.testing.assert_array_equal(resumed, expected)
+    assert sorted( path.name for path in tmp_path.iterdir() ) == [ f"epoch_{epoch:03d}.npz" for epoch in range(1, epochs+1) ]
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regression tests for the preprocessing of recorded games: every path returns the same values with the same dtypes (input_state and
+action_value float32, output_action int).
+
+Run from the root of the repository: python -m pytest tests
+"""
+
+import numpy as np
+
+from neural_network import NeuralNetwork
+
+
+def test_iter_preprocessed_matches_preprocess_trainingDataFile(tmp_path):
+    network = NeuralNetwork()
+    network.generate_random_training_data(tmp_path, training_games=5, maximal_steps_per_game=50, seed=3)
+
+    expected = network.preprocess_trainingDataFile([tmp_path])
+    batches = [ tuple(array.copy() for array in batch) for batch in network.iter_preprocessed([tmp_path], batch_size=32) ]
+    streamed = tuple( np.concatenate(arrays) for arrays in zip(*batches) )
+
+    for array, reference in zip(streamed, expected):
+        assert array.dtype == reference.dtype
+        np.testing.assert_array_equal(array, reference)
+    assert expected[1].dtype == int
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regression tests for Snake.snapshot(), Snake.restore() and Snake.clone(): a restored game or a clone must continue exactly like the
+original, including every use of the random number generator.
+
+Run from the root of the repository: python -m pytest tests
+"""
+
+from snake import Snake, LEFT, FORWARD, RIGHT
+from neural_network import NeuralNetwork
+
+
+def _rollout(game, steps:int=200):
+    """
+    Play random moves with the generator of the game (like neural_network._play_random_game()) and return what happened.
+    """
+    history = []
+    for _ in range(steps):
+        action = game._random.choice([LEFT, FORWARD, RIGHT])
+        dead = game.move(action)
+        history.append((action, tuple(game._body_cells), tuple(game.position_apple.tolist()), game.score))
+        if dead: break
+    return history
+
+
+def test_restore_undoes_draws_outside_of_the_game():
+    game = Snake(seed=1)
+    state = game.snapshot()
+    draws = [ game._random.choice([LEFT, FORWARD, RIGHT]) for _ in range(5) ]
+    game.restore(state)
+    assert [ game._random.choice([LEFT, FORWARD, RIGHT]) for _ in range(5) ] == draws
+
+
+def test_restore_and_clone_reproduce_rollouts():
+    for cls in (Snake, NeuralNetwork):
+        game = cls(seed=7)
+        _rollout(game, 20)
+        state = game.snapshot()
+        clone = game.clone()
+        expected = _rollout(game)
+        game.restore(state)
+        assert _rollout(game) == expected
+        assert _rollout(clone) == expected
+
+
+def test_restore_keeps_ray_cache():
+    game = NeuralNetwork(seed=3)
+    _rollout(game, 30)
+    state = game.snapshot()
+    _rollout(game, 30)
+    game.restore(state)
+    rows, columns = game._body_rows, game._body_columns
+    game._rebuild_ray_cache()
+    assert { y: row for y, row in rows.items() if row } == { y: row for y, row in game._body_rows.items() if row }
+    assert { x: column for x, column in columns.items() if column } == { x: column for x, column in game._body_columns.items() if column }